@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+传输压缩压测脚本
+把教师端的发送速率和学生端的上传速率限制在机房交换机的带宽（默认 100Mbit），
+分别用不压缩、gzip、zstd 上传和下载源代码、CSV 和图片，比较有效吞吐量
+（原始文件大小 / 传输时间）
+"""
+import argparse
+import glob
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import wire_compression
+from benchmark_swarm import RateLimitedApp
+from teacher_app import FileManager, WSGIServer, create_app
+
+
+def make_samples(work_dir, size):
+    """准备三种典型文件：源代码、CSV 成绩表、图片（已压缩格式）"""
+    samples = {}
+
+    # 源代码：拼接标准库的 .py 文件
+    path = os.path.join(work_dir, "source.py")
+    stdlib = os.path.dirname(os.__file__)
+    sources = sorted(glob.glob(os.path.join(stdlib, "**", "*.py"), recursive=True))
+    with open(path, "wb") as out:
+        for source in sources:
+            with open(source, "rb") as f:
+                out.write(f.read())
+            if out.tell() >= size:
+                break
+        out.truncate(min(size, out.tell()))
+    samples["源代码"] = path
+
+    # CSV：随机的学号、姓名和成绩
+    path = os.path.join(work_dir, "scores.csv")
+    rng = random.Random(0)
+    surnames = "赵钱孙李周吴郑王冯陈褚卫蒋沈韩杨"
+    with open(path, "w", encoding="utf-8") as out:
+        out.write("学号,姓名,语文,数学,英语,日期\n")
+        while out.tell() < size:
+            out.write(f"{rng.randrange(10 ** 8):08d},{rng.choice(surnames)}{rng.choice(surnames)},"
+                      f"{rng.randint(40, 100)},{rng.randint(40, 100)},{rng.randint(40, 100)},"
+                      f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}\n")
+    samples["CSV"] = path
+
+    # 图片：内容与随机数据一样无法再压缩
+    path = os.path.join(work_dir, "photo.jpg")
+    with open(path, "wb") as out:
+        out.write(os.urandom(size))
+    samples["图片"] = path
+    return samples
+
+
+def throttled(data, rate, block_size=64 * 1024):
+    """按 rate 字节/秒逐块产出数据（模拟学生端的上行带宽）"""
+    started = time.perf_counter()
+    for offset in range(0, len(data), block_size):
+        delay = started + offset / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        yield data[offset:offset + block_size]
+
+
+def download(base_url, file_id, encoding):
+    """完整下载一次（含解压时间），返回 (秒数, 线上字节数)"""
+    started = time.perf_counter()
+    headers = {"Accept-Encoding": encoding or "identity"}
+    with requests.get(f"{base_url}/api/teacher/files/{file_id}", headers=headers,
+                      stream=True, timeout=(5, 60)) as response:
+        response.raise_for_status()
+        assert response.headers.get("Content-Encoding") == encoding
+        reader = response.raw
+        if encoding:
+            reader = wire_compression.decompressing_reader(response.raw, encoding)
+        with reader:
+            while chunk := reader.read(256 * 1024):
+                pass
+        wire_bytes = response.raw.tell()
+    return time.perf_counter() - started, wire_bytes
+
+
+def upload(base_url, path, encoding, rate):
+    """以一个分块上传整个文件（含压缩时间），返回 (秒数, 线上字节数)"""
+    started = time.perf_counter()
+    with open(path, "rb") as f:
+        data = f.read()
+    response = requests.post(f"{base_url}/api/student/work/uploads", json={
+        "filename": os.path.basename(path), "student_name": "压测", "file_size": len(data),
+        "chunk_size": max(len(data), 1)}, timeout=(5, 60))
+    upload_id = response.json()["upload"]["upload_id"]
+    headers = {}
+    if encoding:
+        data = wire_compression.compress_bytes(data, encoding)
+        headers["Content-Encoding"] = encoding
+    response = requests.put(f"{base_url}/api/student/work/uploads/{upload_id}/chunks/0",
+                            data=throttled(data, rate), headers=headers, timeout=(5, 60))
+    response.raise_for_status()
+    requests.post(f"{base_url}/api/student/work/uploads/{upload_id}/commit",
+                  timeout=(5, 60)).raise_for_status()
+    return time.perf_counter() - started, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="传输压缩压测")
+    parser.add_argument("--link-mbit", type=float, default=100, help="交换机带宽（Mbit/s）")
+    parser.add_argument("--file-size", type=int, default=32, help="每个文件的大小（MB）")
+    args = parser.parse_args()
+
+    logging.getLogger("waitress").setLevel(logging.ERROR)
+    rate = args.link_mbit * 1000 * 1000 / 8
+    encodings = [None, *wire_compression.SUPPORTED_ENCODINGS]
+    if wire_compression.zstandard is None:
+        print("⚠️  未安装 zstandard，跳过 zstd")
+
+    base_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        fm = FileManager(os.path.join(base_dir, "data"))
+        samples = make_samples(base_dir, args.file_size * 1024 * 1024)
+        file_ids = {name: fm.save_teacher_file(path, os.path.basename(path))["file_id"]
+                    for name, path in samples.items()}
+
+        server = WSGIServer(RateLimitedApp(create_app(fm), rate), "127.0.0.1", 0)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        base_url = f"http://127.0.0.1:{server.port}"
+
+        print(f"🚀 {args.file_size}MB 文件，链路 {args.link_mbit:.0f}Mbit/s")
+        print(f"{'文件':<6}{'方向':<6}{'编码':<10}{'线上MB':>10}{'有效MB/s':>12}")
+        for name, path in samples.items():
+            size = os.path.getsize(path)
+            compressible = wire_compression.is_compressible(path)
+            for direction in ("下载", "上传"):
+                for encoding in encodings:
+                    if encoding and not compressible:
+                        # 服务器和学生端都会自动跳过已压缩格式
+                        continue
+                    if direction == "下载":
+                        elapsed, wire_bytes = download(base_url, file_ids[name], encoding)
+                    else:
+                        elapsed, wire_bytes = upload(base_url, path, encoding, rate)
+                    print(f"{name:<6}{direction:<6}{encoding or 'identity':<10}"
+                          f"{wire_bytes / 1024 ** 2:>10.1f}{size / 1024 ** 2 / elapsed:>12.1f}")
+
+        server.shutdown()
+        server_thread.join(timeout=5)
+        fm.close()
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
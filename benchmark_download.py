@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+教师端大文件下载压测脚本
+多名学生同时下载同一个大文件（整文件或按区间分段），比较零拷贝 sendfile、
+waitress 逐块读写和 werkzeug 三种方式下服务器每发送 1GB 消耗的 CPU 时间
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from teacher_app import FileManager, WSGIServer, create_app
+
+# (名称, 引擎, 是否零拷贝)
+MODES = {
+    "sendfile": ("waitress", True),
+    "waitress": ("waitress", False),
+    "werkzeug": ("werkzeug", False),
+}
+
+
+def prepare_data(base_dir, file_size):
+    """准备一个压测用的大文件"""
+    fm = FileManager(base_dir)
+    sample = os.path.join(base_dir, "sample.bin")
+    with open(sample, "wb") as f:
+        for _ in range(file_size // (1024 * 1024)):
+            f.write(os.urandom(1024 * 1024))
+    fm.save_teacher_file(sample, "大文件.bin", "压测文件")
+    os.remove(sample)
+    return fm
+
+
+def run_client(url, file_size, rounds, segment_size):
+    """单个学生：重复下载整个文件；segment_size 非 0 时按区间分段下载，返回接收的字节数"""
+    session = requests.Session()
+    received = 0
+    for _ in range(rounds):
+        ranges = [None]
+        if segment_size:
+            ranges = [(start, min(start + segment_size, file_size) - 1)
+                      for start in range(0, file_size, segment_size)]
+        for byte_range in ranges:
+            headers = {"Range": "bytes=%d-%d" % byte_range} if byte_range else {}
+            with session.get(url, headers=headers, stream=True, timeout=(5, 60)) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(256 * 1024):
+                    received += len(chunk)
+    return received
+
+
+def benchmark(mode, fm, clients, rounds, segment_size):
+    """压测一种发送方式，返回 (发送 GB, 吞吐 MB/s, 每 GB CPU 秒)"""
+    engine, zero_copy = MODES[mode]
+    server = WSGIServer(create_app(fm), "127.0.0.1", 0, engine, zero_copy=zero_copy)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    file = fm.get_teacher_files()[0]
+    url = f"http://127.0.0.1:{server.port}/api/teacher/files/{file['file_id']}"
+
+    # 学生在独立进程中运行，本进程的 CPU 时间基本都花在服务器上
+    with multiprocessing.Pool(clients) as pool:
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        received = pool.starmap(
+            run_client, [(url, file["file_size"], rounds, segment_size)] * clients
+        )
+        elapsed = time.perf_counter() - started
+        cpu = time.process_time() - cpu_started
+
+    server.shutdown()
+    server_thread.join(timeout=5)
+
+    gigabytes = sum(received) / 1024 ** 3
+    return gigabytes, sum(received) / 1024 ** 2 / elapsed, cpu / gigabytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="教师端大文件下载压测")
+    parser.add_argument("--clients", type=int, default=4, help="并发学生数（每人一个进程）")
+    parser.add_argument("--rounds", type=int, default=4, help="每名学生下载的次数")
+    parser.add_argument("--file-size", type=int, default=256, help="文件大小（MB）")
+    parser.add_argument("--segment-size", type=int, default=0,
+                        help="按区间分段下载时每段的大小（MB），0 表示整文件下载")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    logging.getLogger("waitress").setLevel(logging.ERROR)
+    if "sendfile" in args.modes and not hasattr(os, "sendfile"):
+        print("⚠️  当前平台没有 os.sendfile，跳过 sendfile 模式")
+        args.modes.remove("sendfile")
+
+    base_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        fm = prepare_data(base_dir, args.file_size * 1024 * 1024)
+        print(f"🚀 {args.clients} 名学生各下载 {args.rounds} 次 {args.file_size}MB 文件"
+              + (f"（每段 {args.segment_size}MB）" if args.segment_size else ""))
+        print(f"{'方式':<10}{'GB':>8}{'MB/s':>10}{'CPU秒/GB':>12}")
+        for mode in args.modes:
+            gigabytes, throughput, cpu_per_gb = benchmark(
+                mode, fm, args.clients, args.rounds, args.segment_size * 1024 * 1024
+            )
+            print(f"{mode:<10}{gigabytes:>8.1f}{throughput:>10.0f}{cpu_per_gb:>12.3f}")
+        fm.close()
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+教师端服务器压测脚本
+模拟全班学生同时刷新文件列表、下载小文件，比较不同服务器引擎的吞吐量与延迟
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from teacher_app import FileManager, WSGIServer, create_app
+
+
+def prepare_data(base_dir, file_count, file_size):
+    """准备压测用的老师文件"""
+    fm = FileManager(base_dir)
+    sample = os.path.join(base_dir, "sample.bin")
+    with open(sample, "wb") as f:
+        f.write(os.urandom(file_size))
+    for i in range(file_count):
+        fm.save_teacher_file(sample, f"课件{i}.bin", "压测文件")
+    os.remove(sample)
+    return fm
+
+
+def run_client(base_url, file_ids, deadline, latencies, errors):
+    """单个学生：循环刷新列表并下载文件，直到截止时间"""
+    session = requests.Session()
+    i = 0
+    while time.perf_counter() < deadline:
+        if i % 2 == 0:
+            url = f"{base_url}/api/teacher/files"
+        else:
+            url = f"{base_url}/api/teacher/files/{file_ids[i % len(file_ids)]}"
+        i += 1
+        start = time.perf_counter()
+        try:
+            response = session.get(url, timeout=(5, 30))
+            response.content
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                continue
+        except requests.RequestException as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+def run_client_group(base_url, file_ids, clients, duration):
+    """在独立进程中运行一组学生线程，避免与服务器争用同一个 GIL"""
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    threads = [
+        threading.Thread(
+            target=run_client, args=(base_url, file_ids, deadline, latencies, errors)
+        )
+        for _ in range(clients)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors
+
+
+def benchmark(engine, fm, clients, duration, processes):
+    """压测一个引擎，返回 (请求/秒, p50 毫秒, p99 毫秒, 错误数)"""
+    server = WSGIServer(create_app(fm), "127.0.0.1", 0, engine)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    base_url = f"http://127.0.0.1:{server.port}"
+    file_ids = [f["file_id"] for f in fm.get_teacher_files()]
+
+    # 把学生平均分配到各个客户端进程
+    groups = [clients // processes + (1 if i < clients % processes else 0) for i in range(processes)]
+    latencies, errors = [], []
+    started = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        results = pool.starmap(
+            run_client_group, [(base_url, file_ids, n, duration) for n in groups if n]
+        )
+    elapsed = time.perf_counter() - started
+    for group_latencies, group_errors in results:
+        latencies.extend(group_latencies)
+        errors.extend(group_errors)
+
+    server.shutdown()
+    server_thread.join(timeout=5)
+
+    if not latencies:
+        return 0.0, 0.0, 0.0, len(errors)
+    quantiles = statistics.quantiles(latencies, n=100)
+    return len(latencies) / elapsed, quantiles[49] * 1000, quantiles[98] * 1000, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="教师端服务器压测")
+    parser.add_argument("--clients", type=int, default=60, help="并发学生数")
+    parser.add_argument("--duration", type=float, default=10, help="每个引擎的压测秒数")
+    parser.add_argument("--processes", type=int, default=4, help="客户端进程数")
+    parser.add_argument("--files", type=int, default=20, help="老师文件数量")
+    parser.add_argument("--file-size", type=int, default=64 * 1024, help="每个文件的字节数")
+    parser.add_argument(
+        "--engines", nargs="+", default=list(WSGIServer.ENGINES), choices=WSGIServer.ENGINES
+    )
+    args = parser.parse_args()
+
+    # 只关心压测结果，屏蔽服务器的逐条请求日志和队列告警
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    logging.getLogger("waitress").setLevel(logging.ERROR)
+
+    base_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        fm = prepare_data(base_dir, args.files, args.file_size)
+        print(f"🚀 并发学生: {args.clients}，每个引擎压测 {args.duration:.0f} 秒")
+        print(f"{'引擎':<10}{'请求/秒':>10}{'p50(ms)':>10}{'p99(ms)':>10}{'错误':>8}")
+        for engine in args.engines:
+            rps, p50, p99, error_count = benchmark(
+                engine, fm, args.clients, args.duration, args.processes
+            )
+            print(f"{engine:<10}{rps:>10.0f}{p50:>10.1f}{p99:>10.1f}{error_count:>8}")
+        fm.close()
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+P2P 分发压测脚本
+限制教师端的上行速率，模拟全班同时下载同一个大文件，比较只从教师端下载
+与同学互传两种方式下，全班下载完成的总时间随人数的变化
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from swarm import SwarmPeer
+from teacher_app import FileManager, WSGIServer, create_app
+
+DOWNLOAD_PATH = re.compile(r"^/api/teacher/files/\d+$")
+
+
+class RateLimitedApp:
+    """把教师端文件下载的总速率限制在 rate 字节/秒（模拟机房上行带宽）"""
+
+    def __init__(self, app, rate):
+        self.app = app
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._next_send = time.perf_counter()
+
+    def __call__(self, environ, start_response):
+        if not DOWNLOAD_PATH.match(environ.get("PATH_INFO", "")):
+            return self.app(environ, start_response)
+        # 逐块限速需要由 Python 迭代响应体，不走零拷贝
+        environ.pop(WSGIServer.SIZED_FILE_WRAPPER, None)
+        return self._throttle(self.app(environ, start_response))
+
+    def _throttle(self, body):
+        try:
+            for chunk in body:
+                with self._lock:
+                    now = time.perf_counter()
+                    self._next_send = max(self._next_send, now) + len(chunk) / self.rate
+                    delay = self._next_send - now
+                time.sleep(delay)
+                yield chunk
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+
+
+def run_student(mode, base_url, file_id, save_path, barrier, results, done):
+    """单个学生（独立进程）：同时开始下载，完成后继续做种直到全部结束"""
+    peer = SwarmPeer("127.0.0.1", 0)
+    peer.start()
+    barrier.wait()
+    started = time.perf_counter()
+    if mode == "swarm":
+        stats = peer.download(base_url, file_id, save_path)
+    else:
+        with requests.get(f"{base_url}/api/teacher/files/{file_id}", stream=True, timeout=(5, 60)) as r:
+            r.raise_for_status()
+            with open(save_path, "wb") as f:
+                for chunk in r.iter_content(256 * 1024):
+                    f.write(chunk)
+        stats = {"peer_bytes": 0, "teacher_bytes": os.path.getsize(save_path)}
+    results.put((time.perf_counter() - started, stats))
+    done.wait()
+    peer.stop()
+
+
+def benchmark(mode, students, base_url, file_id, work_dir):
+    """返回 (全班完成秒数, 教师端发送字节占比)"""
+    barrier = multiprocessing.Barrier(students)
+    results = multiprocessing.Queue()
+    done = multiprocessing.Event()
+    processes = [
+        multiprocessing.Process(
+            target=run_student,
+            args=(mode, base_url, file_id, os.path.join(work_dir, f"{mode}_{students}_{i}.bin"),
+                  barrier, results, done),
+        )
+        for i in range(students)
+    ]
+    for p in processes:
+        p.start()
+    elapsed, teacher_bytes, total_bytes = 0.0, 0, 0
+    for _ in range(students):
+        seconds, stats = results.get()
+        elapsed = max(elapsed, seconds)
+        teacher_bytes += stats["teacher_bytes"]
+        total_bytes += stats["teacher_bytes"] + stats["peer_bytes"]
+    done.set()
+    for p in processes:
+        p.join()
+    return elapsed, teacher_bytes / total_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="P2P 分发压测")
+    parser.add_argument("--students", type=int, nargs="+", default=[2, 4, 8], help="班级人数")
+    parser.add_argument("--file-size", type=int, default=32, help="文件大小（MB）")
+    parser.add_argument("--teacher-rate", type=float, default=16, help="教师端上行速率（MB/s）")
+    parser.add_argument("--modes", nargs="+", default=["http", "swarm"], choices=["http", "swarm"])
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    logging.getLogger("waitress").setLevel(logging.ERROR)
+
+    base_dir = tempfile.mkdtemp(prefix="bench_")
+    try:
+        fm = FileManager(base_dir)
+        sample = os.path.join(base_dir, "sample.bin")
+        with open(sample, "wb") as f:
+            f.write(os.urandom(args.file_size * 1024 * 1024))
+        file_id = fm.save_teacher_file(sample, "大文件.bin", "压测文件")["file_id"]
+        fm.wait_for_manifests()
+
+        app = RateLimitedApp(create_app(fm), args.teacher_rate * 1024 * 1024)
+        server = WSGIServer(app, "127.0.0.1", 0)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        base_url = f"http://127.0.0.1:{server.port}"
+
+        print(f"🚀 {args.file_size}MB 文件，教师端上行 {args.teacher_rate:.0f}MB/s")
+        print(f"{'方式':<8}{'人数':>6}{'总时间(s)':>12}{'教师端占比':>12}")
+        for students in args.students:
+            for mode in args.modes:
+                work_dir = tempfile.mkdtemp(dir=base_dir)
+                elapsed, teacher_share = benchmark(mode, students, base_url, file_id, work_dir)
+                print(f"{mode:<8}{students:>6}{elapsed:>12.1f}{teacher_share:>12.0%}")
+                shutil.rmtree(work_dir, ignore_errors=True)
+
+        server.shutdown()
+        server_thread.join(timeout=5)
+        fm.close()
+    finally:
+        shutil.rmtree(base_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
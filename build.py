@@ -53,7 +53,7 @@ def main():
     dist_dir.mkdir(exist_ok=True)
 
     # 先创建数据目录（PyInstaller 在 teacher spec 中需要预先存在的 data 目录）
-    data_dirs = ["data", "data/teacher_files", "data/student_work"]
+    data_dirs = ["data", "data/blobs"]
     for dir_path in data_dirs:
         Path(dir_path).mkdir(parents=True, exist_ok=True)
     print("✅ 预创建数据目录供打包使用")
@@ -17,8 +17,10 @@ a = Analysis(
         'tkinter.simpledialog',
         'flask',
         'flask_cors',
+        'waitress',
         'requests',
         'json',
+        'sqlite3',
         'os',
         'threading',
         'socket',
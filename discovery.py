@@ -0,0 +1,313 @@
+"""
+教师端发现 - 学生端无需输入地址即可找到教师端
+
+教师端定期向局域网广播一个很小的 UDP 信标（端口、元数据版本号、主机名），
+并立即单播回复学生端启动时广播的探测包；学生端启动后几毫秒内就能拿到教师端
+地址，不需要逐个扫描网段，也不需要手动输入 IP。
+
+交换机过滤广播时，学生端退回 SubnetScanner：用 asyncio 并发探测本网段的
+教师端端口，再用 /api/health 确认。
+"""
+import asyncio
+import concurrent.futures
+import json
+import socket
+import threading
+import time
+
+import requests
+
+# 信标与探测包使用的 UDP 端口（5007 为班级组播，5008 为同学互传）
+DISCOVERY_PORT = 5009
+SERVICE = "school-file-transfer"
+# 信标广播间隔（秒）
+BEACON_INTERVAL = 2.0
+
+
+def local_ip():
+    """本机用于访问局域网的 IP 地址（不会真的发送数据）"""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+    except OSError:
+        return "127.0.0.1"
+
+
+def broadcast_addresses():
+    """广播目标：受限广播，以及本机所在 /24 网段的定向广播
+
+    Windows 上 255.255.255.255 只从一个网卡发出，定向广播保证发到机房网段。
+    """
+    addresses = ["255.255.255.255"]
+    ip = local_ip()
+    if not ip.startswith("127."):
+        addresses.append(ip.rsplit(".", 1)[0] + ".255")
+    return addresses
+
+
+def encode_message(kind, **fields):
+    """编码信标（beacon）或探测（probe）包"""
+    return json.dumps({"service": SERVICE, "type": kind, **fields}).encode("utf-8")
+
+
+def decode_message(packet):
+    """解码发现协议的包，不是本协议的包返回 None"""
+    try:
+        message = json.loads(packet.decode("utf-8"))
+    except (UnicodeDecodeError, ValueError):
+        return None
+    if not isinstance(message, dict) or message.get("service") != SERVICE:
+        return None
+    return message
+
+
+def _broadcast_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+    return sock
+
+
+def _shared_socket(port):
+    """绑定到 port 的 UDP 套接字；同一台机器上的多个程序（以及测试）可共用端口"""
+    sock = _broadcast_socket()
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(("", port))
+    return sock
+
+
+class TeacherBeacon:
+    """教师端信标
+
+    后台线程每 BEACON_INTERVAL 秒广播一次信标，并单播回复收到的探测包。
+    get_version() 提供当前的元数据版本号，学生端可据此判断列表是否有变化。
+    """
+
+    def __init__(self, http_port, get_version, port=DISCOVERY_PORT,
+                 interval=BEACON_INTERVAL, addresses=None):
+        self.http_port = http_port
+        self.get_version = get_version
+        self.port = port
+        self.interval = interval
+        self.addresses = addresses or broadcast_addresses()
+        self.name = socket.gethostname()
+        self._stop = threading.Event()
+        self._thread = None
+        self.sock = _shared_socket(port)
+        self.sock.settimeout(0.2)
+
+    def message(self):
+        return encode_message("beacon", port=self.http_port, version=self.get_version(),
+                              name=self.name)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.sock.close()
+
+    def run(self):
+        """广播与应答循环，直到调用 stop()"""
+        next_beacon = 0.0
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now >= next_beacon:
+                packet = self.message()
+                for address in self.addresses:
+                    try:
+                        self.sock.sendto(packet, (address, self.port))
+                    except OSError:
+                        # 网卡未就绪或不允许广播，下次再试
+                        pass
+                next_beacon = now + self.interval
+            try:
+                packet, sender = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            message = decode_message(packet)
+            if message is not None and message.get("type") == "probe":
+                try:
+                    self.sock.sendto(self.message(), sender)
+                except OSError:
+                    pass
+
+
+class TeacherListener:
+    """学生端：监听教师端信标，并主动广播探测包
+
+    每发现（或再次收到）一个教师端就调用 on_teacher(信息字典)，信息包括
+    address、port、version 和 name；回调在后台线程中执行。
+    """
+    # 启动时发送探测包的时刻（秒）：教师端若在线，第一次探测就会得到回复
+    PROBE_SCHEDULE = (0, 0.2, 0.5, 1.0, 2.0)
+
+    def __init__(self, on_teacher, port=DISCOVERY_PORT, addresses=None):
+        self.on_teacher = on_teacher
+        self.port = port
+        self.addresses = addresses or broadcast_addresses()
+        self._stop = threading.Event()
+        self._thread = None
+        # 信标发到公共端口；探测的回复发到另一个临时端口，避免同机的教师端抢收
+        self.beacon_sock = _shared_socket(port)
+        self.probe_sock = _broadcast_socket()
+        self.probe_sock.bind(("", 0))
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.beacon_sock.close()
+        self.probe_sock.close()
+
+    def probe(self):
+        """广播一次探测包"""
+        packet = encode_message("probe")
+        for address in self.addresses:
+            try:
+                self.probe_sock.sendto(packet, (address, self.port))
+            except OSError:
+                pass
+
+    def run(self):
+        """接收循环，直到调用 stop()"""
+        import select
+
+        started = time.monotonic()
+        schedule = list(self.PROBE_SCHEDULE)
+        while not self._stop.is_set():
+            elapsed = time.monotonic() - started
+            while schedule and schedule[0] <= elapsed:
+                schedule.pop(0)
+                self.probe()
+            timeout = 0.2 if not schedule else max(0.0, min(0.2, schedule[0] - elapsed))
+            try:
+                readable, _, _ = select.select([self.beacon_sock, self.probe_sock], [], [], timeout)
+            except (OSError, ValueError):
+                break
+            for sock in readable:
+                try:
+                    packet, (address, _) = sock.recvfrom(2048)
+                except OSError:
+                    continue
+                message = decode_message(packet)
+                if message is None or message.get("type") != "beacon":
+                    continue
+                try:
+                    port = int(message["port"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                self.on_teacher({
+                    "address": address,
+                    "port": port,
+                    "version": message.get("version"),
+                    "name": message.get("name", ""),
+                })
+
+
+def check_teacher(address, port, timeout=(0.5, 1.0)):
+    """确认 address:port 上运行的是教师端（/api/health 返回 ok）"""
+    try:
+        response = requests.get(f"http://{address}:{port}/api/health", timeout=timeout)
+        return response.status_code == 200 and response.json().get("status") == "ok"
+    except (requests.RequestException, ValueError):
+        return False
+
+
+class SubnetScanner:
+    """在本机所在的 /24 网段中并发探测教师端端口（广播被过滤时的后备方案）
+
+    最多同时发起 concurrency 个 TCP 连接，不会冲击交换机。连接超时按已观测到的
+    往返时间自适应（与 TCP 的重传超时相同：平滑 RTT + 4 倍偏差），限制在
+    [MIN_TIMEOUT, MAX_TIMEOUT] 内；主机在线但端口未开放时的拒绝连接也计入 RTT。
+    端口开放的地址再用 /api/health 确认。
+    """
+    CONCURRENCY = 64
+    MIN_TIMEOUT = 0.05
+    MAX_TIMEOUT = 0.5
+
+    def __init__(self, port, local_address=None, concurrency=CONCURRENCY, check=check_teacher):
+        self.port = port
+        self.local_address = local_address or local_ip()
+        self.concurrency = concurrency
+        self.check = check
+        self.srtt = None
+        self.rttvar = None
+        self._executor = None
+
+    def timeout(self):
+        """当前的连接超时"""
+        if self.srtt is None:
+            return self.MAX_TIMEOUT
+        return min(self.MAX_TIMEOUT, max(self.MIN_TIMEOUT, self.srtt + 4 * self.rttvar))
+
+    def observe(self, rtt):
+        """记录一次往返时间（RFC 6298 的平滑算法）"""
+        if self.srtt is None:
+            self.srtt, self.rttvar = rtt, rtt / 2
+        else:
+            self.rttvar = 0.75 * self.rttvar + 0.25 * abs(self.srtt - rtt)
+            self.srtt = 0.875 * self.srtt + 0.125 * rtt
+
+    def candidates(self):
+        """网段内除本机以外的全部地址"""
+        prefix, _, own = self.local_address.rpartition(".")
+        return [f"{prefix}.{host}" for host in range(1, 255) if str(host) != own]
+
+    async def _probe(self, address, semaphore):
+        """端口开放且确认是教师端时返回地址，否则返回 None"""
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                _, writer = await asyncio.wait_for(
+                    asyncio.open_connection(address, self.port), self.timeout())
+            except ConnectionRefusedError:
+                self.observe(time.perf_counter() - started)
+                return None
+            except (OSError, asyncio.TimeoutError):
+                return None
+            self.observe(time.perf_counter() - started)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+        loop = asyncio.get_running_loop()
+        if await loop.run_in_executor(self._executor, self.check, address, self.port):
+            return address
+        return None
+
+    async def scan_async(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        tasks = [asyncio.create_task(self._probe(address, semaphore))
+                 for address in self.candidates()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                address = await next_done
+                if address:
+                    return address
+            return None
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def scan(self):
+        """扫描整个网段，返回第一个确认的教师端地址，没有找到时返回 None"""
+        # 健康检查放在单独的线程池中，找到教师端后不必等其他地址的检查超时
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=8)
+        try:
+            return asyncio.run(self.scan_async())
+        finally:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,190 @@
+"""
+实时推送 - 通过 Server-Sent Events 把老师文件的增删推送给学生端
+
+教师端的 FileManager 每次修改后通知 EventHub，EventHub 把事件分发给每个
+订阅者（一个 SSE 长连接）各自的队列；学生端只需保持一个 HTTP 长连接，按事件
+增删列表中的行，不再反复拉取整个列表。
+
+每个事件带有 "<启动编号>:<序号>" 形式的 id。学生端断线重连时在 Last-Event-ID
+中带上最后收到的 id，只要还在最近的历史记录中就补发错过的事件；否则（教师端
+重启过、断线太久或接收太慢导致队列溢出）发送 resync 事件，让学生端重新拉取一次
+完整列表。
+"""
+import collections
+import json
+import queue
+import threading
+import uuid
+
+# 推送给学生端的事件类型（学生作业的增删只有教师端关心，不推送）
+PUBLIC_EVENT_TYPES = frozenset({"teacher_file_added", "teacher_file_deleted"})
+# 连接空闲时发送心跳注释的间隔（秒），学生端读取超时应大于该值
+HEARTBEAT_INTERVAL = 15
+# 断线后的重连等待（毫秒），通过 retry 字段告知客户端
+RETRY_MS = 3000
+
+
+def format_event(event_type, data, event_id=None):
+    """把一个事件编码为 SSE 文本"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+def iter_events(lines):
+    """解析 SSE 文本行（如 response.iter_lines(decode_unicode=True)），产出 (id, 事件类型, 数据)
+
+    注释行（心跳）被忽略；没有 id 的事件 id 为 None。
+    """
+    event_id, event_type, data = None, "message", []
+    for line in lines:
+        if line is None:
+            continue
+        if line == "":
+            if data:
+                yield event_id, event_type, json.loads("\n".join(data))
+            event_id, event_type, data = None, "message", []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        value = value[1:] if value.startswith(" ") else value
+        if field == "id":
+            event_id = value
+        elif field == "event":
+            event_type = value
+        elif field == "data":
+            data.append(value)
+
+
+class Subscription:
+    """一个 SSE 连接的事件队列"""
+
+    def __init__(self, max_pending):
+        self.queue = queue.Queue(max_pending)
+        self.overflowed = False
+
+
+class EventHub:
+    """把 FileManager 的事件分发给所有 SSE 连接
+
+    publish 可直接注册为 FileManager.listeners 的回调；它只把事件放入各订阅者的
+    有界队列，不会被接收慢的学生端阻塞，队列满的订阅者会收到 resync。
+    """
+    # 同时保持的 SSE 连接上限（每个连接在 waitress 中占用一个工作线程）
+    MAX_SUBSCRIBERS = 100
+    # 每个订阅者最多积压的事件数
+    MAX_PENDING = 1000
+    # 用于断线补发的最近事件数
+    HISTORY_SIZE = 1000
+
+    def __init__(self, max_subscribers=MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        # 启动编号：教师端重启后序号从头开始，旧的 Last-Event-ID 不再有效
+        self.boot_id = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._history = collections.deque(maxlen=self.HISTORY_SIZE)
+        self._subscribers = set()
+        self._closed = False
+
+    def publish(self, event):
+        """登记并分发一个 FileManager 事件（其他类型的事件被忽略）"""
+        if event.get("type") not in PUBLIC_EVENT_TYPES:
+            return
+        with self._lock:
+            self._sequence += 1
+            item = (self._sequence, event)
+            self._history.append(item)
+            for subscription in self._subscribers:
+                if subscription.overflowed:
+                    continue
+                try:
+                    subscription.queue.put_nowait(item)
+                except queue.Full:
+                    # 学生端接收太慢：不再积压，让它重新拉取完整列表
+                    subscription.overflowed = True
+
+    def subscribe(self, last_event_id=None):
+        """订阅事件，返回 (订阅, 需要补发的事件)；连接数已满时返回 (None, None)
+
+        需要补发的事件为 [(序号, 事件)]，无法补发时为 None，此时应发送 resync。
+        """
+        with self._lock:
+            if self._closed or len(self._subscribers) >= self.max_subscribers:
+                return None, None
+            subscription = Subscription(self.MAX_PENDING)
+            self._subscribers.add(subscription)
+            return subscription, self._missed_since(last_event_id)
+
+    def _missed_since(self, last_event_id):
+        """Last-Event-ID 之后的历史事件；id 无效或已超出历史范围时返回 None"""
+        boot_id, _, sequence = (last_event_id or "").partition(":")
+        if boot_id != self.boot_id or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        oldest = self._history[0][0] if self._history else self._sequence + 1
+        if sequence > self._sequence or sequence < oldest - 1:
+            return None
+        return [item for item in self._history if item[0] > sequence]
+
+    def unsubscribe(self, subscription):
+        """取消订阅"""
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        """当前的 SSE 连接数"""
+        with self._lock:
+            return len(self._subscribers)
+
+    def event_id(self, sequence):
+        """事件序号对应的 SSE id"""
+        return f"{self.boot_id}:{sequence}"
+
+    def _reset(self, subscription):
+        """清空订阅者积压的事件，返回当前序号（此后的事件照常分发）"""
+        with self._lock:
+            subscription.queue = queue.Queue(self.MAX_PENDING)
+            subscription.overflowed = False
+            return self._sequence
+
+    def stream(self, subscription, missed, heartbeat=HEARTBEAT_INTERVAL):
+        """逐个产出发给一个连接的 SSE 数据，连接断开（生成器被关闭）时取消订阅"""
+        try:
+            yield f"retry: {RETRY_MS}\n\n".encode("utf-8")
+            if missed is None:
+                yield format_event("resync", {}, self.event_id(self._reset(subscription)))
+            else:
+                for sequence, event in missed:
+                    yield format_event(event["type"], event, self.event_id(sequence))
+            while not self._closed:
+                try:
+                    item = subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    # 心跳：让代理不断开空闲连接，也让服务器及时发现已断开的学生端
+                    yield b": keep-alive\n\n"
+                    continue
+                if item is None:
+                    return
+                if subscription.overflowed:
+                    yield format_event("resync", {}, self.event_id(self._reset(subscription)))
+                    continue
+                sequence, event = item
+                yield format_event(event["type"], event, self.event_id(sequence))
+        finally:
+            self.unsubscribe(subscription)
+
+    def close(self):
+        """结束所有连接（服务器关闭前调用），之后不再接受订阅"""
+        with self._lock:
+            self._closed = True
+            for subscription in self._subscribers:
+                try:
+                    subscription.queue.put_nowait(None)
+                except queue.Full:
+                    # 队列已满的连接取到下一个事件后会检查关闭标志
+                    pass
@@ -0,0 +1,87 @@
+"""
+HTTP 客户端 - 学生端访问教师端的统一入口
+
+所有请求共用一个 requests.Session：连接池保持长连接（keep-alive），反复刷新
+列表、下载小文件时不必每次重新建立 TCP 连接；连接失败和网关错误按指数退避
+（加随机抖动）自动重试；超时分为连接超时和读取超时，教师端不在线时很快失败，
+大文件传输也不受总时长限制。
+"""
+import random
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 默认超时：(连接超时, 两次收到数据之间的读取超时)
+DEFAULT_TIMEOUT = (3.05, 10)
+# 连接池中最多保持的长连接数（多连接下载 + 实时推送 + 上传）
+POOL_SIZE = 16
+# 自动重试次数及退避系数（第 n 次重试前等待约 BACKOFF_FACTOR * 2^(n-1) 秒）
+RETRIES = 3
+BACKOFF_FACTOR = 0.3
+# 自动重试的状态码：网关错误。503 由调用方按 Retry-After 自行处理（如实时推送连接数已满）
+RETRY_STATUSES = frozenset({502, 504})
+# 请求已发出后仍可安全重试的方法；POST 只在连接建立失败（请求未发出）时重试
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+
+
+class JitteredRetry(Retry):
+    """退避时间加随机抖动，避免全班在同一时刻重试"""
+
+    def get_backoff_time(self):
+        return super().get_backoff_time() * random.uniform(0.5, 1.5)
+
+
+class HttpClient:
+    """带连接池、自动重试和默认超时的 HTTP 客户端
+
+    可被多个线程同时使用（urllib3 的连接池是线程安全的）。流式下载时连接在
+    响应关闭后归还连接池，因此应在 with 语句中使用响应。
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, retries=RETRIES, backoff_factor=BACKOFF_FACTOR,
+                 pool_size=POOL_SIZE):
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = JitteredRetry(
+            total=retries,
+            connect=retries,
+            read=1,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=IDEMPOTENT_METHODS,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, url, timeout=None, **kwargs):
+        """发送请求；未指定 timeout 时使用默认的 (连接超时, 读取超时)"""
+        return self.session.request(method, url, timeout=timeout or self.timeout, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request("DELETE", url, **kwargs)
+
+    def close(self):
+        """关闭连接池中的所有连接"""
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
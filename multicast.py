@@ -0,0 +1,448 @@
+"""
+班级广播 - 通过局域网 UDP 组播把老师文件一次推送给全班
+
+教师端把文件切成固定大小的数据块组播出去，每 GROUP_SIZE 个数据块后附带一个
+异或校验块（FEC），同一组内丢失任意一个块都能在接收端就地恢复；教师端的上行
+流量只有一份文件，与学生人数无关。学生端加入组播组重组文件，FEC 恢复不了的块
+再通过 HTTP Range 向教师端补齐，最后按教师端 HTTP 接口给出的 SHA-256 校验。
+学生端只接收已连接的教师端地址发来的组播包。
+"""
+import errno
+import hashlib
+import os
+import random
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# 组播组地址（239.0.0.0/8 为组织内部范围）与端口
+MULTICAST_GROUP = "239.255.42.99"
+MULTICAST_PORT = 5007
+
+MAGIC = b"SFTB"
+# 包类型
+ANNOUNCE, DATA, PARITY, END = 1, 2, 3, 4
+# 所有包的包头：魔数、包类型、传输编号
+HEADER = struct.Struct("!4sBI")
+# 公告包：文件编号、文件大小、块大小、每组数据块数、HTTP 端口、SHA-256，后接 UTF-8 文件名
+ANNOUNCE_FIELDS = struct.Struct("!QQHHH32s")
+# 数据包 / 校验包：块序号 / 组序号，后接数据
+INDEX = struct.Struct("!I")
+# 公告中允许的块大小范围（不超过一个 UDP 包）与最大文件大小，超出范围的公告被丢弃
+MIN_BLOCK_SIZE = 256
+MAX_BLOCK_SIZE = 65507
+MAX_FILE_SIZE = 16 * 1024 ** 3
+
+
+def xor_blocks(blocks, block_size):
+    """把若干数据块（不足 block_size 的末尾补零）按字节异或"""
+    value = 0
+    for block in blocks:
+        value ^= int.from_bytes(block.ljust(block_size, b"\0"), "big")
+    return value.to_bytes(block_size, "big")
+
+
+class BroadcastSender:
+    """组播发送端（教师端）
+
+    按固定速率发送，避免瞬间灌满交换机和学生机的接收缓冲区。公告包在开头
+    和传输过程中定期重发，中途加入的学生也能拿到文件信息。
+    """
+    # 每个数据块的字节数：加上 IP/UDP 和本协议包头后不超过以太网 MTU
+    BLOCK_SIZE = 1400
+    # 每组数据块数，每组附带一个校验块（约 6% 冗余）
+    GROUP_SIZE = 16
+    # 发送速率（字节/秒），约 64 Mbit/s
+    RATE = 8 * 1024 * 1024
+    # 每隔多少个数据块重发一次公告
+    ANNOUNCE_INTERVAL = 512
+    # 开头的公告和结尾的结束包各发送几次
+    REPEAT = 3
+
+    def __init__(self, group=MULTICAST_GROUP, port=MULTICAST_PORT, interface="0.0.0.0",
+                 ttl=1, rate=RATE, block_size=BLOCK_SIZE, group_size=GROUP_SIZE):
+        self.address = (group, port)
+        self.rate = rate
+        self.block_size = block_size
+        self.group_size = group_size
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        # 本机运行的学生端（以及测试）也能收到
+        self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+        if interface != "0.0.0.0":
+            self.sock.setsockopt(
+                socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface)
+            )
+        self._next_send = 0.0
+
+    def send_file(self, file_path, file_id, content_hash, name, http_port,
+                  on_progress=None, cancel=None):
+        """组播整个文件，返回传输编号
+
+        on_progress(已发送字节, 总字节) 报告进度；cancel 为 threading.Event，
+        置位后停止发送（学生端会在超时后用 HTTP 补齐）。
+        """
+        transfer_id = random.getrandbits(32)
+        file_size = os.path.getsize(file_path)
+        announce = self._packet(ANNOUNCE, transfer_id, ANNOUNCE_FIELDS.pack(
+            int(file_id), file_size, self.block_size, self.group_size, http_port,
+            bytes.fromhex(content_hash)
+        ) + name.encode("utf-8"))
+        self._next_send = time.perf_counter()
+        for _ in range(self.REPEAT):
+            self._send(announce)
+
+        sent = 0
+        group = []
+        index = 0
+        with open(file_path, "rb") as f:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    break
+                block = f.read(self.block_size)
+                if not block:
+                    break
+                self._send(self._packet(DATA, transfer_id, INDEX.pack(index) + block))
+                group.append(block)
+                index += 1
+                sent += len(block)
+                # 一组凑满（或到文件末尾）时发送该组的校验块
+                if len(group) == self.group_size or sent == file_size:
+                    parity = xor_blocks(group, self.block_size)
+                    group_index = (index - 1) // self.group_size
+                    self._send(self._packet(PARITY, transfer_id, INDEX.pack(group_index) + parity))
+                    group = []
+                if index % self.ANNOUNCE_INTERVAL == 0:
+                    self._send(announce)
+                if on_progress is not None:
+                    on_progress(sent, file_size)
+
+        end = self._packet(END, transfer_id, b"")
+        for _ in range(self.REPEAT):
+            self._send(end)
+            time.sleep(0.05)
+        return transfer_id
+
+    @staticmethod
+    def _packet(kind, transfer_id, body):
+        return HEADER.pack(MAGIC, kind, transfer_id) + body
+
+    def _send(self, packet):
+        """按设定速率发送一个包；发送缓冲区满时稍等重试"""
+        delay = self._next_send - time.perf_counter()
+        if delay > 0.002:
+            time.sleep(delay)
+        self._next_send = max(self._next_send, time.perf_counter() - 0.01) + len(packet) / self.rate
+        while True:
+            try:
+                self.sock.sendto(packet, self.address)
+                return
+            except OSError as e:
+                if e.errno not in (errno.ENOBUFS, errno.EAGAIN):
+                    raise
+                time.sleep(0.001)
+
+    def close(self):
+        self.sock.close()
+
+
+class IncomingBroadcast:
+    """学生端一次正在接收的组播传输"""
+
+    def __init__(self, transfer_id, sender, fields, name, dest_dir):
+        file_id, file_size, block_size, group_size, http_port, digest = fields
+        if (not MIN_BLOCK_SIZE <= block_size <= MAX_BLOCK_SIZE or group_size == 0
+                or file_size > MAX_FILE_SIZE):
+            raise ValueError("公告包中的文件参数无效")
+        self.transfer_id = transfer_id
+        self.sender = sender
+        self.file_id = file_id
+        self.file_size = file_size
+        self.block_size = block_size
+        self.group_size = group_size
+        self.http_port = http_port
+        self.content_hash = digest.hex()
+        self.name = os.path.basename(name) or f"file_{file_id}"
+        self.block_count = (file_size + block_size - 1) // block_size
+        self.received = bytearray(self.block_count)
+        # 通过校验块恢复的块数、通过 HTTP 补齐的块数
+        self.recovered = 0
+        self.fetched = 0
+        self.last_packet = time.monotonic()
+        self.part_path = os.path.join(dest_dir, f"{self.name}.{transfer_id:08x}.part")
+        self.file = open(self.part_path, "w+b")
+        try:
+            self.file.truncate(file_size)
+        except OSError:
+            # 磁盘空间不足等：不留下空的临时文件
+            self.file.close()
+            os.remove(self.part_path)
+            raise
+
+    def block_length(self, index):
+        return min(self.block_size, self.file_size - index * self.block_size)
+
+    def write_block(self, index, data):
+        if index >= self.block_count or self.received[index]:
+            return
+        self.file.seek(index * self.block_size)
+        self.file.write(data[:self.block_length(index)])
+        self.received[index] = 1
+
+    def read_block(self, index):
+        self.file.seek(index * self.block_size)
+        return self.file.read(self.block_length(index))
+
+    def apply_parity(self, group_index, parity):
+        """组内恰好缺一个块时，用校验块和其余块异或出缺失的块"""
+        if len(parity) != self.block_size:
+            return
+        first = group_index * self.group_size
+        indexes = range(first, min(first + self.group_size, self.block_count))
+        missing = [i for i in indexes if not self.received[i]]
+        if len(missing) != 1:
+            return
+        others = [self.read_block(i) for i in indexes if i != missing[0]]
+        self.write_block(missing[0], xor_blocks(others + [parity], self.block_size))
+        self.recovered += 1
+
+    def missing_ranges(self):
+        """仍然缺失的块合并成的字节区间列表 [(起始, 结束), ...]（结束不含）"""
+        ranges = []
+        for index in range(self.block_count):
+            if self.received[index]:
+                continue
+            start = index * self.block_size
+            end = start + self.block_length(index)
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], end)
+            else:
+                ranges.append((start, end))
+        return ranges
+
+
+class BroadcastReceiver:
+    """组播接收端（学生端）
+
+    后台线程持续监听组播组；每收到一次完整传输（结束包或长时间没有新包），
+    就交给工作线程用 HTTP 补齐缺失的块、校验哈希，并把文件保存到 dest_dir，
+    接收线程继续接收其他传输。
+    teacher 为已连接的教师端 (IP 地址, HTTP 端口)：只接收该地址发来的包，
+    补块和核对哈希也只向它请求；未设置时忽略所有包（连接后调用 set_teacher()）。
+    on_event(事件字典) 报告 broadcast_started / broadcast_done / broadcast_failed。
+    """
+    # 接收缓冲区大小，给 Python 线程调度留出余量
+    RECV_BUFFER = 4 * 1024 * 1024
+    # 一次传输多久没有收到新包就视为结束（结束包全部丢失时）
+    IDLE_TIMEOUT = 3.0
+    # HTTP 补块的超时：(连接超时, 读取超时)
+    FETCH_TIMEOUT = (5, 30)
+    # HTTP 补块时每次写入文件的字节数
+    FETCH_CHUNK_SIZE = 256 * 1024
+    # 同时补块、校验的传输数
+    FINISH_WORKERS = 2
+
+    def __init__(self, dest_dir, group=MULTICAST_GROUP, port=MULTICAST_PORT,
+                 interface="0.0.0.0", on_event=None, teacher=None):
+        self.dest_dir = dest_dir
+        self.on_event = on_event
+        self.teacher = teacher
+        self.transfers = {}
+        self.finished = set()
+        self._stop = threading.Event()
+        self._thread = None
+        self._workers = ThreadPoolExecutor(max_workers=self.FINISH_WORKERS,
+                                           thread_name_prefix="broadcast-finish")
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            # 同一台机器上的多个学生端（以及测试）共用端口
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.RECV_BUFFER)
+        self.sock.bind(("", port))
+        self.sock.setsockopt(
+            socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+            socket.inet_aton(group) + socket.inet_aton(interface)
+        )
+        self.sock.settimeout(0.5)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def set_teacher(self, address, http_port):
+        """设置已连接的教师端（地址也可以是主机名），此后只接收该地址的推送"""
+        self.teacher = (socket.gethostbyname(address), http_port)
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        # 不等待正在补块的传输，尚未开始的放弃
+        self._workers.shutdown(wait=False, cancel_futures=True)
+        self.sock.close()
+
+    def run(self):
+        """接收循环，直到调用 stop()"""
+        while not self._stop.is_set():
+            try:
+                packet, (sender, _) = self.sock.recvfrom(65536)
+            except socket.timeout:
+                packet = None
+            except OSError:
+                break
+            if packet:
+                try:
+                    self.handle_packet(packet, sender)
+                except (struct.error, ValueError, OSError):
+                    # 损坏或伪造的包只丢弃这一个，接收线程继续运行
+                    pass
+            now = time.monotonic()
+            for incoming in list(self.transfers.values()):
+                if now - incoming.last_packet > self.IDLE_TIMEOUT:
+                    self.finish(incoming)
+
+    def handle_packet(self, packet, sender):
+        teacher = self.teacher
+        if teacher is None or sender != teacher[0]:
+            # 局域网中其他机器（如同学）发来的包
+            return
+        if len(packet) < HEADER.size:
+            return
+        magic, kind, transfer_id = HEADER.unpack_from(packet)
+        if magic != MAGIC or transfer_id in self.finished:
+            return
+        body = packet[HEADER.size:]
+        incoming = self.transfers.get(transfer_id)
+
+        if kind == ANNOUNCE:
+            if incoming is None:
+                if len(body) < ANNOUNCE_FIELDS.size:
+                    return
+                fields = ANNOUNCE_FIELDS.unpack_from(body)
+                name = body[ANNOUNCE_FIELDS.size:].decode("utf-8", "replace")
+                os.makedirs(self.dest_dir, exist_ok=True)
+                incoming = IncomingBroadcast(transfer_id, sender, fields, name, self.dest_dir)
+                incoming.teacher_url = f"http://{teacher[0]}:{teacher[1]}"
+                self.transfers[transfer_id] = incoming
+                self.emit("broadcast_started", incoming)
+            incoming.last_packet = time.monotonic()
+            return
+        if incoming is None:
+            # 还没收到公告：这些块最后通过 HTTP 补齐
+            return
+        incoming.last_packet = time.monotonic()
+        if kind == DATA:
+            (index,) = INDEX.unpack_from(body)
+            incoming.write_block(index, body[INDEX.size:])
+        elif kind == PARITY:
+            (group_index,) = INDEX.unpack_from(body)
+            incoming.apply_parity(group_index, body[INDEX.size:])
+        elif kind == END:
+            self.finish(incoming)
+
+    def finish(self, incoming):
+        """结束接收一次传输，交给工作线程补块、校验和保存"""
+        del self.transfers[incoming.transfer_id]
+        self.finished.add(incoming.transfer_id)
+        try:
+            self._workers.submit(self.complete, incoming)
+        except RuntimeError:
+            # 正在停止
+            incoming.file.close()
+            os.remove(incoming.part_path)
+
+    def complete(self, incoming):
+        """补齐缺失块、按教师端给出的哈希校验并保存文件（在工作线程中执行）"""
+        try:
+            if self.fetch_content_hash(incoming) != incoming.content_hash:
+                raise ValueError("推送的文件与教师端的不一致")
+            missing = incoming.missing_ranges()
+            if missing:
+                self.fetch_missing(incoming, missing)
+            incoming.file.close()
+            with open(incoming.part_path, "rb") as f:
+                digest = hashlib.file_digest(f, "sha256").hexdigest()
+            if digest != incoming.content_hash:
+                raise ValueError("文件校验失败")
+            incoming.path = self.unique_path(incoming.name)
+            os.replace(incoming.part_path, incoming.path)
+            self.emit("broadcast_done", incoming)
+        except Exception as e:
+            incoming.file.close()
+            if os.path.exists(incoming.part_path):
+                os.remove(incoming.part_path)
+            self.emit("broadcast_failed", incoming, error=str(e))
+
+    def fetch_content_hash(self, incoming):
+        """向教师端查询该文件的 SHA-256（公告包中的哈希只用于比对）"""
+        response = requests.head(
+            f"{incoming.teacher_url}/api/teacher/files/{incoming.file_id}", timeout=self.FETCH_TIMEOUT
+        )
+        if response.status_code != 200:
+            raise ValueError(f"无法从教师端核对文件: HTTP {response.status_code}")
+        return response.headers.get("X-Content-SHA256")
+
+    def fetch_missing(self, incoming, ranges):
+        """通过 HTTP Range 向教师端下载缺失的字节区间
+
+        流式写入文件（中途加入的学生可能缺少大半个文件），每个块写完整后即标记为已接收。
+        """
+        url = f"{incoming.teacher_url}/api/teacher/files/{incoming.file_id}"
+        with requests.Session() as session:
+            for start, end in ranges:
+                with session.get(
+                    url,
+                    headers={"Range": f"bytes={start}-{end - 1}",
+                             "If-Range": f'"{incoming.content_hash}"'},
+                    stream=True,
+                    timeout=self.FETCH_TIMEOUT,
+                ) as response:
+                    if response.status_code != 206:
+                        raise ValueError(f"补齐缺失数据失败: HTTP {response.status_code}")
+                    incoming.file.seek(start)
+                    position = start
+                    # 区间总是从块的边界开始、到块的末尾结束
+                    index = start // incoming.block_size
+                    for chunk in response.iter_content(self.FETCH_CHUNK_SIZE):
+                        chunk = chunk[:end - position]
+                        incoming.file.write(chunk)
+                        position += len(chunk)
+                        while (index < incoming.block_count
+                               and index * incoming.block_size + incoming.block_length(index) <= position):
+                            incoming.received[index] = 1
+                            incoming.fetched += 1
+                            index += 1
+                if position != end:
+                    raise ValueError(f"补齐缺失数据不完整: {position - start}/{end - start} 字节")
+
+    def unique_path(self, name):
+        """目标目录中已有同名文件时追加序号"""
+        stem, ext = os.path.splitext(name)
+        path = os.path.join(self.dest_dir, name)
+        counter = 1
+        while os.path.exists(path):
+            path = os.path.join(self.dest_dir, f"{stem} ({counter}){ext}")
+            counter += 1
+        return path
+
+    def emit(self, event_type, incoming, **payload):
+        if self.on_event is None:
+            return
+        event = {
+            "type": event_type,
+            "name": incoming.name,
+            "file_size": incoming.file_size,
+            "blocks": incoming.block_count,
+            "recovered": incoming.recovered,
+            "fetched": incoming.fetched,
+        }
+        if event_type == "broadcast_done":
+            event["path"] = incoming.path
+        event.update(payload)
+        self.on_event(event)
@@ -1,33 +1,258 @@
 """
-学生端应用 - 手动输入教师端地址连接
+学生端应用 - 自动发现教师端（也可手动输入地址连接）
 """
 
+import collections
+import hashlib
+import json
 import os
+import random
 import socket
+import queue
 import threading
+import time
 import tkinter as tk
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from pathlib import Path
 from tkinter import filedialog, messagebox, simpledialog, ttk
 
 import requests
 
+import event_stream
+from discovery import SubnetScanner, TeacherListener, check_teacher
+from http_client import HttpClient
+from ui_dispatch import UiDispatcher
+import wire_compression
+from multicast import BroadcastReceiver
+from swarm import SwarmPeer
+
+
+class ParallelDownload:
+    """多连接分段下载
+
+    把文件切成固定大小的分段放入队列，由线程池中的多个连接并发地用 Range
+    请求拉取，各自在临时文件的对应偏移处写入（每个连接持有独立的文件句柄）。
+    连接数从 INITIAL_CONNECTIONS 开始，根据实测吞吐量逐步增减，最多
+    MAX_CONNECTIONS 个，避免单个学生占满教师端带宽。
+    """
+
+    SEGMENT_SIZE = 8 * 1024 * 1024
+    INITIAL_CONNECTIONS = 2
+    MAX_CONNECTIONS = 4
+    # 每隔多少秒采样一次吞吐量
+    SAMPLE_INTERVAL = 1.0
+    # 吞吐量至少提升这个倍数才继续增加连接，下降到 1/倍数 以下则减少连接
+    SCALE_GAIN = 1.15
+    SEGMENT_RETRIES = 3
+
+    def __init__(
+        self, http, url, part_path, total, etag, timeout, chunk_size, on_progress
+    ):
+        self.http = http
+        self.url = url
+        self.part_path = part_path
+        self.total = total
+        self.etag = etag
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.on_progress = on_progress
+
+        self._segments = queue.Queue()
+        self._lock = threading.Lock()
+        self._received = 0
+        self._target = self.INITIAL_CONNECTIONS
+        self._running = 0
+        self._error = None
+
+    def run(self):
+        """执行下载，出错时抛出第一个失败分段的异常"""
+        with open(self.part_path, "wb") as f:
+            f.truncate(self.total)
+        for start in range(0, self.total, self.SEGMENT_SIZE):
+            end = min(start + self.SEGMENT_SIZE, self.total) - 1
+            self._segments.put((start, end))
+
+        with ThreadPoolExecutor(max_workers=self.MAX_CONNECTIONS) as pool:
+            futures = [self._start_worker(pool) for _ in range(self._target)]
+            best_rate = 0.0
+            last_received = 0
+            last_time = time.monotonic()
+            while not all(future.done() for future in futures):
+                wait(futures, timeout=self.SAMPLE_INTERVAL, return_when=FIRST_EXCEPTION)
+                now = time.monotonic()
+                with self._lock:
+                    received = self._received
+                self.on_progress(received, self.total)
+
+                rate = (received - last_received) / max(now - last_time, 1e-6)
+                last_received, last_time = received, now
+                if self._segments.empty() or self._error is not None:
+                    continue
+
+                with self._lock:
+                    if rate >= best_rate * self.SCALE_GAIN and self._target < self.MAX_CONNECTIONS:
+                        # 加连接仍能提升吞吐量，继续加
+                        best_rate = rate
+                        self._target += 1
+                        futures.append(self._start_worker(pool))
+                    elif rate < best_rate / self.SCALE_GAIN and self._target > 1:
+                        # 吞吐量下降（链路饱和或教师端繁忙），收回一个连接并重新取基准
+                        best_rate = rate
+                        self._target -= 1
+
+        if self._error is not None:
+            raise self._error
+        self.on_progress(self._received, self.total)
+
+    def _start_worker(self, pool):
+        with self._lock:
+            self._running += 1
+        return pool.submit(self._worker)
+
+    def _worker(self):
+        """不断从队列中取分段下载，直到队列为空或连接数需要收缩"""
+        with open(self.part_path, "r+b") as f:
+            while self._error is None:
+                with self._lock:
+                    if self._running > self._target:
+                        self._running -= 1
+                        return
+                try:
+                    start, end = self._segments.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    self._fetch_segment(f, start, end)
+                except Exception as e:
+                    self._error = e
+                    break
+        with self._lock:
+            self._running -= 1
+
+    def _fetch_segment(self, f, start, end):
+        """下载一个分段并写入文件的对应位置，网络错误时重试该分段"""
+        for attempt in range(self.SEGMENT_RETRIES + 1):
+            position = start
+            try:
+                headers = {"Range": f"bytes={start}-{end}", "If-Range": self.etag}
+                with self.http.get(
+                    self.url, headers=headers, stream=True, timeout=self.timeout
+                ) as response:
+                    if response.status_code != 206:
+                        raise IOError("服务器未返回分段内容，文件可能已被修改")
+                    f.seek(start)
+                    for chunk in response.iter_content(self.chunk_size):
+                        f.write(chunk)
+                        position += len(chunk)
+                        with self._lock:
+                            self._received += len(chunk)
+                if position != end + 1:
+                    raise requests.exceptions.ChunkedEncodingError(
+                        f"分段不完整：{position - start}/{end + 1 - start} 字节"
+                    )
+                return
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+            ):
+                # 回退本分段已计入的字节，重新下载整个分段
+                with self._lock:
+                    self._received -= position - start
+                if attempt == self.SEGMENT_RETRIES:
+                    raise
+                time.sleep((2**attempt) * random.uniform(0.5, 1.5))
+
 
 class StudentApp:
+    # 下载时每次写入磁盘的块大小
+    DOWNLOAD_CHUNK_SIZE = 256 * 1024
+    # 下载超时：(连接超时, 两次收到数据之间的读取超时)，大文件不再受总时长限制
+    DOWNLOAD_TIMEOUT = (5, 30)
+    # 超过该大小且服务器支持 Range 时才使用多连接下载
+    PARALLEL_MIN_SIZE = 32 * 1024 * 1024
+    # 还没有同学持有某个文件时，超过该大小才用 P2P 下载（之后下载的同学可以从这里获取）；
+    # 其余情况用可压缩、可续传的普通下载
+    SWARM_MIN_SIZE = 64 * 1024 * 1024
+    # 上传/下载中断后自动重试的次数及首次重试等待秒数
+    TRANSFER_RETRIES = 5
+    TRANSFER_RETRY_DELAY = 1.0
+    # 上传单个分块的超时：(连接超时, 读取超时)
+    UPLOAD_TIMEOUT = (5, 60)
+    # 老师"推送给全班"的文件保存目录
+    BROADCAST_DIR = Path.home() / "老师推送"
+    # 实时推送连接的超时：(连接超时, 读取超时)，读取超时需大于服务器的心跳间隔
+    EVENT_STREAM_TIMEOUT = (5, event_stream.HEARTBEAT_INTERVAL * 3)
+    # 实时推送断线后重连的最长等待秒数
+    EVENT_STREAM_MAX_DELAY = 30
+    # 保留最近应用过的推送事件数，用于合并到之后才返回的完整列表
+    EVENT_LOG_SIZE = 1000
+    # 拉取老师文件列表时每页的条数（教师端允许的最大值，尽量一次取完）
+    LISTING_PAGE_SIZE = 500
+    # 翻页期间列表变化时最多从第一页重新拉取的次数
+    LISTING_RESTARTS = 3
+    # 上次连接的教师端地址，下次启动时优先尝试
+    LAST_TEACHER_FILE = Path.home() / ".file_transfer_last_teacher.json"
+    # 未完成的分块上传会话，重启后可继续上传
+    UPLOAD_SESSIONS_FILE = Path.home() / ".file_transfer_uploads.json"
+    # 上传会话记录的保留秒数（与教师端保留未完成会话的时间一致）
+    UPLOAD_SESSION_TTL = 24 * 3600
+    # 等待教师端信标的秒数，超时后退回网段扫描
+    DISCOVERY_GRACE = 3.0
+
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("学生端 - 文件传输系统")
         self.root.geometry("700x500")
 
+        # 后台线程通过该队列更新界面（Tk 只能在主线程中操作）
+        self.ui = UiDispatcher(self.root)
+
         # 学生姓名
         self.student_name = ""
 
-        # 教师端连接信息（改为手动输入）
+        # 访问教师端的 HTTP 客户端：所有请求共用连接池中的长连接
+        self.http = HttpClient()
+
+        # 教师端连接信息（自动发现或手动输入）
         self.teacher_ip = None
         self.teacher_port = 5000
         self.base_url = None
+        self.connecting = False
+        # 信标中教师端的元数据版本号，实时推送未连接时据此判断是否需要刷新列表
+        self.teacher_version = None
+
+        # 上次获取的老师文件列表及其 ETag（用于条件请求）
+        self.teacher_files_etag = None
+        self.teacher_files = []
+        # 已应用的老师文件增删事件数及最近的事件 (类型, 数据)：拉取完整列表期间
+        # 收到的事件在列表返回后重新应用，避免被较早的列表覆盖
+        self.teacher_file_event_count = 0
+        self.teacher_file_events = collections.deque(maxlen=self.EVENT_LOG_SIZE)
+        # 实时推送连接的代数：重新连接教师端后旧的推送线程自行退出
+        self.event_stream_generation = 0
+        self.event_stream_connected = False
+
+        # 未完成的分块上传会话：(教师端, 文件路径, 大小, 修改时间, 姓名, 描述) -> upload_id，
+        # 保存在磁盘上，程序重启后仍能续传
+        self.upload_sessions = self.load_upload_sessions()
+        self.upload_sessions_lock = threading.Lock()
 
         # 创建界面
         self.create_widgets()
 
+        # 监听老师的组播推送
+        self.broadcast_receiver = None
+        self.start_broadcast_receiver()
+
+        # P2P 分块服务器：把已下载的老师文件分块提供给同学
+        self.swarm_peer = None
+        self.start_swarm_peer()
+
+        # 监听教师端信标，发现后自动连接
+        self.teacher_listener = None
+        self.start_teacher_discovery()
+
         # 获取学生姓名
         self.get_student_name()
 
@@ -144,6 +369,27 @@ class StudentApp:
         )
         download_btn.grid(row=2, column=0, pady=(10, 0))
 
+        # 下载进度
+        self.progress_var = tk.DoubleVar(value=0)
+        progress_bar = ttk.Progressbar(
+            teacher_frame, variable=self.progress_var, maximum=100
+        )
+        progress_bar.grid(row=2, column=1, sticky=(tk.W, tk.E), padx=(10, 0), pady=(10, 0))
+
+        # 大文件多连接下载开关
+        self.parallel_download_var = tk.BooleanVar(value=True)
+        parallel_check = ttk.Checkbutton(
+            teacher_frame, text="多连接下载", variable=self.parallel_download_var
+        )
+        parallel_check.grid(row=2, column=2, padx=(10, 0), pady=(10, 0))
+
+        # 从同学处获取分块（P2P）开关
+        self.swarm_download_var = tk.BooleanVar(value=True)
+        swarm_check = ttk.Checkbutton(
+            teacher_frame, text="同学互传", variable=self.swarm_download_var
+        )
+        swarm_check.grid(row=2, column=3, padx=(10, 0), pady=(10, 0))
+
         # 作业上传区域
         work_frame = ttk.LabelFrame(main_frame, text="作业上传", padding="10")
         work_frame.grid(
@@ -219,28 +465,171 @@ class StudentApp:
         if not port_text.isdigit():
             messagebox.showwarning("警告", "端口必须为数字")
             return
-        port = int(port_text)
+        self.connect_to(ip, int(port_text))
+
+    def connect_to(self, ip, port):
+        """检查教师端是否在线并连接（在后台线程中进行）"""
+        self.connecting = True
         self.connection_status_var.set("正在连接...")
 
         def do_connect():
             try:
                 url_base = f"http://{ip}:{port}"
-                resp = requests.get(f"{url_base}/api/health", timeout=5)
+                resp = self.http.get(f"{url_base}/api/health")
                 if resp.status_code == 200:
                     data = resp.json()
                     if data.get("status") == "ok":
                         self.teacher_ip = ip
                         self.teacher_port = port
                         self.base_url = url_base
-                        self.connection_status_var.set(f"已连接: {ip}:{port}")
+                        self.teacher_files_etag = None
+                        if self.broadcast_receiver is not None:
+                            # 只接收这台教师端推送的文件
+                            self.broadcast_receiver.set_teacher(ip, port)
+                        self.ui.set(self.connection_status_var, f"已连接: {ip}:{port}")
+                        self.save_last_teacher(ip, port)
                         self.refresh_teacher_files()
+                        self.start_event_stream()
                         return
-                self.connection_status_var.set("连接失败，请确认IP/端口及教师端已启动")
+                self.ui.set(self.connection_status_var, "连接失败，请确认IP/端口及教师端已启动")
             except Exception as e:
-                self.connection_status_var.set(f"连接错误: {e}")
+                self.ui.set(self.connection_status_var, f"连接错误: {e}")
+            finally:
+                self.connecting = False
 
         threading.Thread(target=do_connect, daemon=True).start()
 
+    def start_teacher_discovery(self):
+        """自动寻找教师端：上次连接的地址、信标，都不可用时扫描网段"""
+        try:
+            self.teacher_listener = TeacherListener(
+                lambda teacher: self.ui.post(self.on_teacher_found, teacher)
+            )
+            self.teacher_listener.start()
+        except OSError as e:
+            # 端口被占用等情况下仍可扫描网段或手动输入地址
+            self.connection_status_var.set(f"未连接（无法接收教师端信标: {e}）")
+        threading.Thread(target=self.auto_connect, daemon=True).start()
+
+    def auto_connect(self):
+        """依次尝试上次连接的教师端、等待信标、扫描网段（在后台线程中执行）"""
+        last = self.load_last_teacher()
+        if last and check_teacher(last["address"], last["port"]):
+            self.ui.post(self.auto_connect_to, last["address"], last["port"])
+            return
+
+        deadline = time.monotonic() + self.DISCOVERY_GRACE
+        while time.monotonic() < deadline:
+            if self.base_url or self.connecting:
+                return
+            time.sleep(0.1)
+        if self.base_url or self.connecting:
+            return
+
+        # 交换机过滤了广播：并发扫描本网段的教师端端口
+        self.ui.set(self.connection_status_var, "未收到教师端信标，正在扫描网段...")
+        port = last["port"] if last else self.teacher_port
+        address = SubnetScanner(port).scan()
+        if address:
+            self.ui.post(self.auto_connect_to, address, port)
+        elif not (self.base_url or self.connecting):
+            self.ui.set(self.connection_status_var, "未找到教师端，请手动输入IP和端口")
+
+    def auto_connect_to(self, address, port):
+        """尚未连接时，填入自动找到的地址并连接（在主线程中执行）"""
+        if self.base_url or self.connecting:
+            return
+        self.ip_var.set(address)
+        self.port_var.set(str(port))
+        self.connect_to(address, port)
+
+    def load_last_teacher(self):
+        """读取上次连接的教师端地址，没有时返回 None"""
+        try:
+            with open(self.LAST_TEACHER_FILE, "r", encoding="utf-8") as f:
+                last = json.load(f)
+            return {"address": str(last["address"]), "port": int(last["port"])}
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save_last_teacher(self, address, port):
+        """记住本次连接的教师端地址"""
+        try:
+            with open(self.LAST_TEACHER_FILE, "w", encoding="utf-8") as f:
+                json.dump({"address": address, "port": port}, f)
+        except OSError:
+            pass
+
+    def load_upload_sessions(self):
+        """读取未完成的上传会话，丢弃超过保留时间的记录"""
+        try:
+            with open(self.UPLOAD_SESSIONS_FILE, "r", encoding="utf-8") as f:
+                sessions = json.load(f)
+            cutoff = time.time() - self.UPLOAD_SESSION_TTL
+            return {
+                str(key): {"upload_id": str(entry["upload_id"]), "saved": float(entry["saved"])}
+                for key, entry in sessions.items() if float(entry["saved"]) > cutoff
+            }
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return {}
+
+    def save_upload_sessions(self):
+        """把未完成的上传会话写入磁盘（调用方持有 upload_sessions_lock）"""
+        tmp_path = f"{self.UPLOAD_SESSIONS_FILE}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.upload_sessions, f)
+            os.replace(tmp_path, self.UPLOAD_SESSIONS_FILE)
+        except OSError:
+            pass
+
+    def on_teacher_found(self, teacher):
+        """收到教师端信标：未连接时自动连接，已连接时按版本号补刷新（在主线程中执行）"""
+        url_base = f"http://{teacher['address']}:{teacher['port']}"
+        if self.base_url == url_base:
+            if (
+                not self.event_stream_connected
+                and teacher["version"] != self.teacher_version
+            ):
+                self.teacher_version = teacher["version"]
+                self.refresh_teacher_files()
+            return
+        if self.base_url or self.connecting:
+            return
+        self.teacher_version = teacher["version"]
+        self.auto_connect_to(teacher["address"], teacher["port"])
+
+    def start_broadcast_receiver(self):
+        """加入班级组播组，接收老师推送给全班的文件"""
+        try:
+            self.broadcast_receiver = BroadcastReceiver(
+                str(self.BROADCAST_DIR),
+                interface=self.get_local_ip(),
+                on_event=lambda event: self.ui.post(self.on_broadcast_event, event),
+            )
+            self.broadcast_receiver.start()
+        except OSError as e:
+            # 没有可用网卡或端口被占用时仍可手动下载
+            self.status_var.set(f"无法接收班级推送: {e}")
+
+    def start_swarm_peer(self):
+        """启动 P2P 分块服务器"""
+        try:
+            self.swarm_peer = SwarmPeer()
+            self.swarm_peer.start()
+        except OSError as e:
+            self.status_var.set(f"无法启动同学互传: {e}")
+
+    def on_broadcast_event(self, event):
+        """处理组播接收线程的事件（经界面更新队列转到主线程执行）"""
+        if event["type"] == "broadcast_started":
+            self.status_var.set(f"正在接收老师推送: {event['name']}")
+        elif event["type"] == "broadcast_done":
+            self.status_var.set(f"已接收老师推送: {event['path']}")
+            messagebox.showinfo("老师推送", f"已收到文件：\n{event['path']}")
+        elif event["type"] == "broadcast_failed":
+            self.status_var.set(f"接收老师推送失败: {event['error']}")
+
     def get_local_ip(self):
         """获取本机IP地址"""
         try:
@@ -253,49 +642,184 @@ class StudentApp:
             return "127.0.0.1"
 
     def refresh_teacher_files(self):
-        """刷新老师文件列表"""
+        """刷新老师文件列表
+
+        ETag 是整个列表的版本号：第一页返回 304 说明所有页都没有变化，直接沿用；
+        否则逐页重新拉取。后续页的 ETag 与第一页不同时说明翻页期间列表有变化，
+        从第一页重新拉取，避免把两个版本的页拼在一起。
+        """
         if not self.base_url:
             return
+        event_count = self.teacher_file_event_count
 
         def load_files():
             try:
-                response = requests.get(f"{self.base_url}/api/teacher/files", timeout=5)
-                if response.status_code == 200:
+                files = []
+                cursor = None
+                etag = None
+                restarts = 0
+                while True:
+                    params = {"limit": self.LISTING_PAGE_SIZE}
+                    if cursor:
+                        params["after"] = cursor
+                    headers = {}
+                    if not cursor and self.teacher_files_etag:
+                        headers["If-None-Match"] = self.teacher_files_etag
+                    response = self.http.get(
+                        f"{self.base_url}/api/teacher/files",
+                        params=params,
+                        headers=headers,
+                    )
+                    if response.status_code == 304:
+                        # 列表未变化，沿用已显示的内容
+                        self.ui.set(
+                            self.status_var,
+                            f"已加载 {len(self.teacher_files)} 个文件（无变化）",
+                        )
+                        return
+                    if response.status_code != 200:
+                        break
                     data = response.json()
-                    if data.get("success"):
-                        files = data.get("files", [])
-
-                        # 清空现有项目
-                        for item in self.teacher_tree.get_children():
-                            self.teacher_tree.delete(item)
+                    if not data.get("success"):
+                        break
+                    if not cursor:
+                        etag = response.headers.get("ETag")
+                    elif response.headers.get("ETag") != etag and restarts < self.LISTING_RESTARTS:
+                        # 翻页期间列表有变化，从第一页重新拉取
+                        restarts += 1
+                        files, cursor, etag = [], None, None
+                        continue
+                    files.extend(data.get("files", []))
+                    # 按游标继续拉取下一页
+                    cursor = data.get("next_cursor")
+                    if not cursor:
+                        break
 
-                        # 添加文件到列表
-                        for file_info in files:
-                            file_size = self.format_file_size(
-                                file_info.get("file_size", 0)
-                            )
-                            upload_time = file_info.get("upload_time", "")[:19].replace(
-                                "T", " "
-                            )
-
-                            self.teacher_tree.insert(
-                                "",
-                                "end",
-                                text=file_info.get("filename", ""),
-                                values=(file_size, upload_time),
-                                tags=(file_info.get("file_id", ""),),
-                            )
-
-                        self.status_var.set(f"已加载 {len(files)} 个文件")
+                if response.status_code == 200:
+                    if data.get("success"):
+                        self.ui.post(self.show_teacher_files, files, etag, event_count)
                     else:
-                        self.status_var.set("获取文件列表失败")
+                        self.ui.set(self.status_var, "获取文件列表失败")
                 else:
-                    self.status_var.set("连接教师端失败")
+                    self.ui.set(self.status_var, "连接教师端失败")
             except Exception as e:
-                self.status_var.set(f"连接错误: {str(e)}")
+                self.ui.set(self.status_var, f"连接错误: {str(e)}")
 
         threading.Thread(target=load_files, daemon=True).start()
 
+    def show_teacher_files(self, files, etag, event_count):
+        """用拉取到的完整列表替换老师文件列表（在主线程中执行）
+
+        event_count 为开始拉取时已应用的事件数：列表可能早于之后收到的推送
+        事件，这些事件按顺序在列表上重新应用一次（增删按文件 ID 进行，重复
+        应用不影响结果）。
+        """
+        self.teacher_files = files
+        self.teacher_files_etag = etag
+
+        # 清空现有项目
+        for item in self.teacher_tree.get_children():
+            self.teacher_tree.delete(item)
+
+        # 添加文件到列表
+        for file_info in files:
+            self.insert_teacher_file_row(file_info)
+
+        missed = self.teacher_file_event_count - event_count
+        if missed > len(self.teacher_file_events):
+            # 拉取期间的事件太多，已无法全部重放，重新拉取
+            self.refresh_teacher_files()
+        elif missed:
+            for event_type, data in list(self.teacher_file_events)[-missed:]:
+                self.apply_teacher_file_change(event_type, data)
+
+        self.status_var.set(f"已加载 {len(self.teacher_files)} 个文件")
+
+    def insert_teacher_file_row(self, file_info, index="end"):
+        """在老师文件列表中插入一行（行 ID 为文件 ID，便于按推送事件增删）"""
+        file_size = self.format_file_size(file_info.get("file_size", 0))
+        upload_time = file_info.get("upload_time", "")[:19].replace("T", " ")
+        self.teacher_tree.insert(
+            "",
+            index,
+            iid=file_info.get("file_id", ""),
+            text=file_info.get("filename", ""),
+            values=(file_size, upload_time),
+            tags=(file_info.get("file_id", ""),),
+        )
+
+    def start_event_stream(self):
+        """订阅教师端的实时推送，老师增删文件时直接更新列表，无需手动刷新"""
+        self.event_stream_generation += 1
+        threading.Thread(
+            target=self.follow_events,
+            args=(self.base_url, self.event_stream_generation),
+            daemon=True,
+        ).start()
+
+    def follow_events(self, base_url, generation):
+        """保持 SSE 长连接并应用收到的事件，断线后按 Last-Event-ID 续传"""
+        last_event_id = None
+        attempt = 0
+        while generation == self.event_stream_generation:
+            headers = {"Last-Event-ID": last_event_id} if last_event_id else {}
+            try:
+                with self.http.get(
+                    f"{base_url}/api/events",
+                    headers=headers,
+                    stream=True,
+                    timeout=self.EVENT_STREAM_TIMEOUT,
+                ) as response:
+                    if response.status_code == 200:
+                        attempt = 0
+                        self.event_stream_connected = True
+                        response.encoding = "utf-8"
+                        lines = response.iter_lines(chunk_size=None, decode_unicode=True)
+                        for event_id, event_type, data in event_stream.iter_events(lines):
+                            if generation != self.event_stream_generation:
+                                return
+                            if event_id:
+                                last_event_id = event_id
+                            self.ui.post(
+                                self.apply_teacher_file_event, event_type, data
+                            )
+            except (requests.RequestException, ValueError):
+                pass
+            finally:
+                if generation == self.event_stream_generation:
+                    self.event_stream_connected = False
+            # 连接断开或被拒绝（如连接数已满）：退避后重连，期间仍可手动刷新
+            delay = min(self.EVENT_STREAM_MAX_DELAY, 2**attempt) * random.uniform(0.5, 1.5)
+            attempt += 1
+            time.sleep(delay)
+
+    def apply_teacher_file_event(self, event_type, data):
+        """按推送事件增删老师文件列表中的行（在主线程中执行）"""
+        if event_type == "resync":
+            # 错过了事件（刚连上、教师端重启或断线太久），重新拉取一次列表
+            self.refresh_teacher_files()
+        elif event_type in ("teacher_file_added", "teacher_file_deleted"):
+            self.teacher_file_event_count += 1
+            self.teacher_file_events.append((event_type, data))
+            self.apply_teacher_file_change(event_type, data)
+            if event_type == "teacher_file_added":
+                self.status_var.set(f"老师新增了文件: {data['file']['filename']}")
+
+    def apply_teacher_file_change(self, event_type, data):
+        """在老师文件列表中增加或删除一个文件，已经是目标状态时不做修改"""
+        if event_type == "teacher_file_added":
+            file_info = data["file"]
+            if not self.teacher_tree.exists(file_info["file_id"]):
+                self.teacher_files.insert(0, file_info)
+                self.insert_teacher_file_row(file_info, index=0)
+        else:
+            file_id = data["file_id"]
+            self.teacher_files = [
+                f for f in self.teacher_files if f.get("file_id") != file_id
+            ]
+            if self.teacher_tree.exists(file_id):
+                self.teacher_tree.delete(file_id)
+
     def download_file(self):
         """下载老师文件"""
         if not self.student_name:
@@ -321,33 +845,213 @@ class StudentApp:
 
         # 选择保存位置
         save_path = filedialog.asksaveasfilename(
-            title="选择保存位置", initialvalue=filename, filetypes=[("所有文件", "*.*")]
+            title="选择保存位置", initialfile=filename, filetypes=[("所有文件", "*.*")]
         )
 
         if not save_path:
             return
 
+        # Tk 变量只在主线程中读取
+        use_swarm = self.swarm_download_var.get() and self.swarm_peer is not None
+        use_parallel = self.parallel_download_var.get()
+
         def download():
             try:
-                self.status_var.set("正在下载文件...")
-                response = requests.get(
-                    f"{self.base_url}/api/teacher/files/{file_id}", timeout=30
-                )
-
-                if response.status_code == 200:
-                    with open(save_path, "wb") as f:
-                        f.write(response.content)
-                    messagebox.showinfo("成功", "文件下载成功！")
+                self.ui.set(self.status_var, "正在下载文件...")
+                self.ui.set(self.progress_var, 0)
+                url = f"{self.base_url}/api/teacher/files/{file_id}"
+                if use_swarm and self.swarm_download(file_id, save_path):
+                    success = True
+                elif use_parallel:
+                    success = self.parallel_download(url, save_path)
+                else:
+                    success = self.stream_download(url, save_path)
+                if success:
+                    self.ui.post(messagebox.showinfo, "成功", "文件下载成功！")
                 else:
-                    messagebox.showerror("错误", "下载失败")
+                    self.ui.post(messagebox.showerror, "错误", "下载失败")
 
-                self.status_var.set("就绪")
+                self.ui.set(self.status_var, "就绪")
             except Exception as e:
-                messagebox.showerror("错误", f"下载失败：{str(e)}")
-                self.status_var.set("就绪")
+                self.ui.post(messagebox.showerror, "错误", f"下载失败：{str(e)}")
+                self.ui.set(self.status_var, "就绪")
 
         threading.Thread(target=download, daemon=True).start()
 
+    def swarm_download(self, file_id, save_path):
+        """优先从同学处获取分块的 P2P 下载
+
+        没有同学持有该文件且文件不大、教师端暂不提供分块清单或下载失败时返回 False，
+        由调用方改用普通下载。
+        """
+        try:
+            manifest = self.swarm_peer.fetch_manifest(self.base_url, file_id)
+        except (requests.RequestException, ValueError):
+            return False
+        if not manifest["peers"] and manifest["file_size"] < self.SWARM_MIN_SIZE:
+            return False
+        try:
+            stats = self.swarm_peer.download(
+                self.base_url,
+                file_id,
+                save_path,
+                on_progress=self._report_download_progress,
+                manifest=manifest,
+            )
+        except (requests.RequestException, ValueError, OSError) as e:
+            self.ui.set(self.status_var, f"同学互传失败，改为从教师端下载: {e}")
+            return False
+        total = stats["peer_bytes"] + stats["teacher_bytes"]
+        if total:
+            self.ui.set(self.status_var, f"下载完成，{stats['peer_bytes'] * 100 // total}% 来自同学")
+        return True
+
+    def parallel_download(self, url, save_path):
+        """多连接并行下载大文件，校验哈希后原子地重命名为目标文件
+
+        文件较小或服务器不支持 Range 时退回单连接的 stream_download。
+        """
+        head = self.http.head(url, timeout=self.DOWNLOAD_TIMEOUT)
+        total = int(head.headers.get("Content-Length", 0))
+        if (
+            head.status_code != 200
+            or head.headers.get("Accept-Ranges") != "bytes"
+            or total < self.PARALLEL_MIN_SIZE
+        ):
+            return self.stream_download(url, save_path)
+
+        part_path = save_path + ".parallel.part"
+        content_hash = head.headers.get("X-Content-SHA256")
+        try:
+            ParallelDownload(
+                self.http,
+                url,
+                part_path,
+                total,
+                head.headers.get("ETag", ""),
+                self.DOWNLOAD_TIMEOUT,
+                self.DOWNLOAD_CHUNK_SIZE,
+                self._report_download_progress,
+            ).run()
+
+            self.ui.set(self.status_var, "正在校验文件...")
+            if content_hash and self.hash_file(part_path) != content_hash:
+                raise IOError("文件校验失败，请重新下载")
+            os.replace(part_path, save_path)
+            return True
+        finally:
+            self._remove_if_exists(part_path)
+
+    def _report_download_progress(self, received, total):
+        self.ui.set(self.progress_var, received * 100 // total if total else 0)
+        self.ui.set(
+            self.status_var,
+            f"正在下载文件... {self.format_file_size(received)}"
+            f" / {self.format_file_size(total)}",
+        )
+
+    def stream_download(self, url, save_path):
+        """断点续传下载：流式写入临时文件，校验哈希后原子地重命名为目标文件
+
+        内存占用只与块大小有关；网络中断时从已下载的字节处续传，
+        临时文件会保留到下次下载同一目标时继续使用。返回是否下载成功。
+        """
+        part_path = save_path + ".part"
+        etag_path = part_path + ".etag"
+        for attempt in range(self.TRANSFER_RETRIES + 1):
+            try:
+                content_hash = self._download_part(url, part_path, etag_path)
+                break
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+            ):
+                if attempt == self.TRANSFER_RETRIES:
+                    raise
+                self._backoff(attempt, "连接中断")
+
+        if content_hash is False:
+            return False
+
+        if content_hash and self.hash_file(part_path) != content_hash:
+            # 内容与服务器不一致，丢弃临时文件，下次从头下载
+            os.remove(part_path)
+            self._remove_if_exists(etag_path)
+            raise IOError("文件校验失败，请重新下载")
+
+        os.replace(part_path, save_path)
+        self._remove_if_exists(etag_path)
+        return True
+
+    def _download_part(self, url, part_path, etag_path):
+        """从临时文件末尾继续下载，返回服务器提供的内容哈希；请求失败返回 False"""
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        headers = {}
+        if offset and os.path.exists(etag_path):
+            with open(etag_path, "r", encoding="utf-8") as f:
+                etag = f.read().strip()
+            # If-Range：文件在服务器上变化时服务器会返回完整内容而不是 206
+            headers = {"Range": f"bytes={offset}-", "If-Range": etag}
+
+        with self.http.get(
+            url, stream=True, headers=headers, timeout=self.DOWNLOAD_TIMEOUT
+        ) as response:
+            if response.status_code == 416:
+                # 续传位置超出文件大小，说明临时文件已失效，从头下载
+                self._remove_if_exists(part_path)
+                self._remove_if_exists(etag_path)
+                return self._download_part(url, part_path, etag_path)
+
+            if response.status_code == 206:
+                mode = "ab"
+            elif response.status_code == 200:
+                mode = "wb"
+                offset = 0
+                with open(etag_path, "w", encoding="utf-8") as f:
+                    f.write(response.headers.get("ETag", ""))
+            else:
+                return False
+
+            if response.headers.get("Content-Encoding"):
+                # 压缩传输时没有 Content-Length，按原始文件大小显示进度
+                length = int(response.headers.get("X-File-Size", 0))
+            else:
+                length = int(response.headers.get("Content-Length", 0))
+            total = offset + length
+            received = offset
+            last_percent = -1
+            with open(part_path, mode) as f:
+                for chunk in response.iter_content(self.DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    received += len(chunk)
+                    if total:
+                        # 只在百分比变化时刷新界面
+                        percent = received * 100 // total
+                        if percent != last_percent:
+                            last_percent = percent
+                            self._report_download_progress(received, total)
+
+            if length and received != total:
+                raise requests.exceptions.ChunkedEncodingError(
+                    f"连接提前结束：{received}/{total} 字节"
+                )
+            return response.headers.get("X-Content-SHA256")
+
+    @classmethod
+    def hash_file(cls, file_path):
+        """流式计算文件的 SHA-256"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            while chunk := f.read(cls.DOWNLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _remove_if_exists(path):
+        if os.path.exists(path):
+            os.remove(path)
+
     def select_work_file(self):
         """选择作业文件"""
         file_path = filedialog.askopenfilename(
@@ -379,45 +1083,149 @@ class StudentApp:
 
         description = self.description_var.get().strip()
 
+        file_path = self.selected_file_path
+
         def upload():
             try:
-                self.status_var.set("正在上传作业...")
-
-                with open(self.selected_file_path, "rb") as f:
-                    files = {"file": f}
-                    data = {
-                        "student_name": self.student_name,
-                        "description": description,
-                    }
-                    response = requests.post(
-                        f"{self.base_url}/api/student/work",
-                        files=files,
-                        data=data,
-                        timeout=30,
-                    )
-
-                if response.status_code == 200:
-                    result = response.json()
-                    if result.get("success"):
-                        messagebox.showinfo("成功", "作业上传成功！")
-                        # 清空选择
-                        self.selected_file_path = ""
-                        self.file_path_var.set("未选择文件")
-                        self.description_var.set("")
-                    else:
-                        messagebox.showerror(
-                            "错误", f"上传失败：{result.get('error', '未知错误')}"
-                        )
+                self.ui.set(self.status_var, "正在上传作业...")
+                self.ui.set(self.progress_var, 0)
+
+                result = self.chunked_upload(file_path, description)
+                if result.get("success"):
+                    self.ui.post(messagebox.showinfo, "成功", "作业上传成功！")
+                    # 清空选择
+                    self.selected_file_path = ""
+                    self.ui.set(self.file_path_var, "未选择文件")
+                    self.ui.set(self.description_var, "")
                 else:
-                    messagebox.showerror("错误", "上传失败")
+                    self.ui.post(
+                        messagebox.showerror,
+                        "错误",
+                        f"上传失败：{result.get('error', '未知错误')}",
+                    )
 
-                self.status_var.set("就绪")
+                self.ui.set(self.status_var, "就绪")
             except Exception as e:
-                messagebox.showerror("错误", f"上传失败：{str(e)}")
-                self.status_var.set("就绪")
+                self.ui.post(messagebox.showerror, "错误", f"上传失败：{str(e)}")
+                self.ui.set(self.status_var, "就绪")
 
         threading.Thread(target=upload, daemon=True).start()
 
+    def chunked_upload(self, file_path, description):
+        """分块上传作业：创建会话 -> 逐块 PUT -> 提交
+
+        创建会话时先发送文件的哈希和大小，服务器已有相同内容时直接完成（秒传），
+        不再发送文件内容。会话 ID 按文件记录在 self.upload_sessions 中并保存到磁盘，
+        断线或重启后再次上传同一文件时先查询服务器已收到的分块，只补传缺少的部分。
+        文件可压缩且服务器支持时，分块按协商的编码压缩后发送。
+        返回提交接口的 JSON 结果。
+        """
+        stat = os.stat(file_path)
+        key = json.dumps([
+            self.base_url, os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns,
+            self.student_name, description,
+        ], ensure_ascii=False)
+        uploads_url = f"{self.base_url}/api/student/work/uploads"
+
+        session = None
+        with self.upload_sessions_lock:
+            entry = self.upload_sessions.get(key)
+        if entry:
+            response = self.http.get(
+                f"{uploads_url}/{entry['upload_id']}", timeout=self.UPLOAD_TIMEOUT
+            )
+            if response.status_code == 200:
+                session = response.json()["upload"]
+                accept_encoding = response.headers.get("Accept-Encoding", "")
+
+        if session is None:
+            self.ui.set(self.status_var, "正在计算文件校验值...")
+            response = self.http.post(
+                uploads_url,
+                json={
+                    "filename": os.path.basename(file_path),
+                    "student_name": self.student_name,
+                    "description": description,
+                    "file_size": stat.st_size,
+                    "sha256": self.hash_file(file_path),
+                },
+                timeout=self.UPLOAD_TIMEOUT,
+            )
+            result = response.json()
+            if not result.get("success"):
+                return result
+            if "work" in result:
+                # 服务器已有相同内容
+                self.ui.set(self.progress_var, 100)
+                self.ui.set(self.status_var, "服务器已有相同文件，已秒传")
+                return result
+            session = result["upload"]
+            accept_encoding = response.headers.get("Accept-Encoding", "")
+            with self.upload_sessions_lock:
+                self.upload_sessions[key] = {"upload_id": session["upload_id"], "saved": time.time()}
+                self.save_upload_sessions()
+
+        upload_id = session["upload_id"]
+        chunk_size = session["chunk_size"]
+        received = set(session["received"])
+        missing = [i for i in range(session["chunk_count"]) if i not in received]
+        if stat.st_size == 0:
+            missing = []
+        encoding = None
+        if missing and wire_compression.is_compressible(file_path):
+            encoding = wire_compression.choose_encoding(accept_encoding)
+
+        with open(file_path, "rb") as f:
+            for chunk_index in missing:
+                f.seek(chunk_index * chunk_size)
+                chunk = f.read(chunk_size)
+                self._put_chunk(
+                    f"{uploads_url}/{upload_id}/chunks/{chunk_index}", chunk, encoding
+                )
+                received.add(chunk_index)
+                self.ui.set(
+                    self.progress_var, len(received) * 100 // session["chunk_count"]
+                )
+                self.ui.set(
+                    self.status_var,
+                    f"正在上传作业... {len(received)}/{session['chunk_count']} 块",
+                )
+
+        response = self.http.post(
+            f"{uploads_url}/{upload_id}/commit", timeout=self.UPLOAD_TIMEOUT
+        )
+        result = response.json()
+        if result.get("success") or response.status_code == 404:
+            with self.upload_sessions_lock:
+                if self.upload_sessions.pop(key, None):
+                    self.save_upload_sessions()
+        return result
+
+    def _put_chunk(self, url, chunk, encoding=None):
+        """上传单个分块（可按 encoding 压缩）；分块是幂等的，网络错误时退避后重试"""
+        headers = {}
+        if encoding:
+            chunk = wire_compression.compress_bytes(chunk, encoding)
+            headers["Content-Encoding"] = encoding
+        for attempt in range(self.TRANSFER_RETRIES + 1):
+            try:
+                response = self.http.put(
+                    url, data=chunk, headers=headers, timeout=self.UPLOAD_TIMEOUT
+                )
+                if response.status_code == 200:
+                    return
+                raise IOError(response.json().get("error", "分块上传失败"))
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.TRANSFER_RETRIES:
+                    raise
+                self._backoff(attempt, "连接中断")
+
+    def _backoff(self, attempt, reason):
+        """指数退避并加随机抖动，避免全班同时重连"""
+        delay = self.TRANSFER_RETRY_DELAY * (2**attempt) * random.uniform(0.5, 1.5)
+        self.ui.set(self.status_var, f"{reason}，{delay:.1f} 秒后重试...")
+        time.sleep(delay)
+
     def format_file_size(self, size_bytes):
         """格式化文件大小"""
         if size_bytes == 0:
@@ -434,6 +1242,7 @@ class StudentApp:
     def run(self):
         """运行应用"""
         self.root.mainloop()
+        self.http.close()
 
 
 if __name__ == "__main__":
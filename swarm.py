@@ -0,0 +1,397 @@
+"""
+P2P 分发 - 学生机之间互相传递老师文件的分块
+
+教师端为每个老师文件发布分块清单（每块的 SHA-256），并充当 tracker 记录
+哪些学生持有哪些分块。学生端内嵌一个小型分块服务器：已下载（包括下载中）的
+分块可以提供给同学，下载时优先从同学处并行获取，只有没人持有的分块才向教师端
+请求，且每名学生同时只占用教师端一个连接。班级越大，能提供分块的同学越多，
+教师端的上行流量只占总流量的一小部分。
+"""
+import hashlib
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+# 学生端分块服务器的默认端口（被占用时改用随机端口，端口号会报告给 tracker）
+PEER_PORT = 5008
+
+
+class PeerTracker:
+    """教师端的 tracker：记录每个文件（按内容哈希）有哪些学生持有哪些分块"""
+    # 学生多久没有重新报告就视为离线（秒）
+    PEER_TTL = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 内容哈希 -> {"ip:port": (持有的分块, 正在向教师端请求的分块, 最后报告时间)}
+        self._swarms = {}
+
+    def announce(self, content_hash, address, chunks, fetching=()):
+        """记录一名学生当前持有的分块，以及正在向教师端请求的分块"""
+        with self._lock:
+            swarm = self._swarms.setdefault(content_hash, {})
+            swarm[address] = (set(chunks), set(fetching), time.monotonic())
+
+    def peers(self, content_hash, exclude=None):
+        """返回持有该文件分块的在线学生列表（不含 exclude 自己）"""
+        now = time.monotonic()
+        with self._lock:
+            swarm = self._swarms.get(content_hash, {})
+            for address in [a for a, (_, _, seen) in swarm.items() if now - seen > self.PEER_TTL]:
+                del swarm[address]
+            return [
+                {"address": address, "chunks": sorted(chunks), "fetching": sorted(fetching)}
+                for address, (chunks, fetching, _) in swarm.items()
+                if address != exclude and (chunks or fetching)
+            ]
+
+
+class SharedFile:
+    """学生端正在分享的一个文件（下载中或已完成）"""
+
+    def __init__(self, base_url, manifest, path, have):
+        self.base_url = base_url
+        self.file_id = manifest["file_id"]
+        self.content_hash = manifest["content_hash"]
+        self.chunk_size = manifest["chunk_size"]
+        self.file_size = manifest["file_size"]
+        self.path = path
+        self.have = have
+
+    def read_chunk(self, index):
+        if index >= len(self.have) or not self.have[index]:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(index * self.chunk_size)
+            return f.read(self.chunk_size)
+
+
+class ChunkRequestHandler(BaseHTTPRequestHandler):
+    """GET /chunks/<内容哈希>/<分块序号>"""
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        data = None
+        if len(parts) == 3 and parts[0] == "chunks" and parts[2].isdigit():
+            shared = self.server.peer.shared.get(parts[1])
+            if shared is not None:
+                try:
+                    data = shared.read_chunk(int(parts[2]))
+                except OSError:
+                    data = None
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # 不在控制台逐条打印同学的分块请求
+        pass
+
+
+class SwarmPeer:
+    """学生端的 P2P 节点：分块服务器 + 定期向 tracker 报告 + 下载"""
+    # 向 tracker 报告持有分块的间隔（秒），须小于 PeerTracker.PEER_TTL
+    ANNOUNCE_INTERVAL = 20
+    # 请求超时：(连接超时, 读取超时)
+    TIMEOUT = (3, 30)
+
+    def __init__(self, host="0.0.0.0", port=PEER_PORT):
+        try:
+            self._server = ThreadingHTTPServer((host, port), ChunkRequestHandler)
+        except OSError:
+            self._server = ThreadingHTTPServer((host, 0), ChunkRequestHandler)
+        self._server.daemon_threads = True
+        self._server.peer = self
+        self.port = self._server.server_address[1]
+        # 内容哈希 -> SharedFile
+        self.shared = {}
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for target in (self._server.serve_forever, self._announce_loop):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        self._server.shutdown()
+        self._server.server_close()
+        for thread in self._threads:
+            thread.join(timeout=5)
+
+    def share(self, base_url, manifest, path, have):
+        shared = SharedFile(base_url, manifest, path, have)
+        self.shared[shared.content_hash] = shared
+        return shared
+
+    def announce(self, shared, fetching=()):
+        """报告持有的分块和正在向教师端请求的分块，返回 tracker 给出的其他同学列表"""
+        response = requests.post(
+            f"{shared.base_url}/api/teacher/files/{shared.file_id}/peers",
+            json={
+                "port": self.port,
+                "chunks": [i for i, have in enumerate(shared.have) if have],
+                "fetching": list(fetching),
+            },
+            timeout=self.TIMEOUT,
+        )
+        response.raise_for_status()
+        return response.json()["peers"]
+
+    def _announce_loop(self):
+        """下载完成后继续做种：定期重新报告，避免被 tracker 视为离线"""
+        while not self._stop.wait(self.ANNOUNCE_INTERVAL):
+            for shared in list(self.shared.values()):
+                if not os.path.exists(shared.path):
+                    self.shared.pop(shared.content_hash, None)
+                    continue
+                try:
+                    self.announce(shared)
+                except requests.RequestException:
+                    # 教师端暂时不可达，下次再报告
+                    pass
+
+    def fetch_manifest(self, base_url, file_id):
+        """获取老师文件的分块清单及当前持有分块的同学"""
+        response = requests.get(f"{base_url}/api/teacher/files/{file_id}/manifest", timeout=self.TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def download(self, base_url, file_id, save_path, on_progress=None, manifest=None):
+        """从同学和教师端下载文件，返回 {"peer_bytes": ..., "teacher_bytes": ...}
+
+        已获取分块清单时可通过 manifest 传入，省去再请求一次。
+        """
+        return SwarmDownload(self, base_url, file_id, save_path, on_progress, manifest).run()
+
+
+class SwarmDownload:
+    """一次 P2P 下载
+
+    按"最稀有优先"挑选分块，同一稀有度随机打散，使同学们先拿到不同的分块再互相
+    交换。有同学持有的分块并行向同学请求；没人持有的分块才向教师端请求，并且优先
+    挑选没有其他同学正在向教师端请求的分块，让教师端尽量每个分块只发送一次。
+    每个分块校验哈希后立即可以分享给其他同学，状态变化时尽快报告给 tracker。
+    """
+    # 向同学并行请求的连接数
+    PEER_CONNECTIONS = 4
+    # 同时向教师端请求的连接数；没有同学参与时（只能从教师端下载）可以多开几个
+    TEACHER_CONNECTIONS = 1
+    SOLO_TEACHER_CONNECTIONS = 4
+    # 下载过程中向 tracker 报告并刷新同学列表的最长间隔，以及两次报告的最短间隔（秒）
+    REFRESH_INTERVAL = 0.5
+    MIN_REFRESH_INTERVAL = 0.2
+    # 等待同学提供分块的最长时间，超过后直接向教师端请求（秒）
+    STALL_TIMEOUT = 5.0
+    # 单个分块从教师端下载失败的最多次数
+    TEACHER_RETRIES = 3
+
+    def __init__(self, peer, base_url, file_id, save_path, on_progress=None, manifest=None):
+        self.peer = peer
+        self.manifest = manifest
+        self.base_url = base_url
+        self.file_id = file_id
+        self.save_path = save_path
+        self.on_progress = on_progress
+        self._cond = threading.Condition()
+        self.peer_bytes = 0
+        self.teacher_bytes = 0
+        self.error = None
+
+    def run(self):
+        if self.manifest is None:
+            self.manifest = self.peer.fetch_manifest(self.base_url, self.file_id)
+        manifest = self.manifest
+        chunk_count = len(manifest["chunks"])
+        # 与单连接下载的断点续传文件（.part）分开，P2P 下载失败后续传数据仍然可用
+        self.part_path = self.save_path + ".swarm.part"
+        try:
+            with open(self.part_path, "wb") as f:
+                f.truncate(manifest["file_size"])
+            self.shared = self.peer.share(self.base_url, manifest, self.part_path, bytearray(chunk_count))
+            self._transfer(chunk_count)
+            if self.error is not None:
+                raise self.error
+            with open(self.part_path, "rb") as f:
+                digest = hashlib.file_digest(f, "sha256").hexdigest()
+            if digest != manifest["content_hash"]:
+                raise ValueError("文件校验失败")
+            os.replace(self.part_path, self.save_path)
+        except BaseException as e:
+            # 停止其余连接，不再向同学提供这份内容，也不留下未完成的临时文件
+            with self._cond:
+                if self.error is None:
+                    self.error = e
+                self._cond.notify_all()
+            self.peer.shared.pop(manifest["content_hash"], None)
+            if os.path.exists(self.part_path):
+                os.remove(self.part_path)
+            raise
+        self.shared.path = self.save_path
+        try:
+            self.peer.announce(self.shared)
+        except requests.RequestException:
+            pass
+        return {"peer_bytes": self.peer_bytes, "teacher_bytes": self.teacher_bytes}
+
+    def _transfer(self, chunk_count):
+        """并行获取全部分块，直到完成或出错（出错时设置 self.error）"""
+        self.pending = set(range(chunk_count))
+        self.in_flight = set()
+        # 正在向教师端请求的分块；自上次报告后状态是否有变化
+        self.teacher_fetching = set()
+        self.changed = False
+        self.last_progress = time.monotonic()
+        # 分块序号 -> 提供过坏数据或不可达的同学地址；分块序号 -> 教师端失败次数
+        self.failures = {}
+        self.teacher_failures = {}
+        self._set_peers(self.manifest["peers"])
+
+        connections = max(self.PEER_CONNECTIONS + self.TEACHER_CONNECTIONS, self.SOLO_TEACHER_CONNECTIONS)
+        workers = [threading.Thread(target=self._worker, daemon=True) for _ in range(connections)]
+        for worker in workers:
+            worker.start()
+        # 主线程报告已有分块并刷新同学列表，直到所有分块完成
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._finished() or self.changed, self.REFRESH_INTERVAL)
+                if self._finished():
+                    break
+                self.changed = False
+                fetching = sorted(self.teacher_fetching)
+            try:
+                peers = self.peer.announce(self.shared, fetching)
+            except requests.RequestException:
+                continue
+            finally:
+                time.sleep(self.MIN_REFRESH_INTERVAL)
+            with self._cond:
+                self._set_peers(peers)
+                self._cond.notify_all()
+        for worker in workers:
+            worker.join()
+
+    def _finished(self):
+        return self.error is not None or not (self.pending or self.in_flight)
+
+    def _set_peers(self, peers):
+        self.peers = [
+            {"address": p["address"], "chunks": set(p["chunks"]), "fetching": set(p.get("fetching", ()))}
+            for p in peers
+        ]
+
+    def _holders(self, index):
+        return [p["address"] for p in self.peers
+                if index in p["chunks"] and p["address"] not in self.failures.get(index, ())]
+
+    def _next_task(self):
+        """挑选下一个分块及来源（同学地址或 None 表示教师端）；暂时无事可做时返回 False"""
+        holders = {index: self._holders(index) for index in self.pending}
+        with_peers = [index for index, h in holders.items() if h]
+        if with_peers:
+            rarest = min(len(holders[index]) for index in with_peers)
+            index = random.choice([i for i in with_peers if len(holders[i]) == rarest])
+            return index, random.choice(holders[index])
+        limit = self.TEACHER_CONNECTIONS if self.peers else self.SOLO_TEACHER_CONNECTIONS
+        if self.pending and len(self.teacher_fetching) < limit:
+            # 避开其他同学正在向教师端请求的分块，它们很快就能从同学处获取；
+            # 只有长时间没有进展时（同学可能已离线）才重复请求
+            fetchers = {index: sum(index in p["fetching"] for p in self.peers) for index in self.pending}
+            fewest = min(fetchers.values())
+            if fewest == 0 or time.monotonic() - self.last_progress > self.STALL_TIMEOUT:
+                index = random.choice([i for i, n in fetchers.items() if n == fewest])
+                self.teacher_fetching.add(index)
+                self.changed = True
+                return index, None
+        return False
+
+    def _worker(self):
+        with requests.Session() as session, open(self.part_path, "r+b") as f:
+            while True:
+                with self._cond:
+                    while True:
+                        if self._finished():
+                            return
+                        task = self._next_task() if self.pending else False
+                        if task:
+                            break
+                        self._cond.wait(self.REFRESH_INTERVAL)
+                    index, source = task
+                    self.pending.discard(index)
+                    self.in_flight.add(index)
+                failure = None
+                try:
+                    data = self._fetch(session, index, source)
+                    f.seek(index * self.manifest["chunk_size"])
+                    f.write(data)
+                    f.flush()
+                except (requests.RequestException, ValueError) as e:
+                    failure = e
+                except Exception as e:
+                    # 写盘失败等无法通过换来源解决的错误，终止下载
+                    with self._cond:
+                        self.in_flight.discard(index)
+                        self.teacher_fetching.discard(index)
+                        self.error = e
+                        self._cond.notify_all()
+                    return
+                with self._cond:
+                    self.in_flight.discard(index)
+                    if source is None:
+                        self.teacher_fetching.discard(index)
+                    if failure is None:
+                        self.shared.have[index] = 1
+                        self.changed = True
+                        self.last_progress = time.monotonic()
+                        if source is None:
+                            self.teacher_bytes += len(data)
+                        else:
+                            self.peer_bytes += len(data)
+                        if self.on_progress is not None:
+                            self.on_progress(self.peer_bytes + self.teacher_bytes, self.manifest["file_size"])
+                    else:
+                        if source is None:
+                            self.teacher_failures[index] = self.teacher_failures.get(index, 0) + 1
+                            if self.teacher_failures[index] >= self.TEACHER_RETRIES:
+                                self.error = failure
+                        else:
+                            # 这名同学的该分块不可用，改从其他来源获取
+                            self.failures.setdefault(index, set()).add(source)
+                        self.pending.add(index)
+                    self._cond.notify_all()
+
+    def _fetch(self, session, index, source):
+        """从同学或教师端获取一个分块并校验哈希"""
+        chunk_size = self.manifest["chunk_size"]
+        if source is None:
+            start = index * chunk_size
+            end = min(start + chunk_size, self.manifest["file_size"]) - 1
+            response = session.get(
+                f"{self.base_url}/api/teacher/files/{self.file_id}",
+                headers={"Range": f"bytes={start}-{end}",
+                         "If-Range": f'"{self.manifest["content_hash"]}"'},
+                timeout=self.peer.TIMEOUT,
+            )
+            if response.status_code != 206:
+                raise ValueError(f"教师端未返回分块: HTTP {response.status_code}")
+        else:
+            response = session.get(
+                f"http://{source}/chunks/{self.manifest['content_hash']}/{index}",
+                timeout=self.peer.TIMEOUT,
+            )
+            response.raise_for_status()
+        data = response.content
+        if hashlib.sha256(data).hexdigest() != self.manifest["chunks"][index]:
+            raise ValueError(f"分块 {index} 校验失败")
+        return data
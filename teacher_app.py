@@ -6,203 +6,2015 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import os
 import threading
+import time
 import socket
 import json
-from datetime import datetime
+import queue
+import functools
+import itertools
+import multiprocessing
+import base64
+import concurrent.futures
+import hashlib
+import re
+import sqlite3
+import tempfile
+import uuid
+from datetime import datetime, timedelta
 from pathlib import Path
 import http.server
 import socketserver
 from urllib.parse import urlparse, parse_qs
 import webbrowser
+import requests
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
+from werkzeug.datastructures import ContentRange
+from werkzeug.exceptions import HTTPException, RequestedRangeNotSatisfiable
+
+import wire_compression
+import zip_export
+from discovery import TeacherBeacon
+from event_stream import EventHub
+from multicast import BroadcastSender
+from swarm import PeerTracker
+from tree_view import VirtualTreeview
+from ui_dispatch import UiDispatcher
+
+
+class MetadataCommitter:
+    """元数据的唯一写入者
+    
+    所有修改元数据的操作都交给一个后台线程在写连接上执行，调用线程等待结果。
+    排队中的多个操作合并到同一个事务中提交（组提交），每个操作有自己的保存点，
+    出错时只撤销该操作，同一批的其他操作照常提交。
+    """
+    # 一个事务最多合并的操作数
+    MAX_BATCH_SIZE = 64
+    
+    def __init__(self, db: sqlite3.Connection):
+        self._db = db
+        self._queue = queue.Queue()
+        self._after_commit = []
+        self.thread = threading.Thread(target=self._run, name="metadata-committer", daemon=True)
+        self.thread.start()
+    
+    def submit(self, operation):
+        """执行写操作 operation()，等它所在的事务提交后返回其结果（或抛出其异常）"""
+        if threading.current_thread() is self.thread:
+            # 写操作中调用的写操作直接并入当前事务
+            return operation()
+        future = concurrent.futures.Future()
+        self._queue.put((operation, future))
+        return future.result()
+    
+    def after_commit(self, action):
+        """登记事务提交后（下一批写操作开始前）要执行的动作，只能在写操作内调用
+        
+        所在操作被撤销时，登记的动作也一并取消。
+        """
+        self._after_commit.append(action)
+    
+    def close(self):
+        """执行完已排队的写操作后停止写入线程"""
+        self._queue.put(None)
+        self.thread.join()
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not None and len(batch) < self.MAX_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is None
+            if stopping:
+                batch.pop()
+            if batch:
+                self._commit(batch)
+            if stopping:
+                return
+    
+    def _commit(self, batch):
+        """在一个事务中依次执行一批写操作并提交，再把结果交给各调用线程"""
+        outcomes = []
+        try:
+            self._db.execute("BEGIN IMMEDIATE")
+            for operation, future in batch:
+                checkpoint = len(self._after_commit)
+                self._db.execute("SAVEPOINT operation")
+                try:
+                    outcomes.append((future, operation(), None))
+                except Exception as e:
+                    self._db.execute("ROLLBACK TO operation")
+                    del self._after_commit[checkpoint:]
+                    outcomes.append((future, None, e))
+                self._db.execute("RELEASE operation")
+            self._db.execute("COMMIT")
+        except Exception as e:
+            # 提交本身失败（如磁盘已满），整批撤销
+            if self._db.in_transaction:
+                self._db.execute("ROLLBACK")
+            self._after_commit.clear()
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        
+        actions, self._after_commit = self._after_commit, []
+        for action in actions:
+            action()
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
 
 
 class FileManager:
-    """文件管理类"""
+    """文件管理类
+
+    元数据保存在 data/metadata.db（SQLite，WAL 模式）中，按学生姓名、上传时间
+    和原始文件名建立索引，列表查询直接走索引而不是在内存中全量排序。
+    旧版本的 metadata.json（及追加日志）会在首次启动时自动迁移。
+
+    文件内容按 SHA-256 存放在 data/blobs/<前两位>/<哈希> 中（内容寻址），元数据
+    通过 content_hash 指向内容；内容相同的多份提交只占一份磁盘空间，blobs 表
+    记录每份内容被引用的次数，最后一个引用删除时才删除文件。
+    
+    可被多个线程（Flask 处理线程、界面线程）同时调用：复制文件、计算哈希等耗时
+    工作在调用线程中并行进行，元数据的修改全部交给 MetadataCommitter 串行提交，
+    记录 ID 由数据库自增生成；查询使用各线程自己的只读连接，不需要加锁。
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS teacher_files (
+            file_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+            original_name TEXT NOT NULL,
+            saved_name    TEXT NOT NULL,
+            description   TEXT NOT NULL DEFAULT '',
+            upload_time   TEXT NOT NULL,
+            file_size     INTEGER NOT NULL,
+            content_hash  TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_teacher_files_upload_time ON teacher_files (upload_time);
+        CREATE INDEX IF NOT EXISTS idx_teacher_files_original_name ON teacher_files (original_name);
+
+        CREATE TABLE IF NOT EXISTS student_work (
+            work_id       INTEGER PRIMARY KEY AUTOINCREMENT,
+            original_name TEXT NOT NULL,
+            saved_name    TEXT NOT NULL,
+            student_name  TEXT NOT NULL,
+            description   TEXT NOT NULL DEFAULT '',
+            upload_time   TEXT NOT NULL,
+            file_size     INTEGER NOT NULL,
+            file_path     TEXT NOT NULL,
+            content_hash  TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_student_work_student_name ON student_work (student_name, upload_time);
+        CREATE INDEX IF NOT EXISTS idx_student_work_upload_time ON student_work (upload_time);
+        CREATE INDEX IF NOT EXISTS idx_student_work_original_name ON student_work (original_name);
+
+        CREATE TABLE IF NOT EXISTS meta (
+            key   TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+        -- 各表的版本号，用作该表列表接口的 ETag
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('teacher_files_version', 0);
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('student_work_version', 0);
+        -- 去重统计，以及旧版本按文件名保存的文件是否已迁移到内容寻址存储
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('dedup_hits', 0);
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('dedup_misses', 0);
+        INSERT OR IGNORE INTO meta (key, value) VALUES ('blob_store', 0);
+
+        -- 内容寻址存储：每份内容一行，ref_count 为引用它的老师文件和学生作业数
+        CREATE TABLE IF NOT EXISTS blobs (
+            content_hash TEXT PRIMARY KEY,
+            size         INTEGER NOT NULL,
+            ref_count    INTEGER NOT NULL
+        );
+
+        -- 分块上传会话及已收到的分块
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            upload_id     TEXT PRIMARY KEY,
+            original_name TEXT NOT NULL,
+            student_name  TEXT NOT NULL,
+            description   TEXT NOT NULL DEFAULT '',
+            file_size     INTEGER NOT NULL,
+            chunk_size    INTEGER NOT NULL,
+            content_hash  TEXT,
+            created_time  TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS upload_chunks (
+            upload_id   TEXT NOT NULL,
+            chunk_index INTEGER NOT NULL,
+            PRIMARY KEY (upload_id, chunk_index)
+        );
+
+        -- 老师文件的分块哈希清单（P2P 分发用），保存文件后在后台生成
+        CREATE TABLE IF NOT EXISTS chunk_manifests (
+            file_id      INTEGER PRIMARY KEY,
+            chunk_size   INTEGER NOT NULL,
+            chunk_hashes TEXT NOT NULL
+        );
+    """
+    # 后续版本新增的列：表名 -> [(列名, 列定义)]
+    ADDED_COLUMNS = {
+        "teacher_files": [("content_hash", "TEXT")],
+        "student_work": [("content_hash", "TEXT")],
+    }
+    HASH_CHUNK_SIZE = 1024 * 1024
+    # 分块上传的默认/最大分块大小，以及未完成会话的保留时间
+    UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+    MAX_UPLOAD_CHUNK_SIZE = 64 * 1024 * 1024
+    UPLOAD_SESSION_TTL = timedelta(days=1)
+    # P2P 分发时老师文件的分块大小
+    SWARM_CHUNK_SIZE = 4 * 1024 * 1024
+
     def __init__(self, base_dir: str = "data"):
-        self.base_dir = Path(base_dir)
+        self.base_dir = Path(base_dir).resolve()
+        # 内容寻址存储目录
+        self.blobs_dir = self.base_dir / "blobs"
+        # 旧版本按文件名保存老师文件的目录，仅用于迁移
         self.teacher_files_dir = self.base_dir / "teacher_files"
-        self.student_work_dir = self.base_dir / "student_work"
+        # 接收上传时的临时目录
+        self.tmp_dir = self.base_dir / "tmp"
+        self.db_file = self.base_dir / "metadata.db"
+        # 旧版本的元数据文件，仅用于迁移
         self.metadata_file = self.base_dir / "metadata.json"
+        self.journal_file = self.base_dir / "metadata.journal"
+        self.rotated_journal_file = self.base_dir / "metadata.journal.old"
         
         # 创建必要的目录
-        self.teacher_files_dir.mkdir(parents=True, exist_ok=True)
-        self.student_work_dir.mkdir(parents=True, exist_ok=True)
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+        
+        # 初始化元数据库：写连接只在写入线程中使用（事务由写入线程显式管理），
+        # 各线程查询时使用自己的只读连接
+        self._db = sqlite3.connect(self.db_file, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(self.SCHEMA)
+        self._local = threading.local()
+        self._readers = {}
+        self._readers_lock = threading.Lock()
+        self._committer = MetadataCommitter(self._db)
+        # 元数据版本号，每次修改递增；各表另有自己的版本号，用作该表列表接口的 ETag
+        self.version = self._db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        self.table_versions = {
+            table: self._db.execute(
+                "SELECT value FROM meta WHERE key = ?", (f"{table}_version",)).fetchone()[0]
+            for table in ("teacher_files", "student_work")
+        }
         
-        # 初始化元数据
-        self.metadata = self._load_metadata()
+        self._upgrade_schema()
+        self._migrate_legacy_metadata()
+        self._migrate_to_blob_store()
+        self._init_storage_totals()
+        self._expire_upload_sessions()
+        
+        # 元数据变化的监听者，提交后以事件字典回调（在执行修改的线程中调用）
+        self.listeners = []
+        # 在后台逐个生成分块清单，大文件的哈希计算不占用请求线程
+        self._manifest_jobs = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="chunk-manifest")
+        self._manifests_queued = set()
+        self._manifests_lock = threading.Lock()
+    
+    def _write(self, operation):
+        """把写操作交给写入线程执行，返回其结果"""
+        return self._committer.submit(operation)
+    
+    def _reader(self):
+        """当前线程的只读连接（写入线程中返回写连接，以便看到本事务内的修改）"""
+        if threading.current_thread() is self._committer.thread:
+            return self._db
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.db_file, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            self._local.db = db
+            with self._readers_lock:
+                # 顺便关闭已结束线程（如 werkzeug 的请求线程）留下的连接
+                for thread in [thread for thread in self._readers if not thread.is_alive()]:
+                    self._readers.pop(thread).close()
+                self._readers[threading.current_thread()] = db
+        return db
+    
+    def _upgrade_schema(self):
+        """为旧版本创建的数据库补齐新增的列"""
+        def upgrade():
+            for table, columns in self.ADDED_COLUMNS.items():
+                existing = {row["name"] for row in self._db.execute(f"PRAGMA table_info({table})")}
+                for name, definition in columns:
+                    if name not in existing:
+                        self._db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+        self._write(upgrade)
+    
+    def _bump_version(self, *tables):
+        """递增元数据版本号及被修改的表的版本号（需在写操作内调用），返回新的元数据版本号
+
+        self.version 和 self.table_versions 在提交后更新。
+        """
+        self._db.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        version = self._db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        self._committer.after_commit(lambda: setattr(self, "version", max(self.version, version)))
+        for table in tables:
+            key = f"{table}_version"
+            self._db.execute("UPDATE meta SET value = value + 1 WHERE key = ?", (key,))
+            table_version = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+            self._committer.after_commit(functools.partial(self._set_table_version, table, table_version))
+        return version
+    
+    def _set_table_version(self, table: str, version: int):
+        self.table_versions[table] = max(self.table_versions[table], version)
+    
+    def _notify(self, event_type: str, version: int, **payload):
+        """通知监听者元数据发生了变化"""
+        event = {"type": event_type, "version": version, **payload}
+        for listener in list(self.listeners):
+            listener(event)
+    
+    def get_version(self, table: str = None):
+        """获取当前元数据版本号；指定表名（teacher_files / student_work）时为该表的版本号"""
+        if table is not None:
+            return self.table_versions[table]
+        return self.version
     
-    def _load_metadata(self):
-        """加载文件元数据"""
+    @classmethod
+    def hash_file(cls, file_path):
+        """流式计算文件的 SHA-256"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            while chunk := f.read(cls.HASH_CHUNK_SIZE):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def _migrate_legacy_metadata(self):
+        """将旧版 metadata.json 及其追加日志迁移到 SQLite"""
+        legacy_files = [self.metadata_file, self.rotated_journal_file, self.journal_file]
+        if not any(path.exists() for path in legacy_files):
+            return
+        
+        metadata = {"teacher_files": {}, "student_work": {}}
         if self.metadata_file.exists():
             try:
                 with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                    metadata = json.load(f)
             except (json.JSONDecodeError, FileNotFoundError):
                 pass
-        return {"teacher_files": {}, "student_work": {}}
+        for journal in (self.rotated_journal_file, self.journal_file):
+            self._replay_journal(journal, metadata)
+        
+        def migrate():
+            for file_id, info in metadata.get("teacher_files", {}).items():
+                self._db.execute(
+                    "INSERT OR REPLACE INTO teacher_files "
+                    "(file_id, original_name, saved_name, description, upload_time, file_size) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (int(file_id), info["original_name"], info["saved_name"],
+                     info.get("description", ""), info["upload_time"], info["file_size"]))
+            for work_id, info in metadata.get("student_work", {}).items():
+                self._db.execute(
+                    "INSERT OR REPLACE INTO student_work "
+                    "(work_id, original_name, saved_name, student_name, description, "
+                    "upload_time, file_size, file_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (int(work_id), info["original_name"], info["saved_name"], info["student_name"],
+                     info.get("description", ""), info["upload_time"], info["file_size"],
+                     info["file_path"]))
+            self._bump_version("teacher_files", "student_work")
+        self._write(migrate)
+        
+        # 保留原文件以便回退，但不再参与加载
+        for path in legacy_files:
+            if path.exists():
+                os.replace(path, path.with_name(path.name + ".migrated"))
     
-    def _save_metadata(self):
-        """保存文件元数据"""
-        with open(self.metadata_file, 'w', encoding='utf-8') as f:
-            json.dump(self.metadata, f, ensure_ascii=False, indent=2)
+    @staticmethod
+    def _replay_journal(journal_path: Path, metadata: dict):
+        """将旧版追加日志中的修改依次应用到元数据上"""
+        if not journal_path.exists():
+            return
+        with open(journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 写入过程中断电留下的残缺尾行，忽略
+                    continue
+                table = metadata.setdefault(entry["table"], {})
+                if entry["op"] == "put":
+                    table[entry["id"]] = entry["record"]
+                elif entry["op"] == "del":
+                    table.pop(entry["id"], None)
     
-    def save_teacher_file(self, file_path: str, filename: str, description: str = ""):
-        """保存老师上传的文件"""
-        import shutil
-        
-        # 生成唯一文件名
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_filename = f"{timestamp}_{filename}"
-        target_path = self.teacher_files_dir / unique_filename
+    def _migrate_to_blob_store(self):
+        """把旧版本按文件名保存的文件移动到内容寻址存储（只执行一次）"""
+        if self._query("SELECT value FROM meta WHERE key = 'blob_store'")[0][0]:
+            return
         
-        # 复制文件
-        shutil.copy2(file_path, target_path)
+        legacy = [("teacher_files", "file_id", row["file_id"], self.teacher_files_dir / row["saved_name"],
+                   row["content_hash"])
+                  for row in self._query("SELECT file_id, saved_name, content_hash FROM teacher_files")]
+        legacy += [("student_work", "work_id", row["work_id"], self.base_dir / row["file_path"],
+                    row["content_hash"])
+                   for row in self._query("SELECT work_id, file_path, content_hash FROM student_work")]
+        for table, id_column, record_id, file_path, content_hash in legacy:
+            if not file_path.exists():
+                # 文件已丢失的记录不引用任何内容
+                self._write(lambda: self._db.execute(
+                    f"UPDATE {table} SET content_hash = NULL WHERE {id_column} = ?", (record_id,)))
+                continue
+            staged, content_hash, file_size = self._stage_blob(file_path, move=True,
+                                                               content_hash=content_hash)
+            
+            def register():
+                self._add_blob_ref(staged, content_hash, file_size, count=False)
+                self._db.execute(f"UPDATE {table} SET content_hash = ? WHERE {id_column} = ?",
+                                 (content_hash, record_id))
+                if table == "student_work":
+                    self._db.execute("UPDATE student_work SET file_path = ? WHERE work_id = ?",
+                                     (self._blob_relative_path(content_hash), record_id))
+            self._write(register)
+        
+        self._write(lambda: self._db.execute("UPDATE meta SET value = 1 WHERE key = 'blob_store'"))
+    
+    def _init_storage_totals(self):
+        """旧版本的数据库没有存储统计的累计值，首次启动时统计一次
+
+        之后累计值与引用计数在同一事务中增减，查询统计时不再扫描各表。
+        """
+        def init():
+            if self._db.execute("SELECT 1 FROM meta WHERE key = 'stored_bytes'").fetchone():
+                return
+            blob_count, stored_bytes, logical_bytes = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(size * ref_count), 0) "
+                "FROM blobs").fetchone()
+            self._db.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+                ("blob_count", blob_count), ("stored_bytes", stored_bytes), ("logical_bytes", logical_bytes)])
+        self._write(init)
+    
+    def _update_storage_totals(self, blob_count: int = 0, stored_bytes: int = 0, logical_bytes: int = 0):
+        """增减存储统计的累计值（需在写操作内调用）"""
+        self._db.executemany("UPDATE meta SET value = value + ? WHERE key = ?", [
+            (blob_count, "blob_count"), (stored_bytes, "stored_bytes"), (logical_bytes, "logical_bytes")])
+    
+    def _blob_path(self, content_hash: str):
+        """内容在磁盘上的位置"""
+        return self.blobs_dir / content_hash[:2] / content_hash
+    
+    def _blob_relative_path(self, content_hash: str):
+        """内容相对于 base_dir 的路径（写入 student_work.file_path）"""
+        return self._blob_path(content_hash).relative_to(self.base_dir).as_posix()
+    
+    def _stage_blob(self, file_path, move: bool, content_hash: str = None):
+        """把文件放入临时目录（在调用线程中执行），返回 (暂存路径, 内容哈希, 文件大小)
         
-        # 记录元数据
-        file_id = str(len(self.metadata["teacher_files"]) + 1)
-        self.metadata["teacher_files"][file_id] = {
-            "original_name": filename,
-            "saved_name": unique_filename,
-            "description": description,
-            "upload_time": datetime.now().isoformat(),
-            "file_size": os.path.getsize(target_path)
-        }
+        复制时边读边算哈希，只读一遍源文件；移动时若已知哈希则不再读取。
+        """
+        import shutil
         
-        self._save_metadata()
+        staged = self.tmp_dir / f"{uuid.uuid4().hex}.blob"
+        if move:
+            shutil.move(str(file_path), staged)
+            if content_hash is None:
+                content_hash = self.hash_file(staged)
+        else:
+            digest = hashlib.sha256()
+            with open(file_path, 'rb') as src, open(staged, 'wb') as dst:
+                while chunk := src.read(self.HASH_CHUNK_SIZE):
+                    digest.update(chunk)
+                    dst.write(chunk)
+            shutil.copystat(file_path, staged)
+            content_hash = digest.hexdigest()
+        return staged, content_hash, os.path.getsize(staged)
+    
+    def _add_blob_ref(self, staged: Path, content_hash: str, size: int, count: bool = True):
+        """登记对一份内容的引用（需在写操作内调用），返回内容是否已存在
+        
+        内容已存在时直接丢弃暂存文件，否则把暂存文件改名为内容文件；
+        count 为 True 时计入去重统计。
+        """
+        row = self._db.execute(
+            "SELECT ref_count FROM blobs WHERE content_hash = ?", (content_hash,)).fetchone()
+        blob_path = self._blob_path(content_hash)
+        deduplicated = row is not None and blob_path.exists()
+        if deduplicated:
+            staged.unlink()
+        else:
+            blob_path.parent.mkdir(exist_ok=True)
+            os.replace(staged, blob_path)
+        self._db.execute(
+            "INSERT INTO blobs (content_hash, size, ref_count) VALUES (?, ?, 1) "
+            "ON CONFLICT (content_hash) DO UPDATE SET ref_count = ref_count + 1",
+            (content_hash, size))
+        if row is None:
+            self._update_storage_totals(blob_count=1, stored_bytes=size, logical_bytes=size)
+        else:
+            self._update_storage_totals(logical_bytes=size)
+        if count:
+            key = "dedup_hits" if deduplicated else "dedup_misses"
+            self._db.execute("UPDATE meta SET value = value + 1 WHERE key = ?", (key,))
+        return deduplicated
+    
+    def _release_blob(self, content_hash: str):
+        """释放对一份内容的引用（需在写操作内调用），引用归零时在提交后删除文件"""
+        if not content_hash:
+            return
+        self._db.execute("UPDATE blobs SET ref_count = ref_count - 1 WHERE content_hash = ?",
+                         (content_hash,))
+        row = self._db.execute(
+            "SELECT size, ref_count FROM blobs WHERE content_hash = ?", (content_hash,)).fetchone()
+        if row is None:
+            return
+        if row["ref_count"] > 0:
+            self._update_storage_totals(logical_bytes=-row["size"])
+            return
+        self._update_storage_totals(blob_count=-1, stored_bytes=-row["size"], logical_bytes=-row["size"])
+        self._db.execute("DELETE FROM blobs WHERE content_hash = ?", (content_hash,))
+        self._committer.after_commit(lambda: self._remove_orphan_blob(content_hash))
+    
+    def _remove_orphan_blob(self, content_hash: str):
+        """删除不再被引用的内容文件（在写入线程中、提交之后执行）
         
+        同一批写操作中可能又有相同内容登记进来，因此删除前再确认一次。
+        """
+        if self._db.execute("SELECT 1 FROM blobs WHERE content_hash = ?", (content_hash,)).fetchone() is None:
+            self._blob_path(content_hash).unlink(missing_ok=True)
+    
+    def get_storage_stats(self):
+        """去重存储统计：实际占用、逻辑大小及去重命中率（读取累计值，不扫描各表）"""
+        counters = dict(self._query(
+            "SELECT key, value FROM meta WHERE key IN "
+            "('blob_count', 'stored_bytes', 'logical_bytes', 'dedup_hits', 'dedup_misses')"))
+        hits, misses = counters["dedup_hits"], counters["dedup_misses"]
         return {
-            "file_id": file_id,
-            "filename": filename,
-            "saved_name": unique_filename,
-            "description": description,
-            "upload_time": self.metadata["teacher_files"][file_id]["upload_time"],
-            "file_size": self.metadata["teacher_files"][file_id]["file_size"]
+            "blob_count": counters["blob_count"],
+            "stored_bytes": counters["stored_bytes"],
+            "logical_bytes": counters["logical_bytes"],
+            "saved_bytes": counters["logical_bytes"] - counters["stored_bytes"],
+            "dedup_hits": hits,
+            "dedup_misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0
         }
     
-    def save_student_work(self, file_path: str, filename: str, student_name: str, description: str = ""):
-        """保存学生提交的作业"""
-        import shutil
+    def close(self):
+        """等待排队的写操作完成后关闭元数据库"""
+        self._manifest_jobs.shutdown(wait=True, cancel_futures=True)
+        self._committer.close()
+        self._db.close()
+        with self._readers_lock:
+            for db in self._readers.values():
+                db.close()
+            self._readers.clear()
+    
+    def save_teacher_file(self, file_path: str, filename: str, description: str = ""):
+        """保存老师上传的文件"""
+        return self.save_teacher_files([(file_path, filename)], description)[0]
+    
+    def save_teacher_files(self, files, description: str = ""):
+        """批量保存老师上传的文件：files 为 (文件路径, 文件名) 列表，全部在一个事务中登记"""
+        staged_files = self._stage_blobs(files, move=False)
+        
+        def register():
+            results = []
+            for staged, content_hash, file_size, filename in staged_files:
+                deduplicated = self._add_blob_ref(staged, content_hash, file_size)
+                # 生成唯一文件名（下载时的文件名）
+                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                unique_filename = f"{timestamp}_{filename}"
+                upload_time = datetime.now().isoformat()
+                cursor = self._db.execute(
+                    "INSERT INTO teacher_files (original_name, saved_name, description, upload_time, "
+                    "file_size, content_hash) VALUES (?, ?, ?, ?, ?, ?)",
+                    (filename, unique_filename, description, upload_time, file_size, content_hash))
+                results.append({
+                    "file_id": str(cursor.lastrowid),
+                    "filename": filename,
+                    "saved_name": unique_filename,
+                    "description": description,
+                    "upload_time": upload_time,
+                    "file_size": file_size,
+                    "deduplicated": deduplicated
+                })
+            return results, self._bump_version("teacher_files")
         
-        # 按学生姓名创建子目录
-        student_dir = self.student_work_dir / student_name
-        student_dir.mkdir(exist_ok=True)
+        try:
+            results, version = self._write(register)
+        finally:
+            for staged, *_ in staged_files:
+                staged.unlink(missing_ok=True)
+        
+        for result in results:
+            self._schedule_manifest(result["file_id"])
+            self._notify("teacher_file_added", version, file={
+                key: result[key] for key in ("file_id", "filename", "description", "upload_time", "file_size")
+            })
+        return results
+    
+    def _stage_blobs(self, files, move: bool):
+        """依次暂存多个文件，返回 [(暂存路径, 内容哈希, 文件大小, 文件名)]；中途失败时清理已暂存的文件"""
+        staged_files = []
+        try:
+            for file_path, filename, *content_hash in files:
+                staged_files.append((*self._stage_blob(file_path, move, *content_hash), filename))
+        except BaseException:
+            for staged, *_ in staged_files:
+                staged.unlink(missing_ok=True)
+            raise
+        return staged_files
+    
+    def save_student_work(self, file_path: str, filename: str, student_name: str, description: str = "",
+                          move: bool = False, content_hash: str = None):
+        """保存学生提交的作业
+
+        move 为 True 时直接移动源文件（用于服务器自己的临时文件），避免再复制一遍；
+        已知内容哈希时可通过 content_hash 传入，省去重新计算。
+        与已有提交内容相同时只增加引用计数，不再占用磁盘空间。
+        """
+        return self.save_student_works([(file_path, filename, content_hash)], student_name,
+                                       description, move)[0]
+    
+    def save_student_works(self, files, student_name: str, description: str = "", move: bool = False):
+        """批量保存同一学生的多个作业，全部在一个事务中登记
+
+        files 为 (文件路径, 文件名) 或 (文件路径, 文件名, 内容哈希) 列表。
+        """
+        # 移动或复制到暂存区，再登记到内容寻址存储
+        staged_files = self._stage_blobs(files, move)
+        
+        def register():
+            results = []
+            for staged, content_hash, file_size, filename in staged_files:
+                deduplicated = self._add_blob_ref(staged, content_hash, file_size)
+                work = self._insert_student_work(
+                    filename, student_name, description, file_size, content_hash)
+                results.append((work, deduplicated))
+            return results, self._bump_version("student_work")
         
-        # 生成唯一文件名
+        try:
+            results, version = self._write(register)
+        finally:
+            for staged, *_ in staged_files:
+                staged.unlink(missing_ok=True)
+        
+        for work, _ in results:
+            self._notify("student_work_added", version, work=work)
+        return [{**work, "deduplicated": deduplicated} for work, deduplicated in results]
+    
+    def save_student_work_by_hash(self, content_hash: str, file_size: int, filename: str,
+                                  student_name: str, description: str = ""):
+        """服务器已有相同内容时直接登记作业（秒传），不需要再上传文件内容
+        
+        内容不存在或大小不符时返回 None，客户端应改为正常上传。
+        """
+        if not re.fullmatch(r"[0-9a-f]{64}", content_hash or ""):
+            raise ValueError("无效的 SHA-256")
+        
+        def register():
+            # 检查与登记在同一个写操作中，期间内容不会被删除
+            row = self._db.execute(
+                "SELECT size FROM blobs WHERE content_hash = ?", (content_hash,)).fetchone()
+            if row is None or row["size"] != int(file_size) or not self._blob_path(content_hash).exists():
+                return None
+            self._db.execute(
+                "UPDATE blobs SET ref_count = ref_count + 1 WHERE content_hash = ?", (content_hash,))
+            self._update_storage_totals(logical_bytes=row["size"])
+            self._db.execute("UPDATE meta SET value = value + 1 WHERE key = 'dedup_hits'")
+            work = self._insert_student_work(
+                filename, student_name, description, row["size"], content_hash)
+            return work, self._bump_version("student_work")
+        
+        registered = self._write(register)
+        if registered is None:
+            return None
+        work, version = registered
+        self._notify("student_work_added", version, work=work)
+        return {**work, "deduplicated": True}
+    
+    def _insert_student_work(self, filename: str, student_name: str, description: str,
+                             file_size: int, content_hash: str):
+        """插入一条作业记录（需在写操作内调用），返回作业信息"""
+        # 生成唯一文件名（下载时的文件名）
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         unique_filename = f"{timestamp}_{filename}"
-        target_path = student_dir / unique_filename
-        
-        # 复制文件
-        shutil.copy2(file_path, target_path)
-        
-        # 记录元数据
-        work_id = str(len(self.metadata["student_work"]) + 1)
-        self.metadata["student_work"][work_id] = {
-            "original_name": filename,
-            "saved_name": unique_filename,
-            "student_name": student_name,
-            "description": description,
-            "upload_time": datetime.now().isoformat(),
-            "file_size": os.path.getsize(target_path),
-            "file_path": str(target_path.relative_to(self.base_dir))
-        }
-        
-        self._save_metadata()
-        
+        upload_time = datetime.now().isoformat()
+        cursor = self._db.execute(
+            "INSERT INTO student_work (original_name, saved_name, student_name, description, "
+            "upload_time, file_size, file_path, content_hash) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (filename, unique_filename, student_name, description, upload_time, file_size,
+             self._blob_relative_path(content_hash), content_hash))
         return {
-            "work_id": work_id,
+            "work_id": str(cursor.lastrowid),
             "filename": filename,
             "student_name": student_name,
             "description": description,
-            "upload_time": self.metadata["student_work"][work_id]["upload_time"],
-            "file_size": self.metadata["student_work"][work_id]["file_size"]
+            "upload_time": upload_time,
+            "file_size": file_size
         }
     
-    def get_teacher_files(self):
-        """获取所有老师文件列表"""
-        files = []
-        for file_id, file_info in self.metadata["teacher_files"].items():
-            files.append({
-                "file_id": file_id,
-                "filename": file_info["original_name"],
-                "description": file_info["description"],
-                "upload_time": file_info["upload_time"],
-                "file_size": file_info["file_size"]
-            })
-        return sorted(files, key=lambda x: x["upload_time"], reverse=True)
+    def _upload_data_path(self, upload_id: str):
+        """分块上传会话的数据文件"""
+        return self.tmp_dir / f"{upload_id}.upload"
+    
+    def _expire_upload_sessions(self):
+        """清理超过保留时间仍未提交的上传会话"""
+        cutoff = (datetime.now() - self.UPLOAD_SESSION_TTL).isoformat()
+        
+        def expire():
+            expired = [row["upload_id"] for row in self._db.execute(
+                "SELECT upload_id FROM upload_sessions WHERE created_time < ?", (cutoff,))]
+            for upload_id in expired:
+                self._delete_upload_session(upload_id)
+        self._write(expire)
+    
+    def _delete_upload_session(self, upload_id: str):
+        """删除上传会话记录及其数据文件（需在写操作内调用）"""
+        self._db.execute("DELETE FROM upload_chunks WHERE upload_id = ?", (upload_id,))
+        self._db.execute("DELETE FROM upload_sessions WHERE upload_id = ?", (upload_id,))
+        self._upload_data_path(upload_id).unlink(missing_ok=True)
     
-    def get_student_work(self):
-        """获取所有学生作业列表"""
+    def create_upload_session(self, filename: str, student_name: str, file_size: int,
+                              description: str = "", chunk_size: int = None, content_hash: str = None):
+        """创建分块上传会话，预分配数据文件，返回会话信息"""
+        chunk_size = self.UPLOAD_CHUNK_SIZE if chunk_size is None else int(chunk_size)
+        file_size = int(file_size)
+        if not 0 < chunk_size <= self.MAX_UPLOAD_CHUNK_SIZE:
+            raise ValueError(f"chunk_size 必须在 1 到 {self.MAX_UPLOAD_CHUNK_SIZE} 之间")
+        if file_size < 0:
+            raise ValueError("file_size 不能为负数")
+        
+        upload_id = uuid.uuid4().hex
+        with open(self._upload_data_path(upload_id), 'wb') as f:
+            f.truncate(file_size)
+        self._write(lambda: self._db.execute(
+            "INSERT INTO upload_sessions (upload_id, original_name, student_name, description, "
+            "file_size, chunk_size, content_hash, created_time) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (upload_id, filename, student_name, description, file_size, chunk_size,
+             content_hash, datetime.now().isoformat())))
+        return self.get_upload_session(upload_id)
+    
+    def get_upload_session(self, upload_id: str):
+        """获取上传会话状态（包括已收到的分块序号），不存在时返回 None"""
+        rows = self._query("SELECT * FROM upload_sessions WHERE upload_id = ?", (upload_id,))
+        if not rows:
+            return None
+        row = rows[0]
+        received = [r["chunk_index"] for r in self._query(
+            "SELECT chunk_index FROM upload_chunks WHERE upload_id = ? ORDER BY chunk_index",
+            (upload_id,))]
+        chunk_count = max(1, -(-row["file_size"] // row["chunk_size"]))
+        return {
+            "upload_id": upload_id,
+            "filename": row["original_name"],
+            "student_name": row["student_name"],
+            "description": row["description"],
+            "file_size": row["file_size"],
+            "content_hash": row["content_hash"],
+            "chunk_size": row["chunk_size"],
+            "chunk_count": chunk_count,
+            "received": received
+        }
+    
+    def write_upload_chunk(self, upload_id: str, chunk_index: int, stream):
+        """把一个分块从流中写入会话数据文件的对应位置
+
+        同一分块重复上传会覆盖为相同内容，因此是幂等的。
+        """
+        session = self.get_upload_session(upload_id)
+        if session is None:
+            raise KeyError(upload_id)
+        if not 0 <= chunk_index < session["chunk_count"]:
+            raise ValueError(f"分块序号超出范围: {chunk_index}")
+        
+        offset = chunk_index * session["chunk_size"]
+        expected = min(session["chunk_size"], session["file_size"] - offset)
+        written = 0
+        with open(self._upload_data_path(upload_id), 'r+b') as f:
+            f.seek(offset)
+            while written < expected:
+                block = stream.read(min(self.HASH_CHUNK_SIZE, expected - written))
+                if not block:
+                    break
+                f.write(block)
+                written += len(block)
+        if written != expected:
+            raise ValueError(f"分块长度不正确: 收到 {written} 字节，应为 {expected} 字节")
+        
+        self._write(lambda: self._db.execute(
+            "INSERT OR IGNORE INTO upload_chunks (upload_id, chunk_index) VALUES (?, ?)",
+            (upload_id, chunk_index)))
+        return self.get_upload_session(upload_id)
+    
+    def commit_upload_session(self, upload_id: str):
+        """所有分块到齐后校验并登记为学生作业，返回作业信息"""
+        session = self.get_upload_session(upload_id)
+        if session is None:
+            raise KeyError(upload_id)
+        missing = sorted(set(range(session["chunk_count"])) - set(session["received"]))
+        if missing and session["file_size"] > 0:
+            raise ValueError(f"还有 {len(missing)} 个分块未上传")
+        
+        data_path = self._upload_data_path(upload_id)
+        content_hash = self.hash_file(data_path)
+        if session["content_hash"] and session["content_hash"] != content_hash:
+            raise ValueError("文件校验失败，内容与声明的哈希不一致")
+        
+        result = self.save_student_work(
+            str(data_path), session["filename"], session["student_name"], session["description"],
+            move=True, content_hash=content_hash)
+        self._write(lambda: self._delete_upload_session(upload_id))
+        return result
+    
+    def _query(self, sql: str, params=()):
+        """执行只读查询并返回全部结果行"""
+        return self._reader().execute(sql, params).fetchall()
+    
+    def get_teacher_files(self, limit: int = None):
+        """获取老师文件列表（按上传时间倒序）"""
+        sql = ("SELECT file_id, original_name, description, upload_time, file_size "
+               "FROM teacher_files ORDER BY upload_time DESC, file_id DESC")
+        params = ()
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = (limit,)
+        return [{
+            "file_id": str(row["file_id"]),
+            "filename": row["original_name"],
+            "description": row["description"],
+            "upload_time": row["upload_time"],
+            "file_size": row["file_size"]
+        } for row in self._query(sql, params)]
+    
+    def get_student_work(self, student_name: str = None, limit: int = None):
+        """获取学生作业列表（按提交时间倒序，可按学生过滤）"""
+        sql = ("SELECT work_id, original_name, student_name, description, upload_time, file_size "
+               "FROM student_work")
+        params = []
+        if student_name is not None:
+            sql += " WHERE student_name = ?"
+            params.append(student_name)
+        sql += " ORDER BY upload_time DESC, work_id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [{
+            "work_id": str(row["work_id"]),
+            "filename": row["original_name"],
+            "student_name": row["student_name"],
+            "description": row["description"],
+            "upload_time": row["upload_time"],
+            "file_size": row["file_size"]
+        } for row in self._query(sql, params)]
+    
+    # 列表接口允许的排序键 -> 数据库列
+    TEACHER_FILE_SORT_KEYS = {"upload_time": "upload_time", "filename": "original_name",
+                              "file_size": "file_size"}
+    STUDENT_WORK_SORT_KEYS = {"upload_time": "upload_time", "filename": "original_name",
+                              "file_size": "file_size", "student_name": "student_name"}
+    DEFAULT_PAGE_SIZE = 100
+    MAX_PAGE_SIZE = 500
+    
+    @staticmethod
+    def encode_cursor(sort_value, record_id):
+        """把分页位置编码为不透明的游标字符串"""
+        raw = json.dumps([sort_value, record_id], ensure_ascii=False).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+    
+    @staticmethod
+    def decode_cursor(cursor: str):
+        """解析游标，返回 (排序值, 记录ID)"""
+        try:
+            sort_value, record_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return sort_value, int(record_id)
+        except (ValueError, TypeError):
+            raise ValueError("无效的分页游标")
+    
+    def _list_page(self, table: str, id_column: str, columns: str, sort_keys: dict,
+                   conditions: list, params: list, sort: str, order: str, limit: int, after: str):
+        """按游标分页查询（键集分页，只读取当前页需要的行）"""
+        if sort not in sort_keys:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"不支持的排序方向: {order}")
+        limit = self.DEFAULT_PAGE_SIZE if limit is None else int(limit)
+        if not 1 <= limit <= self.MAX_PAGE_SIZE:
+            raise ValueError(f"limit 必须在 1 到 {self.MAX_PAGE_SIZE} 之间")
+        
+        sort_column = sort_keys[sort]
+        conditions = list(conditions)
+        params = list(params)
+        if after:
+            sort_value, record_id = self.decode_cursor(after)
+            comparator = "<" if order == "desc" else ">"
+            conditions.append(f"({sort_column}, {id_column}) {comparator} (?, ?)")
+            params.extend([sort_value, record_id])
+        
+        sql = f"SELECT {columns}, {sort_column} AS _sort_value FROM {table}"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {sort_column} {order.upper()}, {id_column} {order.upper()} LIMIT ?"
+        # 多取一行用于判断是否还有下一页
+        params.append(limit + 1)
+        
+        rows = self._query(sql, params)
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self.encode_cursor(rows[-1]["_sort_value"], rows[-1][id_column])
+        return rows, next_cursor
+    
+    @staticmethod
+    def _prefix_condition(column: str, prefix: str, conditions: list, params: list):
+        """文件名前缀过滤，写成范围条件以便走索引"""
+        conditions.append(f"{column} >= ? AND {column} < ?")
+        params.extend([prefix, prefix + "\U0010ffff"])
+    
+    def list_teacher_files(self, since: str = None, until: str = None, prefix: str = None,
+                           sort: str = "upload_time", order: str = "desc",
+                           limit: int = None, after: str = None):
+        """分页获取老师文件列表，返回 (文件列表, 下一页游标)"""
+        conditions, params = [], []
+        if since:
+            conditions.append("upload_time >= ?")
+            params.append(since)
+        if until:
+            conditions.append("upload_time < ?")
+            params.append(until)
+        if prefix:
+            self._prefix_condition("original_name", prefix, conditions, params)
+        
+        rows, next_cursor = self._list_page(
+            "teacher_files", "file_id", "file_id, original_name, description, upload_time, file_size",
+            self.TEACHER_FILE_SORT_KEYS, conditions, params, sort, order, limit, after)
+        files = [{
+            "file_id": str(row["file_id"]),
+            "filename": row["original_name"],
+            "description": row["description"],
+            "upload_time": row["upload_time"],
+            "file_size": row["file_size"]
+        } for row in rows]
+        return files, next_cursor
+    
+    def list_student_work(self, student_name: str = None, since: str = None, until: str = None,
+                          prefix: str = None, sort: str = "upload_time", order: str = "desc",
+                          limit: int = None, after: str = None):
+        """分页获取学生作业列表，返回 (作业列表, 下一页游标)"""
+        conditions, params = [], []
+        if student_name:
+            conditions.append("student_name = ?")
+            params.append(student_name)
+        if since:
+            conditions.append("upload_time >= ?")
+            params.append(since)
+        if until:
+            conditions.append("upload_time < ?")
+            params.append(until)
+        if prefix:
+            self._prefix_condition("original_name", prefix, conditions, params)
+        
+        rows, next_cursor = self._list_page(
+            "student_work", "work_id",
+            "work_id, original_name, student_name, description, upload_time, file_size",
+            self.STUDENT_WORK_SORT_KEYS, conditions, params, sort, order, limit, after)
+        works = [{
+            "work_id": str(row["work_id"]),
+            "filename": row["original_name"],
+            "student_name": row["student_name"],
+            "description": row["description"],
+            "upload_time": row["upload_time"],
+            "file_size": row["file_size"]
+        } for row in rows]
+        return works, next_cursor
+    
+    def _get_blob(self, table: str, id_column: str, record_id: str):
+        """获取记录指向的内容：{path, content_hash, download_name}，文件不存在时返回 None"""
+        rows = self._query(f"SELECT saved_name, content_hash FROM {table} WHERE {id_column} = ?",
+                           (record_id,))
+        if not rows or not rows[0]["content_hash"]:
+            return None
+        file_path = self._blob_path(rows[0]["content_hash"])
+        if not file_path.exists():
+            return None
+        return {
+            "path": str(file_path),
+            "content_hash": rows[0]["content_hash"],
+            "download_name": rows[0]["saved_name"]
+        }
+    
+    def get_teacher_file_blob(self, file_id: str):
+        """获取老师文件的内容位置、哈希和下载文件名"""
+        return self._get_blob("teacher_files", "file_id", file_id)
+    
+    def get_student_work_blob(self, work_id: str):
+        """获取学生作业的内容位置、哈希和下载文件名"""
+        return self._get_blob("student_work", "work_id", work_id)
+    
+    def get_student_work_files(self, student_name: str = None, since: str = None, until: str = None):
+        """获取（可按学生和提交时间过滤的）作业及其内容位置，按学生和提交时间排序，用于打包导出"""
+        conditions, params = ["content_hash IS NOT NULL"], []
+        if student_name:
+            conditions.append("student_name = ?")
+            params.append(student_name)
+        if since:
+            conditions.append("upload_time >= ?")
+            params.append(since)
+        if until:
+            conditions.append("upload_time < ?")
+            params.append(until)
+        rows = self._query(
+            "SELECT work_id, original_name, student_name, upload_time, file_size, content_hash "
+            "FROM student_work WHERE " + " AND ".join(conditions) +
+            " ORDER BY student_name, upload_time, work_id", params)
         works = []
-        for work_id, work_info in self.metadata["student_work"].items():
-            works.append({
-                "work_id": work_id,
-                "filename": work_info["original_name"],
-                "student_name": work_info["student_name"],
-                "description": work_info["description"],
-                "upload_time": work_info["upload_time"],
-                "file_size": work_info["file_size"]
-            })
-        return sorted(works, key=lambda x: x["upload_time"], reverse=True)
+        for row in rows:
+            file_path = self._blob_path(row["content_hash"])
+            if file_path.exists():
+                works.append({
+                    "work_id": str(row["work_id"]),
+                    "filename": row["original_name"],
+                    "student_name": row["student_name"],
+                    "upload_time": row["upload_time"],
+                    "file_size": row["file_size"],
+                    "path": str(file_path)
+                })
+        return works
     
     def get_teacher_file_path(self, file_id: str):
         """获取老师文件的完整路径"""
-        if file_id in self.metadata["teacher_files"]:
-            saved_name = self.metadata["teacher_files"][file_id]["saved_name"]
-            file_path = self.teacher_files_dir / saved_name
-            if file_path.exists():
-                return str(file_path)
-        return None
+        blob = self.get_teacher_file_blob(file_id)
+        return blob["path"] if blob else None
     
     def get_student_work_path(self, work_id: str):
         """获取学生作业的完整路径"""
-        if work_id in self.metadata["student_work"]:
-            file_path = self.base_dir / self.metadata["student_work"][work_id]["file_path"]
-            if file_path.exists():
-                return str(file_path)
-        return None
+        blob = self.get_student_work_blob(work_id)
+        return blob["path"] if blob else None
+    
+    def get_teacher_file_hash(self, file_id: str):
+        """获取老师文件的内容哈希（SHA-256）"""
+        blob = self.get_teacher_file_blob(file_id)
+        return blob["content_hash"] if blob else None
+    
+    def get_student_work_hash(self, work_id: str):
+        """获取学生作业的内容哈希（SHA-256）"""
+        blob = self.get_student_work_blob(work_id)
+        return blob["content_hash"] if blob else None
+    
+    def get_teacher_file_manifest(self, file_id: str):
+        """获取老师文件的分块清单：文件信息及每个分块的 SHA-256
+
+        文件不存在时返回 None；清单尚未生成（如旧版本保存的文件）时安排在后台生成并返回 False。
+        """
+        blob = self.get_teacher_file_blob(file_id)
+        if not blob:
+            return None
+        file_path, content_hash = blob["path"], blob["content_hash"]
+        rows = self._query("SELECT chunk_size, chunk_hashes FROM chunk_manifests WHERE file_id = ?",
+                           (file_id,))
+        if not rows or rows[0]["chunk_size"] != self.SWARM_CHUNK_SIZE:
+            self._schedule_manifest(file_id)
+            return False
+        chunk_hashes = json.loads(rows[0]["chunk_hashes"])
+        return {
+            "file_id": int(file_id),
+            "file_size": os.path.getsize(file_path),
+            "content_hash": content_hash,
+            "chunk_size": self.SWARM_CHUNK_SIZE,
+            "chunks": chunk_hashes,
+        }
+    
+    def _schedule_manifest(self, file_id: str):
+        """安排在后台生成老师文件的分块清单（已在排队时忽略）"""
+        file_id = str(file_id)
+        with self._manifests_lock:
+            if file_id in self._manifests_queued:
+                return
+            self._manifests_queued.add(file_id)
+        try:
+            self._manifest_jobs.submit(self._build_manifest, file_id)
+        except RuntimeError:
+            # 正在关闭
+            with self._manifests_lock:
+                self._manifests_queued.discard(file_id)
+    
+    def _build_manifest(self, file_id: str):
+        """计算每个分块的 SHA-256 并保存；期间文件被删除时放弃"""
+        try:
+            blob = self.get_teacher_file_blob(file_id)
+            if not blob:
+                return
+            chunk_hashes = []
+            with open(blob["path"], "rb") as f:
+                while chunk := f.read(self.SWARM_CHUNK_SIZE):
+                    chunk_hashes.append(hashlib.sha256(chunk).hexdigest())
+            self._write(lambda: self._db.execute(
+                "INSERT OR REPLACE INTO chunk_manifests (file_id, chunk_size, chunk_hashes) "
+                "SELECT ?, ?, ? WHERE EXISTS (SELECT 1 FROM teacher_files WHERE file_id = ?)",
+                (file_id, self.SWARM_CHUNK_SIZE, json.dumps(chunk_hashes), file_id)))
+        except OSError:
+            # 内容已随文件删除
+            pass
+        finally:
+            with self._manifests_lock:
+                self._manifests_queued.discard(file_id)
+    
+    def wait_for_manifests(self):
+        """等待已安排的分块清单全部生成完毕"""
+        self._manifest_jobs.submit(lambda: None).result()
     
     def delete_teacher_file(self, file_id: str):
-        """删除老师文件"""
-        if file_id in self.metadata["teacher_files"]:
-            file_info = self.metadata["teacher_files"][file_id]
-            file_path = self.teacher_files_dir / file_info["saved_name"]
-            if file_path.exists():
-                file_path.unlink()
-            del self.metadata["teacher_files"][file_id]
-            self._save_metadata()
-            return True
-        return False
+        """删除老师文件（内容不再被引用时才删除磁盘文件）"""
+        return bool(self.delete_teacher_files([file_id]))
+    
+    def delete_teacher_files(self, file_ids):
+        """批量删除老师文件，全部在一个事务中完成，返回实际删除的文件ID"""
+        return self._delete_records("teacher_files", "file_id", file_ids, "teacher_file_deleted")
     
     def delete_student_work(self, work_id: str):
-        """删除学生作业"""
-        if work_id in self.metadata["student_work"]:
-            work_info = self.metadata["student_work"][work_id]
-            file_path = self.base_dir / work_info["file_path"]
-            if file_path.exists():
-                file_path.unlink()
-            del self.metadata["student_work"][work_id]
-            self._save_metadata()
-            return True
-        return False
+        """删除学生作业（内容不再被引用时才删除磁盘文件）"""
+        return bool(self.delete_student_works([work_id]))
+    
+    def delete_student_works(self, work_ids):
+        """批量删除学生作业（如学期末清理），全部在一个事务中完成，返回实际删除的作业ID"""
+        return self._delete_records("student_work", "work_id", work_ids, "student_work_deleted")
+    
+    def _delete_records(self, table: str, id_column: str, record_ids, event_type: str):
+        """在一个事务中删除多条记录并释放其内容引用，返回实际删除的记录ID"""
+        def delete():
+            deleted = []
+            for record_id in record_ids:
+                row = self._db.execute(
+                    f"SELECT content_hash FROM {table} WHERE {id_column} = ?", (record_id,)).fetchone()
+                if row is None:
+                    continue
+                self._db.execute(f"DELETE FROM {table} WHERE {id_column} = ?", (record_id,))
+                if table == "teacher_files":
+                    self._db.execute("DELETE FROM chunk_manifests WHERE file_id = ?", (record_id,))
+                self._release_blob(row["content_hash"])
+                deleted.append(str(record_id))
+            return deleted, (self._bump_version(table) if deleted else None)
+        
+        deleted, version = self._write(delete)
+        for record_id in deleted:
+            self._notify(event_type, version, **{id_column: record_id})
+        return deleted
+
+
+def create_app(file_manager):
+    """创建教师端文件服务的 Flask 应用"""
+    app = Flask(__name__)
+    CORS(app)
+    # 请求体带 Content-Encoding（压缩上传）时先解压
+    app.wsgi_app = wire_compression.DecompressRequestBody(app.wsgi_app)
+    # P2P 分发的 tracker（只在内存中，学生端会定期重新报告）
+    tracker = PeerTracker()
+    # 老师文件增删的实时推送（SSE），服务器关闭前应调用 app.extensions["event_hub"].close()
+    event_hub = EventHub()
+    file_manager.listeners.append(event_hub.publish)
+    app.extensions["event_hub"] = event_hub
+    
+    def listing_etag(table):
+        """列表接口的 ETag：该表的版本号（修改另一张表时缓存仍然有效）
+
+        每一页都带同一个 ETag，304 的含义是"整个列表未变化"：客户端第一页命中 304
+        时其余页也不必再请求；列表变化后所有页都要重新拉取。不提供逐页的 304，
+        因为键集分页下新增一行会让之后每一页的游标都改变，缓存的页本来就无法复用。
+        """
+        return f"v{file_manager.get_version(table)}"
+    
+    def not_modified(etag):
+        """客户端缓存仍然有效时返回 304，不再查询和序列化列表"""
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    
+    def json_with_etag(payload, etag):
+        response = jsonify(payload)
+        response.set_etag(etag)
+        # 要求客户端每次都带 If-None-Match 重新验证
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+    
+    def send_file_range(file_path, content_hash, download_name):
+        """自行处理 If-None-Match / Range / If-Range，响应体为定位到区间起点的文件
+
+        werkzeug 处理 Range 时会把文件包装成 Python 迭代器逐块读取；这里直接把
+        文件交给服务器的 wsgi.file_wrapper，由服务器按 Content-Length 截断，
+        整个文件和分段下载都能走 os.sendfile 零拷贝发送。
+        """
+        if request.if_none_match.contains(content_hash):
+            return not_modified(content_hash)
+        file_size = os.path.getsize(file_path)
+        start, stop = 0, file_size
+        partial = (
+            request.range is not None
+            and request.if_range.date is None
+            and request.if_range.etag in (None, content_hash)
+        )
+        if partial:
+            bounds = request.range.range_for_length(file_size)
+            if bounds is None:
+                raise RequestedRangeNotSatisfiable(length=file_size)
+            start, stop = bounds
+
+        file = open(file_path, 'rb')
+        file.seek(start)
+        response = send_file(
+            file,
+            as_attachment=True,
+            download_name=download_name,
+            etag=content_hash,
+            last_modified=os.path.getmtime(file_path),
+            conditional=False
+        )
+        response.content_length = stop - start
+        response.accept_ranges = "bytes"
+        if partial:
+            response.status_code = 206
+            response.content_range = ContentRange("bytes", start, stop, file_size)
+        return response
+
+    def send_compressed(blob, encoding):
+        """整个文件按协商的编码边读边压缩发送
+
+        压缩后的长度事先未知，用 X-File-Size 告诉客户端原始大小以显示进度。
+        ETag 仍是内容哈希：分段请求总是发送原始字节，客户端可以按解压后的
+        偏移量断点续传。
+        """
+        content_hash = blob["content_hash"]
+        if request.if_none_match.contains(content_hash):
+            return not_modified(content_hash)
+        file = open(blob["path"], 'rb')
+        response = send_file(
+            file,
+            as_attachment=True,
+            download_name=blob["download_name"],
+            etag=content_hash,
+            last_modified=os.path.getmtime(blob["path"]),
+            conditional=False
+        )
+        # 沿用 send_file 生成的响应头，响应体换成压缩流
+        response.response = wire_compression.compress_stream(file, encoding)
+        del response.headers["Content-Length"]
+        response.content_encoding = encoding
+        response.headers["X-File-Size"] = str(os.path.getsize(blob["path"]))
+        return response
+    
+    def send_file_with_hash(blob):
+        """发送文件，并附带内容哈希供客户端校验完整性
+
+        完整下载且文件可压缩时按 Accept-Encoding 压缩传输；分段下载和 HEAD
+        请求总是发送原始字节。
+        """
+        file_path, content_hash = blob["path"], blob["content_hash"]
+        encoding = None
+        if request.method == "GET" and request.range is None:
+            encoding = request.accept_encodings.best_match(wire_compression.SUPPORTED_ENCODINGS)
+        if encoding and wire_compression.is_compressible(file_path, blob["download_name"]):
+            response = send_compressed(blob, encoding)
+        elif request.environ.get(WSGIServer.SIZED_FILE_WRAPPER):
+            response = send_file_range(file_path, content_hash, blob["download_name"])
+        else:
+            response = send_file(file_path, as_attachment=True, download_name=blob["download_name"],
+                                 etag=content_hash)
+        response.headers["X-Content-SHA256"] = content_hash
+        response.vary.add("Accept-Encoding")
+        return response
+    
+    def upload_session_response(session):
+        """上传会话响应，Accept-Encoding 中列出分块可以使用的压缩编码"""
+        response = jsonify({"success": True, "upload": session})
+        response.headers["Accept-Encoding"] = ", ".join(wire_compression.SUPPORTED_ENCODINGS)
+        return response
+    
+    def save_upload_to_tmp(file):
+        """先把上传内容写到临时文件，返回临时文件路径"""
+        fd, tmp_path = tempfile.mkstemp(dir=file_manager.tmp_dir)
+        os.close(fd)
+        file.save(tmp_path)
+        return tmp_path
+    
+    @app.route('/api/health', methods=['GET'])
+    def health_check():
+        return jsonify({"status": "ok", "message": "教师端服务器运行正常"})
+    
+    @app.route('/api/events', methods=['GET'])
+    def event_stream():
+        """老师文件增删的 SSE 推送；断线重连时按 Last-Event-ID 补发错过的事件"""
+        subscription, missed = event_hub.subscribe(request.headers.get("Last-Event-ID"))
+        if subscription is None:
+            response = jsonify({"success": False, "error": "实时推送连接数已满，请手动刷新"})
+            response.status_code = 503
+            response.headers["Retry-After"] = "60"
+            return response
+        response = app.response_class(event_hub.stream(subscription, missed),
+                                      mimetype="text/event-stream")
+        response.headers["Cache-Control"] = "no-cache"
+        # 逐个事件发送，不要被中间的代理缓冲
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+    
+    @app.route('/api/storage/stats', methods=['GET'])
+    def get_storage_stats():
+        """去重存储统计：实际占用、逻辑大小、命中次数和命中率"""
+        try:
+            return jsonify({"success": True, "stats": file_manager.get_storage_stats()})
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+    
+    @app.route('/api/teacher/files', methods=['GET'])
+    def get_teacher_files():
+        try:
+            etag = listing_etag("teacher_files")
+            if request.if_none_match.contains(etag):
+                return not_modified(etag)
+            files, next_cursor = file_manager.list_teacher_files(
+                since=request.args.get('since'),
+                until=request.args.get('until'),
+                prefix=request.args.get('prefix'),
+                sort=request.args.get('sort', 'upload_time'),
+                order=request.args.get('order', 'desc'),
+                limit=request.args.get('limit', type=int),
+                after=request.args.get('after')
+            )
+            return json_with_etag({"success": True, "files": files, "next_cursor": next_cursor}, etag)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+    
+    @app.route('/api/teacher/files', methods=['POST'])
+    def upload_teacher_file():
+        try:
+            if 'file' not in request.files:
+                return jsonify({"success": False, "error": "没有选择文件"}), 400
+            
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({"success": False, "error": "文件名不能为空"}), 400
+            
+            description = request.form.get('description', '')
+            
+            # 保存文件
+            tmp_path = save_upload_to_tmp(file)
+            try:
+                result = file_manager.save_teacher_file(
+                    file_path=tmp_path,
+                    filename=file.filename,
+                    description=description
+                )
+            finally:
+                os.remove(tmp_path)
+            
+            return jsonify({"success": True, "file": result})
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+    
+    @app.route('/api/teacher/files/<file_id>', methods=['GET'])
+    def download_teacher_file(file_id):
+        try:
+            blob = file_manager.get_teacher_file_blob(file_id)
+            if not blob:
+                return jsonify({"success": False, "error": "文件不存在"}), 404
+            
+            # 以内容哈希作为强 ETag，send_file 会据此处理 If-None-Match、
+            # Range / If-Range（206 断点续传）
+            return send_file_with_hash(blob)
+        except HTTPException:
+            raise
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+    
+    @app.route('/api/teacher/files/<file_id>/manifest', methods=['GET'])
+    def get_teacher_file_manifest(file_id):
+        """P2P 下载第一步：分块清单，以及当前持有分块的同学"""
+        try:
+            manifest = file_manager.get_teacher_file_manifest(file_id)
+            if manifest is None:
+                return jsonify({"success": False, "error": "文件不存在"}), 404
+            if manifest is False:
+                # 清单正在后台生成，学生端先用普通下载
+                response = jsonify({"success": False, "error": "分块清单正在生成"})
+                response.status_code = 503
+                response.headers["Retry-After"] = "5"
+                return response
+            manifest["peers"] = tracker.peers(manifest["content_hash"])
+            return jsonify(manifest)
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+    
+    @app.route('/api/teacher/files/<file_id>/peers', methods=['POST'])
+    def announce_peer(file_id):
+        """学生报告持有的分块及正在向教师端请求的分块（地址取请求来源 IP + 分块服务器端口），返回其他同学"""
+        try:
+            content_hash = file_manager.get_teacher_file_hash(file_id)
+            if content_hash is None:
+                return jsonify({"success": False, "error": "文件不存在"}), 404
+            data = request.get_json(silent=True) or {}
+            address = f"{request.remote_addr}:{int(data['port'])}"
+            tracker.announce(content_hash, address,
+                             [int(i) for i in data.get('chunks', [])],
+                             [int(i) for i in data.get('fetching', [])])
+            return jsonify({"success": True, "peers": tracker.peers(content_hash, exclude=address)})
+        except (KeyError, ValueError, TypeError):
+            return jsonify({"success": False, "error": "缺少分块服务器端口"}), 400
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+    
+    @app.route('/api/student/work', methods=['GET'])
+    def get_student_work():
+        try:
+            etag = listing_etag("student_work")
+            if request.if_none_match.contains(etag):
+                return not_modified(etag)
+            works, next_cursor = file_manager.list_student_work(
+                student_name=request.args.get('student'),
+                since=request.args.get('since'),
+                until=request.args.get('until'),
+                prefix=request.args.get('prefix'),
+                sort=request.args.get('sort', 'upload_time'),
+                order=request.args.get('order', 'desc'),
+                limit=request.args.get('limit', type=int),
+                after=request.args.get('after')
+            )
+            return json_with_etag({"success": True, "works": works, "next_cursor": next_cursor}, etag)
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+    
+    @app.route('/api/student/work', methods=['POST'])
+    def upload_student_work():
+        try:
+            if 'file' not in request.files:
+                return jsonify({"success": False, "error": "没有选择文件"}), 400
+            
+            file = request.files['file']
+            if file.filename == '':
+                return jsonify({"success": False, "error": "文件名不能为空"}), 400
+            
+            student_name = request.form.get('student_name', '')
+            if not student_name:
+                return jsonify({"success": False, "error": "学生姓名不能为空"}), 400
+            
+            description = request.form.get('description', '')
+            
+            # 保存文件
+            tmp_path = save_upload_to_tmp(file)
+            try:
+                result = file_manager.save_student_work(
+                    file_path=tmp_path,
+                    filename=file.filename,
+                    student_name=student_name,
+                    description=description,
+                    move=True
+                )
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            
+            return jsonify({"success": True, "work": result})
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+    
+    @app.route('/api/student/work/batch', methods=['POST'])
+    def upload_student_work_batch():
+        """一次请求上传多个作业（表单字段 files 可重复），全部在一个事务中登记"""
+        try:
+            files = [file for file in request.files.getlist('files') if file.filename]
+            if not files:
+                return jsonify({"success": False, "error": "没有选择文件"}), 400
+            
+            student_name = request.form.get('student_name', '')
+            if not student_name:
+                return jsonify({"success": False, "error": "学生姓名不能为空"}), 400
+            
+            tmp_paths = []
+            try:
+                for file in files:
+                    tmp_paths.append(save_upload_to_tmp(file))
+                works = file_manager.save_student_works(
+                    [(tmp_path, file.filename) for tmp_path, file in zip(tmp_paths, files)],
+                    student_name=student_name,
+                    description=request.form.get('description', ''),
+                    move=True
+                )
+            finally:
+                for tmp_path in tmp_paths:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+            
+            return jsonify({"success": True, "works": works})
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+    
+    @app.route('/api/student/work/uploads', methods=['POST'])
+    def create_upload_session():
+        """分块上传第一步：创建会话
+
+        请求中带有 sha256 且服务器已有相同内容时直接完成上传（秒传），
+        响应中是 work 而不是 upload。
+        """
+        try:
+            data = request.get_json(silent=True) or {}
+            filename = data.get('filename', '')
+            student_name = data.get('student_name', '')
+            if not filename:
+                return jsonify({"success": False, "error": "文件名不能为空"}), 400
+            if not student_name:
+                return jsonify({"success": False, "error": "学生姓名不能为空"}), 400
+            if 'file_size' not in data:
+                return jsonify({"success": False, "error": "缺少文件大小"}), 400
+            
+            # 服务器已有相同内容时直接登记，客户端不必再上传文件内容
+            if data.get('sha256'):
+                work = file_manager.save_student_work_by_hash(
+                    content_hash=data['sha256'],
+                    file_size=data['file_size'],
+                    filename=filename,
+                    student_name=student_name,
+                    description=data.get('description', '')
+                )
+                if work is not None:
+                    return jsonify({"success": True, "work": work})
+            
+            session = file_manager.create_upload_session(
+                filename=filename,
+                student_name=student_name,
+                file_size=data['file_size'],
+                description=data.get('description', ''),
+                chunk_size=data.get('chunk_size'),
+                content_hash=data.get('sha256')
+            )
+            return upload_session_response(session)
+        except (ValueError, TypeError) as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+    
+    @app.route('/api/student/work/uploads/<upload_id>', methods=['GET'])
+    def get_upload_session(upload_id):
+        """查询会话状态，客户端断线后据此续传缺少的分块"""
+        session = file_manager.get_upload_session(upload_id)
+        if session is None:
+            return jsonify({"success": False, "error": "上传会话不存在"}), 404
+        return upload_session_response(session)
+    
+    @app.route('/api/student/work/uploads/<upload_id>/chunks/<int:chunk_index>', methods=['PUT'])
+    def put_upload_chunk(upload_id, chunk_index):
+        """上传第 N 个分块（请求体为原始字节，直接写入对应偏移）"""
+        try:
+            session = file_manager.write_upload_chunk(upload_id, chunk_index, request.stream)
+            return jsonify({"success": True, "upload": session})
+        except KeyError:
+            return jsonify({"success": False, "error": "上传会话不存在"}), 404
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+    
+    @app.route('/api/student/work/uploads/<upload_id>/commit', methods=['POST'])
+    def commit_upload_session(upload_id):
+        """所有分块到齐后提交，登记为学生作业"""
+        try:
+            result = file_manager.commit_upload_session(upload_id)
+            return jsonify({"success": True, "work": result})
+        except KeyError:
+            return jsonify({"success": False, "error": "上传会话不存在"}), 404
+        except ValueError as e:
+            return jsonify({"success": False, "error": str(e)}), 409
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+    
+    @app.route('/api/student/work/archive', methods=['GET'])
+    def export_student_work():
+        """把全部（或按学生、提交时间过滤的）作业边打包边发送为 ZIP"""
+        try:
+            works = file_manager.get_student_work_files(
+                student_name=request.args.get('student_name'),
+                since=request.args.get('since'),
+                until=request.args.get('until')
+            )
+            if not works:
+                return jsonify({"success": False, "error": "没有符合条件的作业"}), 404
+            
+            response = app.response_class(
+                zip_export.iter_zip(zip_export.student_work_entries(works)),
+                mimetype="application/zip"
+            )
+            filename = f"student_work_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+            response.headers.set("Content-Disposition", "attachment", filename=filename)
+            response.headers["X-Work-Count"] = str(len(works))
+            return response
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+    
+    @app.route('/api/student/work/<work_id>', methods=['GET'])
+    def download_student_work(work_id):
+        try:
+            blob = file_manager.get_student_work_blob(work_id)
+            if not blob:
+                return jsonify({"success": False, "error": "文件不存在"}), 404
+            
+            return send_file_with_hash(blob)
+        except HTTPException:
+            raise
+        except Exception as e:
+            return jsonify({"success": False, "error": str(e)}), 500
+    
+    return app
+
+
+class WSGIServer:
+    """教师端内嵌的 WSGI 服务器
+
+    支持两种引擎，均在当前进程内运行同一个 Flask 应用：
+    - waitress：生产级多线程服务器，固定大小的工作线程池，支持 HTTP/1.1 keep-alive
+    - werkzeug：Flask 自带的开发服务器，每个请求一个线程，仅作为后备
+    默认优先使用 waitress，可通过环境变量 FILE_TRANSFER_SERVER 指定。
+
+    waitress 下文件下载默认零拷贝：平台提供 os.sendfile 时，文件响应由内核
+    直接从页缓存写入套接字（见 zero_copy_channel）；否则退回 waitress 自身的
+    逐块读写。
+    """
+    ENGINES = ("waitress", "werkzeug")
+    # 请求环境中的标记：服务器的 wsgi.file_wrapper 会按 Content-Length 截断文件，
+    # 应用可以直接返回定位好的文件来响应 Range 请求
+    SIZED_FILE_WRAPPER = "file_transfer.sized_file_wrapper"
+    # 单次 os.sendfile 调用最多发送的字节数，避免一个连接长时间占用事件循环
+    SENDFILE_CHUNK_SIZE = 4 * 1024 * 1024
+    # waitress 参数：工作线程数、监听队列长度、并发连接上限、空闲 keep-alive 连接的保留秒数
+    WAITRESS_OPTIONS = {
+        # 每个 SSE 推送连接长期占用一个线程，另外预留 16 个处理普通请求
+        "threads": 16 + EventHub.MAX_SUBSCRIBERS,
+        "backlog": 1024,
+        "connection_limit": 512,
+        "channel_timeout": 120,
+        "cleanup_interval": 30,
+        "asyncore_use_poll": True,
+        # 单个请求体上限（旧版整文件上传接口仍可能上传大文件）
+        "max_request_body_size": 16 * 1024 * 1024 * 1024,
+        "ident": "school-file-transfer",
+    }
+    
+    def __init__(self, app, host: str, port: int, engine: str = None, zero_copy: bool = True):
+        self.engine = engine or self.default_engine()
+        self.zero_copy = False
+        if self.engine == "waitress":
+            from waitress.server import create_server
+            self._server = create_server(
+                self.mark_sized_file_wrapper(app), host=host, port=port, **self.WAITRESS_OPTIONS
+            )
+            self.port = int(self._server.effective_port)
+            if zero_copy and hasattr(os, "sendfile"):
+                self._server.channel_class = self.zero_copy_channel()
+                self.zero_copy = True
+        elif self.engine == "werkzeug":
+            from werkzeug.serving import make_server
+            self._server = make_server(host, port, app, threaded=True)
+            self.port = self._server.server_port
+        else:
+            raise ValueError(f"未知的服务器引擎: {self.engine}")
+    
+    @classmethod
+    def default_engine(cls):
+        """环境变量指定的引擎；未指定时 waitress 可用则用 waitress"""
+        engine = os.environ.get("FILE_TRANSFER_SERVER")
+        if engine:
+            return engine
+        try:
+            import waitress  # noqa: F401
+            return "waitress"
+        except ImportError:
+            return "werkzeug"
+
+    @classmethod
+    def mark_sized_file_wrapper(cls, app):
+        """包装 WSGI 应用，在请求环境中标记 wsgi.file_wrapper 会按 Content-Length 截断"""
+        def wrapped(environ, start_response):
+            environ[cls.SIZED_FILE_WRAPPER] = True
+            return app(environ, start_response)
+        return wrapped
+
+    @classmethod
+    @functools.cache
+    def zero_copy_channel(cls):
+        """用 os.sendfile 发送文件响应的 waitress 连接类
+
+        waitress 把 wsgi.file_wrapper 返回的文件作为输出缓冲区排在响应头之后，
+        默认逐块 read() 到 Python 再 send()。这里对这类缓冲区改用 os.sendfile，
+        文件内容不再经过用户态；文件对象没有真实描述符、或内核拒绝（EINVAL 等）
+        时，该缓冲区退回 waitress 原来的读写方式。
+        """
+        import errno
+        import io
+        from waitress import wasyncore
+        from waitress.buffers import ReadOnlyFileBasedBuffer
+        from waitress.channel import HTTPChannel
+
+        unsupported = {errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSOCK, errno.ESPIPE}
+        chunk_size = cls.SENDFILE_CHUNK_SIZE
+
+        class ZeroCopyChannel(HTTPChannel):
+            def _sendfile_fd(self, outbuf):
+                """可以用 sendfile 发送时返回文件描述符，否则返回 None"""
+                if not isinstance(outbuf, ReadOnlyFileBasedBuffer):
+                    return None
+                if getattr(outbuf, "sendfile_disabled", False):
+                    return None
+                try:
+                    return outbuf.file.fileno()
+                except (AttributeError, OSError, io.UnsupportedOperation):
+                    outbuf.sendfile_disabled = True
+                    return None
+
+            def _sendfile(self, outbuf, file_fd, count, do_close):
+                """从文件当前位置发送最多 count 字节，返回实际发送的字节数"""
+                try:
+                    return os.sendfile(
+                        self.socket.fileno(), file_fd, outbuf.file.tell(), min(count, chunk_size)
+                    )
+                except BlockingIOError:
+                    return 0
+                except OSError as why:
+                    if why.errno in wasyncore._DISCONNECTED:
+                        if do_close:
+                            self.handle_close()
+                        return 0
+                    if why.errno in unsupported:
+                        outbuf.sendfile_disabled = True
+                        return None
+                    raise
+
+            def _flush_some(self, do_close=True):
+                # 与 HTTPChannel._flush_some 相同的循环，文件缓冲区改走 sendfile
+                sent = 0
+                dobreak = False
+
+                while True:
+                    outbuf = self.outbufs[0]
+                    outbuflen = outbuf.__len__()
+
+                    while outbuflen > 0:
+                        num_sent = None
+                        file_fd = self._sendfile_fd(outbuf)
+                        if file_fd is not None:
+                            num_sent = self._sendfile(outbuf, file_fd, outbuflen, do_close)
+                        if num_sent is None:
+                            chunk = outbuf.get(self.sendbuf_len)
+                            num_sent = self.send(chunk, do_close=do_close)
+
+                        if num_sent:
+                            outbuf.skip(num_sent, True)
+                            outbuflen -= num_sent
+                            sent += num_sent
+                            self.total_outbufs_len -= num_sent
+                        else:
+                            dobreak = True
+                            break
+                    else:
+                        if len(self.outbufs) > 1:
+                            toclose = self.outbufs.pop(0)
+                            try:
+                                toclose.close()
+                            except Exception:
+                                self.logger.exception("Unexpected error when closing an outbuf")
+                        else:
+                            dobreak = True
+
+                    if dobreak:
+                        break
+
+                if sent:
+                    self.last_activity = time.time()
+                    return True
+                return False
+
+        return ZeroCopyChannel
+
+    def serve_forever(self):
+        """处理请求，直到调用 shutdown()"""
+        if self.engine == "waitress":
+            self._server.run()
+            self._server.task_dispatcher.shutdown()
+        else:
+            self._server.serve_forever()
+    
+    def shutdown(self):
+        """停止服务器"""
+        if self.engine == "waitress":
+            from waitress import wasyncore
+            # 在事件循环线程中关闭所有套接字，事件循环随之退出
+            try:
+                self._server.trigger.pull_trigger(lambda: wasyncore.close_all(self._server._map))
+            except OSError:
+                # 其他线程同时唤醒了事件循环，关闭动作已先执行完，唤醒管道也已关闭
+                pass
+        else:
+            self._server.shutdown()
+
+
+def run_server_process(conn, events, base_dir: str, host: str, port: int):
+    """文件服务器子进程入口
+
+    子进程独占 FileManager 和 HTTP 服务器；主进程（GUI）通过 conn 发起
+    FileManager 方法调用，元数据变化等事件写入 events 队列。每个调用在线程池中
+    执行并带着请求编号返回，保存大文件时 GUI 的查询不必排队等待。
+    对局域网提供服务时同时广播教师端信标，学生端据此自动连接。
+    """
+    file_manager = FileManager(base_dir)
+    file_manager.listeners.append(events.put)
+    server = None
+    beacon = None
+    app = create_app(file_manager)
+    try:
+        server = WSGIServer(app, host, port)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        events.put({"type": "server_started", "engine": server.engine, "port": server.port})
+    except Exception as e:
+        # 端口被占用等情况下 HTTP 服务不可用，但仍继续为 GUI 提供文件管理
+        events.put({"type": "server_error", "error": str(e)})
+    
+    if server is not None and not host.startswith("127."):
+        try:
+            # 信标中的版本号供学生端判断老师文件列表是否有变化
+            beacon = TeacherBeacon(server.port, functools.partial(file_manager.get_version, "teacher_files"))
+            beacon.start()
+        except OSError as e:
+            # 发现端口被占用时学生端仍可手动输入地址
+            events.put({"type": "discovery_error", "error": str(e)})
+    
+    send_lock = threading.Lock()
+    
+    def handle(request_id, method, args, kwargs):
+        try:
+            reply = (request_id, "ok", getattr(file_manager, method)(*args, **kwargs))
+        except Exception as e:
+            reply = (request_id, "error", e)
+        with send_lock:
+            try:
+                conn.send(reply)
+            except (EOFError, OSError):
+                # 主进程已退出
+                pass
+            except Exception:
+                # 返回值或异常对象无法序列化时只传递错误信息
+                conn.send((request_id, "error", RuntimeError(str(reply[2]))))
+    
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=ServerProcess.RPC_WORKERS)
+    while True:
+        try:
+            request_id, method, args, kwargs = conn.recv()
+        except (EOFError, OSError):
+            # 主进程已退出
+            break
+        if method is None:
+            break
+        executor.submit(handle, request_id, method, args, kwargs)
+    executor.shutdown(wait=True)
+    
+    if beacon is not None:
+        beacon.stop()
+    # 先结束 SSE 长连接，工作线程才能退出
+    app.extensions["event_hub"].close()
+    if server is not None:
+        server.shutdown()
+        server_thread.join(timeout=5)
+    file_manager.close()
+
+
+class ServerProcess:
+    """在独立子进程中运行的文件服务器
+
+    HTTP 服务和 FileManager 的全部读写都在子进程中完成，与 Tk 主循环不再共用
+    GIL。GUI 像使用 FileManager 一样调用本对象的方法，调用通过管道转发给子进程；
+    子进程产生的事件（服务器启动、文件增删等）可从 events 队列中读取。
+    
+    调用可来自多个线程：每个调用带有请求编号，子进程并发执行，返回值由后台线程
+    按编号交给对应的调用者，一个耗时的调用（如保存大文件）不会阻塞其他调用。
+    """
+    # 子进程中同时执行调用的线程数
+    RPC_WORKERS = 8
+    # 允许 GUI 通过进程间通信调用的 FileManager 方法
+    RPC_METHODS = {
+        "get_teacher_files", "get_student_work", "list_teacher_files", "list_student_work",
+        "save_teacher_file", "save_student_work", "get_teacher_file_path", "get_student_work_path",
+        "delete_teacher_file", "delete_student_work", "get_version", "get_teacher_file_hash",
+        "get_storage_stats", "save_teacher_files", "save_student_works", "delete_teacher_files",
+        "delete_student_works",
+    }
+    
+    def __init__(self, base_dir: str = "data", host: str = "0.0.0.0", port: int = 5000):
+        # 统一使用 spawn，Linux 上的行为与 Windows 机房环境一致
+        context = multiprocessing.get_context("spawn")
+        self._conn, self._child_conn = context.Pipe()
+        self.events = context.Queue()
+        # 保护请求编号、等待返回的调用以及管道的发送端
+        self._lock = threading.Lock()
+        self._request_ids = itertools.count(1)
+        self._pending = {}
+        self._closed = False
+        self._process = context.Process(
+            target=run_server_process,
+            args=(self._child_conn, self.events, base_dir, host, port),
+            daemon=True
+        )
+    
+    def start(self):
+        """启动子进程及接收返回值的线程"""
+        self._process.start()
+        # 关闭本进程中的子进程端，子进程退出时接收线程才能读到 EOF
+        self._child_conn.close()
+        threading.Thread(target=self._receive_replies, daemon=True).start()
+    
+    def _receive_replies(self):
+        """接收子进程的返回值，按请求编号交给对应的调用"""
+        while True:
+            try:
+                request_id, status, value = self._conn.recv()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                future = self._pending.pop(request_id, None)
+            if future is None:
+                continue
+            if status == "error":
+                future.set_exception(value)
+            else:
+                future.set_result(value)
+        
+        # 子进程已退出：尚未返回的调用全部失败
+        with self._lock:
+            self._closed = True
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.set_exception(RuntimeError("服务器进程已退出"))
+    
+    def call(self, method: str, *args, **kwargs):
+        """在子进程中调用 FileManager 的方法并返回结果（可在任意线程中调用）"""
+        if method not in self.RPC_METHODS:
+            raise AttributeError(method)
+        future = concurrent.futures.Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("服务器进程已退出")
+            request_id = next(self._request_ids)
+            self._pending[request_id] = future
+            try:
+                self._conn.send((request_id, method, args, kwargs))
+            except BaseException:
+                del self._pending[request_id]
+                raise
+        return future.result()
+    
+    def __getattr__(self, name):
+        if name in self.RPC_METHODS:
+            return functools.partial(self.call, name)
+        raise AttributeError(name)
+    
+    def stop(self, timeout: float = 5):
+        """通知子进程退出并等待其结束"""
+        if self._process.is_alive():
+            with self._lock:
+                self._conn.send((None, None, (), {}))
+            self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
 
 
 class TeacherApp:
+    # 学生作业列表每次加载的条数
+    STUDENT_WORK_PAGE_SIZE = 100
+    # 检查服务器子进程事件的间隔（毫秒）
+    SERVER_EVENT_POLL_INTERVAL = 200
+    # 文件增删后延迟多久刷新存储统计（毫秒），期间的多批事件只刷新一次
+    STORAGE_STATS_DELAY = 2000
+    
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("教师端 - 文件传输系统")
         self.root.geometry("900x700")
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         
-        # 初始化文件管理器
-        self.file_manager = FileManager()
+        # 后台线程通过该队列更新界面（Tk 只能在主线程中操作）
+        self.ui = UiDispatcher(self.root)
         
-        # 服务器相关
-        self.server = None
-        self.server_thread = None
+        # 服务器相关：HTTP 服务与文件管理运行在子进程中，
+        # self.file_manager 是转发到子进程的代理，用法与 FileManager 相同
         self.server_running = False
         self.server_port = 5000
+        self.file_manager = ServerProcess(port=self.server_port)
+        
+        # 学生作业列表分页状态（滚动到底部时再加载下一页）
+        self.student_work_cursor = None
+        self.student_work_loading = False
+        
+        # 存储统计的刷新状态：已安排的延迟刷新、后台获取中、获取期间又有变化
+        self.storage_stats_after_id = None
+        self.storage_stats_loading = False
+        self.storage_stats_stale = False
         
         # 创建界面
         self.create_widgets()
@@ -239,6 +2051,11 @@ class TeacherApp:
         status_label = ttk.Label(server_frame, textvariable=self.server_status_var, font=("Arial", 12))
         status_label.pack(side=tk.LEFT)
         
+        # 去重存储统计
+        self.storage_var = tk.StringVar()
+        storage_label = ttk.Label(server_frame, textvariable=self.storage_var, font=("Arial", 10))
+        storage_label.pack(side=tk.LEFT, padx=(20, 0))
+        
         # 获取本机IP
         self.local_ip = self.get_local_ip()
         ip_label = ttk.Label(server_frame, text=f"学生端连接地址: http://{self.local_ip}:{self.server_port}", 
@@ -259,7 +2076,8 @@ class TeacherApp:
         refresh_btn.grid(row=0, column=1, padx=(0, 10))
         
         # 老师文件列表
-        self.teacher_tree = ttk.Treeview(teacher_frame, columns=("size", "time"), show="tree headings")
+        self.teacher_tree = ttk.Treeview(teacher_frame, columns=("size", "time"), show="tree headings",
+                                         selectmode="extended")
         self.teacher_tree.heading("#0", text="文件名")
         self.teacher_tree.heading("size", text="大小")
         self.teacher_tree.heading("time", text="上传时间")
@@ -267,9 +2085,9 @@ class TeacherApp:
         self.teacher_tree.column("size", width=100)
         self.teacher_tree.column("time", width=150)
         
-        # 滚动条
-        teacher_scrollbar = ttk.Scrollbar(teacher_frame, orient="vertical", command=self.teacher_tree.yview)
-        self.teacher_tree.configure(yscrollcommand=teacher_scrollbar.set)
+        # 滚动条（列表只为可见行创建项目，滚动由 VirtualTreeview 处理）
+        teacher_scrollbar = ttk.Scrollbar(teacher_frame, orient="vertical")
+        self.teacher_view = VirtualTreeview(self.teacher_tree, teacher_scrollbar)
         
         self.teacher_tree.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
         teacher_scrollbar.grid(row=1, column=2, sticky=(tk.N, tk.S), pady=(10, 0))
@@ -282,7 +2100,10 @@ class TeacherApp:
         download_teacher_btn.pack(side=tk.LEFT, padx=(0, 10))
         
         delete_teacher_btn = ttk.Button(teacher_btn_frame, text="删除", command=self.delete_teacher_file)
-        delete_teacher_btn.pack(side=tk.LEFT)
+        delete_teacher_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        broadcast_btn = ttk.Button(teacher_btn_frame, text="推送给全班", command=self.broadcast_teacher_file)
+        broadcast_btn.pack(side=tk.LEFT)
         
         # 学生作业管理区域
         student_frame = ttk.LabelFrame(main_frame, text="学生作业", padding="10")
@@ -294,7 +2115,8 @@ class TeacherApp:
         refresh_student_btn.grid(row=0, column=0, padx=(0, 10))
         
         # 学生作业列表
-        self.student_tree = ttk.Treeview(student_frame, columns=("student", "size", "time"), show="tree headings")
+        self.student_tree = ttk.Treeview(student_frame, columns=("student", "size", "time"), show="tree headings",
+                                         selectmode="extended")
         self.student_tree.heading("#0", text="文件名")
         self.student_tree.heading("student", text="学生姓名")
         self.student_tree.heading("size", text="大小")
@@ -304,9 +2126,10 @@ class TeacherApp:
         self.student_tree.column("size", width=80)
         self.student_tree.column("time", width=150)
         
-        # 滚动条
-        student_scrollbar = ttk.Scrollbar(student_frame, orient="vertical", command=self.student_tree.yview)
-        self.student_tree.configure(yscrollcommand=student_scrollbar.set)
+        # 滚动条（滚动到已加载部分的末尾时加载下一页）
+        student_scrollbar = ttk.Scrollbar(student_frame, orient="vertical")
+        self.student_view = VirtualTreeview(self.student_tree, student_scrollbar,
+                                            on_reach_end=self._on_student_work_end)
         
         self.student_tree.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
         student_scrollbar.grid(row=1, column=2, sticky=(tk.N, tk.S), pady=(10, 0))
@@ -319,7 +2142,10 @@ class TeacherApp:
         download_student_btn.pack(side=tk.LEFT, padx=(0, 10))
         
         delete_student_btn = ttk.Button(student_btn_frame, text="删除作业", command=self.delete_student_work)
-        delete_student_btn.pack(side=tk.LEFT)
+        delete_student_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        export_student_btn = ttk.Button(student_btn_frame, text="打包导出", command=self.export_student_work)
+        export_student_btn.pack(side=tk.LEFT)
         
         # 状态栏
         self.status_var = tk.StringVar()
@@ -340,174 +2166,160 @@ class TeacherApp:
             return "127.0.0.1"
     
     def start_server(self):
-        """启动Flask服务器"""
-        def run_server():
-            app = Flask(__name__)
-            CORS(app)
-            
-            @app.route('/api/health', methods=['GET'])
-            def health_check():
-                return jsonify({"status": "ok", "message": "教师端服务器运行正常"})
-            
-            @app.route('/api/teacher/files', methods=['GET'])
-            def get_teacher_files():
-                try:
-                    files = self.file_manager.get_teacher_files()
-                    return jsonify({"success": True, "files": files})
-                except Exception as e:
-                    return jsonify({"success": False, "error": str(e)}), 500
-            
-            @app.route('/api/teacher/files', methods=['POST'])
-            def upload_teacher_file():
-                try:
-                    if 'file' not in request.files:
-                        return jsonify({"success": False, "error": "没有选择文件"}), 400
-                    
-                    file = request.files['file']
-                    if file.filename == '':
-                        return jsonify({"success": False, "error": "文件名不能为空"}), 400
-                    
-                    description = request.form.get('description', '')
-                    
-                    # 保存文件
-                    result = self.file_manager.save_teacher_file(
-                        file_path=file.filename,
-                        filename=file.filename,
-                        description=description
-                    )
-                    
-                    # 实际保存文件
-                    file_path = os.path.join(self.file_manager.teacher_files_dir, result['saved_name'])
-                    file.save(file_path)
-                    
-                    return jsonify({"success": True, "file": result})
-                except Exception as e:
-                    return jsonify({"success": False, "error": str(e)}), 500
-            
-            @app.route('/api/teacher/files/<file_id>', methods=['GET'])
-            def download_teacher_file(file_id):
-                try:
-                    file_path = self.file_manager.get_teacher_file_path(file_id)
-                    if not file_path:
-                        return jsonify({"success": False, "error": "文件不存在"}), 404
-                    
-                    return send_file(file_path, as_attachment=True)
-                except Exception as e:
-                    return jsonify({"success": False, "error": str(e)}), 500
-            
-            @app.route('/api/student/work', methods=['GET'])
-            def get_student_work():
-                try:
-                    works = self.file_manager.get_student_work()
-                    return jsonify({"success": True, "works": works})
-                except Exception as e:
-                    return jsonify({"success": False, "error": str(e)}), 500
-            
-            @app.route('/api/student/work', methods=['POST'])
-            def upload_student_work():
-                try:
-                    if 'file' not in request.files:
-                        return jsonify({"success": False, "error": "没有选择文件"}), 400
-                    
-                    file = request.files['file']
-                    if file.filename == '':
-                        return jsonify({"success": False, "error": "文件名不能为空"}), 400
-                    
-                    student_name = request.form.get('student_name', '')
-                    if not student_name:
-                        return jsonify({"success": False, "error": "学生姓名不能为空"}), 400
-                    
-                    description = request.form.get('description', '')
-                    
-                    # 保存文件
-                    result = self.file_manager.save_student_work(
-                        file_path=file.filename,
-                        filename=file.filename,
-                        student_name=student_name,
-                        description=description
-                    )
-                    
-                    # 实际保存文件
-                    student_dir = self.file_manager.student_work_dir / student_name
-                    student_dir.mkdir(exist_ok=True)
-                    file_path = os.path.join(student_dir, result['saved_name'])
-                    file.save(file_path)
-                    
-                    return jsonify({"success": True, "work": result})
-                except Exception as e:
-                    return jsonify({"success": False, "error": str(e)}), 500
-            
-            @app.route('/api/student/work/<work_id>', methods=['GET'])
-            def download_student_work(work_id):
-                try:
-                    file_path = self.file_manager.get_student_work_path(work_id)
-                    if not file_path:
-                        return jsonify({"success": False, "error": "文件不存在"}), 404
-                    
-                    return send_file(file_path, as_attachment=True)
-                except Exception as e:
-                    return jsonify({"success": False, "error": str(e)}), 500
-            
+        """启动文件服务器子进程"""
+        self.file_manager.start()
+        self.root.after(self.SERVER_EVENT_POLL_INTERVAL, self.poll_server_events)
+    
+    def poll_server_events(self):
+        """处理服务器子进程发来的事件（在 Tk 主线程中定时执行）
+
+        文件的增删事件带有记录内容，直接增删列表中对应的行，不重新加载整个列表。
+        """
+        changed = False
+        while True:
             try:
+                event = self.file_manager.events.get_nowait()
+            except queue.Empty:
+                break
+            
+            if event["type"] == "server_started":
                 self.server_running = True
-                self.server_status_var.set(f"服务器运行中 - http://{self.local_ip}:{self.server_port}")
-                app.run(host='0.0.0.0', port=self.server_port, debug=False, use_reloader=False)
-            except Exception as e:
+                self.server_port = event['port']
+                self.server_status_var.set(
+                    f"服务器运行中 ({event['engine']}) - http://{self.local_ip}:{event['port']}")
+            elif event["type"] == "server_error":
                 self.server_running = False
-                self.server_status_var.set(f"服务器启动失败: {str(e)}")
-        
-        self.server_thread = threading.Thread(target=run_server, daemon=True)
-        self.server_thread.start()
+                self.server_status_var.set(f"服务器启动失败: {event['error']}")
+            elif event["type"] == "discovery_error":
+                self.status_var.set(f"学生端无法自动发现本机，请告知学生连接地址: {event['error']}")
+            elif event["type"] == "teacher_file_added":
+                # 新文件的上传时间最新，排在列表最前
+                self.teacher_view.insert(0, *self.teacher_file_row(event["file"]))
+                changed = True
+            elif event["type"] == "teacher_file_deleted":
+                self.teacher_view.remove(event["file_id"])
+                changed = True
+            elif event["type"] == "student_work_added":
+                self.student_view.insert(0, *self.student_work_row(event["work"]))
+                changed = True
+            elif event["type"] == "student_work_deleted":
+                self.student_view.remove(event["work_id"])
+                changed = True
+        
+        if changed:
+            self.schedule_storage_stats()
+        self.root.after(self.SERVER_EVENT_POLL_INTERVAL, self.poll_server_events)
+    
+    def on_close(self):
+        """关闭窗口时先停止服务器子进程"""
+        if self.storage_stats_after_id is not None:
+            self.root.after_cancel(self.storage_stats_after_id)
+        self.file_manager.stop()
+        self.ui.close()
+        self.root.destroy()
     
     def refresh_data(self):
         """刷新所有数据"""
         self.refresh_teacher_files()
         self.refresh_student_work()
+        self.refresh_storage_stats()
     
-    def refresh_teacher_files(self):
-        """刷新老师文件列表"""
-        files = self.file_manager.get_teacher_files()
+    def schedule_storage_stats(self):
+        """文件增删后稍后刷新存储统计；连续收到的多批事件合并为一次刷新"""
+        if self.storage_stats_after_id is None:
+            self.storage_stats_after_id = self.root.after(
+                self.STORAGE_STATS_DELAY, self.refresh_storage_stats)
+    
+    def refresh_storage_stats(self):
+        """在后台线程中获取去重存储统计，服务器子进程忙于接收上传时不阻塞界面"""
+        if self.storage_stats_after_id is not None:
+            self.root.after_cancel(self.storage_stats_after_id)
+            self.storage_stats_after_id = None
+        if self.storage_stats_loading:
+            # 正在获取，结束后再获取一次
+            self.storage_stats_stale = True
+            return
+        self.storage_stats_loading = True
         
-        # 清空现有项目
-        for item in self.teacher_tree.get_children():
-            self.teacher_tree.delete(item)
+        def load():
+            try:
+                stats = self.file_manager.get_storage_stats()
+            except Exception:
+                # 服务器子进程已停止等，保留上次的统计
+                stats = None
+            self.ui.post(self.show_storage_stats, stats)
         
-        # 添加文件到列表
-        for file_info in files:
-            file_size = self.format_file_size(file_info.get('file_size', 0))
-            upload_time = file_info.get('upload_time', '')[:19].replace('T', ' ')
-            
-            self.teacher_tree.insert("", "end", 
-                text=file_info.get('filename', ''),
-                values=(file_size, upload_time),
-                tags=(file_info.get('file_id', ''),))
+        threading.Thread(target=load, daemon=True).start()
+    
+    def show_storage_stats(self, stats):
+        """显示后台获取的存储统计（在主线程中执行）"""
+        self.storage_stats_loading = False
+        if stats is not None:
+            self.storage_var.set(
+                f"存储占用 {self.format_file_size(stats['stored_bytes'])}"
+                f"（去重节省 {self.format_file_size(stats['saved_bytes'])}，"
+                f"命中率 {stats['hit_rate']:.0%}）")
+        if self.storage_stats_stale:
+            self.storage_stats_stale = False
+            self.refresh_storage_stats()
+    
+    def teacher_file_row(self, file_info):
+        """老师文件列表中的一行：(文件ID, 文件名, (大小, 上传时间))"""
+        file_size = self.format_file_size(file_info.get('file_size', 0))
+        upload_time = file_info.get('upload_time', '')[:19].replace('T', ' ')
+        return str(file_info.get('file_id', '')), file_info.get('filename', ''), (file_size, upload_time)
+    
+    def student_work_row(self, work_info):
+        """学生作业列表中的一行：(作业ID, 文件名, (学生姓名, 大小, 提交时间))"""
+        file_size = self.format_file_size(work_info.get('file_size', 0))
+        upload_time = work_info.get('upload_time', '')[:19].replace('T', ' ')
+        return (str(work_info.get('work_id', '')), work_info.get('filename', ''),
+                (work_info.get('student_name', ''), file_size, upload_time))
+    
+    def refresh_teacher_files(self):
+        """刷新老师文件列表（只修改有变化的行，保持选中行和滚动位置）"""
+        files = self.file_manager.get_teacher_files()
+        self.teacher_view.set_rows([self.teacher_file_row(file_info) for file_info in files])
     
     def refresh_student_work(self):
-        """刷新学生作业列表"""
-        works = self.file_manager.get_student_work()
-        
-        # 清空现有项目
-        for item in self.student_tree.get_children():
-            self.student_tree.delete(item)
-        
-        # 添加作业到列表
-        for work_info in works:
-            file_size = self.format_file_size(work_info.get('file_size', 0))
-            upload_time = work_info.get('upload_time', '')[:19].replace('T', ' ')
-            
-            self.student_tree.insert("", "end",
-                text=work_info.get('filename', ''),
-                values=(work_info.get('student_name', ''), file_size, upload_time),
-                tags=(work_info.get('work_id', ''),))
+        """重新加载已加载的学生作业（至少一页），只修改有变化的行，保持选中行和滚动位置"""
+        wanted = max(len(self.student_view), self.STUDENT_WORK_PAGE_SIZE)
+        works, cursor = [], None
+        while len(works) < wanted:
+            page, cursor = self.file_manager.list_student_work(
+                limit=min(wanted - len(works), FileManager.MAX_PAGE_SIZE), after=cursor)
+            works.extend(page)
+            if not cursor:
+                break
+        self.student_work_cursor = cursor
+        self.student_view.set_rows([self.student_work_row(work_info) for work_info in works])
+    
+    def _on_student_work_end(self):
+        """作业列表滚动到已加载部分的末尾：加载下一页"""
+        if self.student_work_cursor and not self.student_work_loading:
+            self.student_work_loading = True
+            self.root.after_idle(self.load_more_student_work)
+    
+    def load_more_student_work(self):
+        """加载下一页学生作业并追加到列表"""
+        try:
+            if not self.student_work_cursor:
+                return
+            works, self.student_work_cursor = self.file_manager.list_student_work(
+                limit=self.STUDENT_WORK_PAGE_SIZE, after=self.student_work_cursor)
+        finally:
+            self.student_work_loading = False
+        
+        self.student_view.append_rows([self.student_work_row(work_info) for work_info in works])
     
     def upload_file(self):
-        """上传文件"""
-        file_path = filedialog.askopenfilename(
+        """上传文件（可多选，一次登记）"""
+        file_paths = filedialog.askopenfilenames(
             title="选择要上传的文件",
             filetypes=[("所有文件", "*.*")]
         )
         
-        if not file_path:
+        if not file_paths:
             return
         
         # 获取文件描述
@@ -516,26 +2328,102 @@ class TeacherApp:
             return
         
         def upload():
-            self.status_var.set("正在上传文件...")
+            self.ui.set(self.status_var, "正在上传文件...")
             try:
-                result = self.file_manager.save_teacher_file(file_path, os.path.basename(file_path), description or "")
-                messagebox.showinfo("成功", "文件上传成功！")
-                self.refresh_teacher_files()
+                files = [(path, os.path.basename(path)) for path in file_paths]
+                self.file_manager.save_teacher_files(files, description or "")
+                self.ui.post(messagebox.showinfo, "成功", f"{len(files)} 个文件上传成功！")
             except Exception as e:
-                messagebox.showerror("错误", f"上传失败：{str(e)}")
+                self.ui.post(messagebox.showerror, "错误", f"上传失败：{str(e)}")
             
-            self.status_var.set("就绪")
+            self.ui.set(self.status_var, "就绪")
         
         threading.Thread(target=upload, daemon=True).start()
     
+    @staticmethod
+    def selected_records(view):
+        """列表中选中的所有行：[(记录ID, 行信息)]"""
+        records = []
+        for selected in view.selection():
+            item = view.item(selected)
+            if item['tags']:
+                records.append((str(item['tags'][0]), item))
+        return records
+    
+    @staticmethod
+    def unique_path(directory, filename):
+        """目录中不重名的保存路径，重名时加序号"""
+        stem, ext = os.path.splitext(filename)
+        path = os.path.join(directory, filename)
+        number = 1
+        while os.path.exists(path):
+            number += 1
+            path = os.path.join(directory, f"{stem} ({number}){ext}")
+        return path
+    
+    def save_records(self, records, get_path, title):
+        """下载选中的记录：records 为 [(记录ID, 建议文件名)]
+
+        只选中一条时选择保存位置，多条时选择目录并全部保存到该目录。
+        """
+        if len(records) == 1:
+            save_paths = [filedialog.asksaveasfilename(
+                title="选择保存位置",
+                initialfile=records[0][1],
+                filetypes=[("所有文件", "*.*")]
+            )]
+            if not save_paths[0]:
+                return
+        else:
+            directory = filedialog.askdirectory(title=f"选择保存 {len(records)} 个{title}的目录")
+            if not directory:
+                return
+            save_paths = [None] * len(records)
+        
+        def download():
+            import shutil
+            self.ui.set(self.status_var, f"正在下载{title}...")
+            saved, missing = 0, []
+            try:
+                for (record_id, filename), save_path in zip(records, save_paths):
+                    file_path = get_path(record_id)
+                    if not file_path:
+                        missing.append(filename)
+                        continue
+                    shutil.copy2(file_path, save_path or self.unique_path(directory, filename))
+                    saved += 1
+                if missing:
+                    self.ui.post(messagebox.showerror, "错误", f"以下{title}不存在：\n" + "\n".join(missing))
+                if saved:
+                    self.ui.post(messagebox.showinfo, "成功", f"{saved} 个{title}下载成功！")
+            except Exception as e:
+                self.ui.post(messagebox.showerror, "错误", f"下载失败：{str(e)}")
+            
+            self.ui.set(self.status_var, "就绪")
+        
+        threading.Thread(target=download, daemon=True).start()
+    
     def download_teacher_file(self):
-        """下载老师文件"""
-        selection = self.teacher_tree.selection()
-        if not selection:
+        """下载老师文件（可多选）"""
+        records = self.selected_records(self.teacher_view)
+        if not records:
             messagebox.showwarning("警告", "请先选择要下载的文件")
             return
         
-        item = self.teacher_tree.item(selection[0])
+        self.save_records([(file_id, item['text']) for file_id, item in records],
+                          self.file_manager.get_teacher_file_path, "文件")
+    
+    def broadcast_teacher_file(self):
+        """通过局域网组播把选中的文件一次推送给全班学生"""
+        selection = self.teacher_view.selection()
+        if not selection:
+            messagebox.showwarning("警告", "请先选择要推送的文件")
+            return
+        if not self.server_running:
+            messagebox.showwarning("警告", "服务器未运行，学生端无法补齐丢失的数据")
+            return
+        
+        item = self.teacher_view.item(selection[0])
         file_id = item['tags'][0] if item['tags'] else None
         filename = item['text']
         
@@ -543,124 +2431,169 @@ class TeacherApp:
             messagebox.showerror("错误", "无法获取文件ID")
             return
         
-        # 选择保存位置
-        save_path = filedialog.asksaveasfilename(
-            title="选择保存位置",
-            initialvalue=filename,
-            filetypes=[("所有文件", "*.*")]
-        )
-        
-        if not save_path:
-            return
+        def on_progress(sent, total):
+            self.ui.set(self.status_var, f"正在推送 {filename}: {sent * 100 // max(total, 1)}%")
         
-        def download():
-            self.status_var.set("正在下载文件...")
+        def broadcast():
+            sender = None
             try:
                 file_path = self.file_manager.get_teacher_file_path(file_id)
-                if file_path:
-                    import shutil
-                    shutil.copy2(file_path, save_path)
-                    messagebox.showinfo("成功", "文件下载成功！")
-                else:
-                    messagebox.showerror("错误", "文件不存在")
+                if not file_path:
+                    self.ui.post(messagebox.showerror, "错误", "文件不存在")
+                    return
+                content_hash = self.file_manager.get_teacher_file_hash(file_id)
+                sender = BroadcastSender(interface=self.local_ip)
+                sender.send_file(file_path, file_id, content_hash, filename,
+                                 self.server_port, on_progress=on_progress)
+                self.ui.set(self.status_var, f"已推送给全班: {filename}")
             except Exception as e:
-                messagebox.showerror("错误", f"下载失败：{str(e)}")
-            
-            self.status_var.set("就绪")
+                self.ui.post(messagebox.showerror, "错误", f"推送失败：{str(e)}")
+                self.ui.set(self.status_var, "就绪")
+            finally:
+                if sender is not None:
+                    sender.close()
         
-        threading.Thread(target=download, daemon=True).start()
+        threading.Thread(target=broadcast, daemon=True).start()
     
     def delete_teacher_file(self):
-        """删除老师文件"""
-        selection = self.teacher_tree.selection()
-        if not selection:
+        """删除老师文件（可多选，一次提交）"""
+        records = self.selected_records(self.teacher_view)
+        if not records:
             messagebox.showwarning("警告", "请先选择要删除的文件")
             return
         
-        item = self.teacher_tree.item(selection[0])
-        filename = item['text']
-        file_id = item['tags'][0] if item['tags'] else None
-        
-        if not file_id:
-            messagebox.showerror("错误", "无法获取文件ID")
-            return
-        
-        if messagebox.askyesno("确认删除", f"确定要删除文件 '{filename}' 吗？"):
+        if len(records) == 1:
+            prompt = f"确定要删除文件 '{records[0][1]['text']}' 吗？"
+        else:
+            prompt = f"确定要删除选中的 {len(records)} 个文件吗？"
+        if messagebox.askyesno("确认删除", prompt):
             try:
-                success = self.file_manager.delete_teacher_file(file_id)
-                if success:
-                    messagebox.showinfo("成功", "文件删除成功！")
-                    self.refresh_teacher_files()
+                deleted = self.file_manager.delete_teacher_files([file_id for file_id, _ in records])
+                if deleted:
+                    messagebox.showinfo("成功", f"{len(deleted)} 个文件删除成功！")
                 else:
                     messagebox.showerror("错误", "删除失败")
             except Exception as e:
                 messagebox.showerror("错误", f"删除失败：{str(e)}")
     
     def download_student_work(self):
-        """下载学生作业"""
-        selection = self.student_tree.selection()
-        if not selection:
+        """下载学生作业（可多选）"""
+        records = self.selected_records(self.student_view)
+        if not records:
             messagebox.showwarning("警告", "请先选择要下载的作业")
             return
         
-        item = self.student_tree.item(selection[0])
-        work_id = item['tags'][0] if item['tags'] else None
-        filename = item['text']
-        student_name = item['values'][0]
+        self.save_records([(work_id, f"{item['values'][0]}_{item['text']}") for work_id, item in records],
+                          self.file_manager.get_student_work_path, "作业")
+    
+    def ask_export_filter(self):
+        """打包导出的过滤条件对话框，取消时返回 None"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("打包导出作业")
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+        
+        fields = [("student_name", "学生姓名（留空为全部）"),
+                  ("since", "起始日期（YYYY-MM-DD，可留空）"),
+                  ("until", "截止日期（YYYY-MM-DD，含当天，可留空）")]
+        variables = {}
+        for row, (key, label) in enumerate(fields):
+            ttk.Label(dialog, text=label).grid(row=row, column=0, sticky=tk.W, padx=10, pady=5)
+            variables[key] = tk.StringVar()
+            ttk.Entry(dialog, textvariable=variables[key], width=20).grid(row=row, column=1, padx=10, pady=5)
+        
+        result = {}
+        
+        def confirm():
+            values = {key: var.get().strip() for key, var in variables.items()}
+            try:
+                for key in ("since", "until"):
+                    if values[key]:
+                        day = datetime.strptime(values[key], "%Y-%m-%d")
+                        # 截止日期包含当天：取次日零点作为开区间上界
+                        values[key] = (day + timedelta(days=1 if key == "until" else 0)).isoformat()
+            except ValueError:
+                messagebox.showerror("错误", "日期格式应为 YYYY-MM-DD", parent=dialog)
+                return
+            result.update({key: value for key, value in values.items() if value})
+            result["confirmed"] = True
+            dialog.destroy()
+        
+        btn_frame = ttk.Frame(dialog)
+        btn_frame.grid(row=len(fields), column=0, columnspan=2, pady=10)
+        ttk.Button(btn_frame, text="导出", command=confirm).pack(side=tk.LEFT, padx=(0, 10))
+        ttk.Button(btn_frame, text="取消", command=dialog.destroy).pack(side=tk.LEFT)
+        
+        dialog.grab_set()
+        self.root.wait_window(dialog)
+        if not result.pop("confirmed", False):
+            return None
+        return result
+    
+    def export_student_work(self):
+        """把全部（或过滤后的）学生作业打包为一个 ZIP 保存到磁盘"""
+        if not self.server_running:
+            messagebox.showwarning("警告", "服务器尚未启动")
+            return
         
-        if not work_id:
-            messagebox.showerror("错误", "无法获取作业ID")
+        params = self.ask_export_filter()
+        if params is None:
             return
         
-        # 选择保存位置
         save_path = filedialog.asksaveasfilename(
             title="选择保存位置",
-            initialvalue=f"{student_name}_{filename}",
-            filetypes=[("所有文件", "*.*")]
+            initialfile=f"学生作业_{datetime.now().strftime('%Y%m%d')}.zip",
+            defaultextension=".zip",
+            filetypes=[("ZIP 压缩包", "*.zip")]
         )
-        
         if not save_path:
             return
         
-        def download():
-            self.status_var.set("正在下载作业...")
+        def export():
+            # 通过本机的 HTTP 接口流式获取，边打包边写入磁盘，不占用与服务器进程的调用通道
+            url = f"http://127.0.0.1:{self.server_port}/api/student/work/archive"
+            part_path = save_path + ".part"
             try:
-                file_path = self.file_manager.get_student_work_path(work_id)
-                if file_path:
-                    import shutil
-                    shutil.copy2(file_path, save_path)
-                    messagebox.showinfo("成功", "作业下载成功！")
-                else:
-                    messagebox.showerror("错误", "作业不存在")
+                with requests.get(url, params=params, stream=True, timeout=(5, 60)) as response:
+                    if response.status_code != 200:
+                        self.ui.post(messagebox.showerror, "错误", response.json().get("error", "导出失败"))
+                        return
+                    count = response.headers.get("X-Work-Count", "?")
+                    written = 0
+                    with open(part_path, "wb") as f:
+                        for chunk in response.iter_content(1024 * 1024):
+                            f.write(chunk)
+                            written += len(chunk)
+                            self.ui.set(self.status_var,
+                                f"正在导出 {count} 份作业... {self.format_file_size(written)}")
+                os.replace(part_path, save_path)
+                self.ui.post(messagebox.showinfo, "成功", f"已导出 {count} 份作业到\n{save_path}")
             except Exception as e:
-                messagebox.showerror("错误", f"下载失败：{str(e)}")
-            
-            self.status_var.set("就绪")
+                self.ui.post(messagebox.showerror, "错误", f"导出失败：{str(e)}")
+            finally:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                self.ui.set(self.status_var, "就绪")
         
-        threading.Thread(target=download, daemon=True).start()
+        threading.Thread(target=export, daemon=True).start()
     
     def delete_student_work(self):
-        """删除学生作业"""
-        selection = self.student_tree.selection()
-        if not selection:
+        """删除学生作业（可多选，一次提交）"""
+        records = self.selected_records(self.student_view)
+        if not records:
             messagebox.showwarning("警告", "请先选择要删除的作业")
             return
         
-        item = self.student_tree.item(selection[0])
-        filename = item['text']
-        student_name = item['values'][0]
-        work_id = item['tags'][0] if item['tags'] else None
-        
-        if not work_id:
-            messagebox.showerror("错误", "无法获取作业ID")
-            return
-        
-        if messagebox.askyesno("确认删除", f"确定要删除 {student_name} 的作业 '{filename}' 吗？"):
+        if len(records) == 1:
+            item = records[0][1]
+            prompt = f"确定要删除 {item['values'][0]} 的作业 '{item['text']}' 吗？"
+        else:
+            prompt = f"确定要删除选中的 {len(records)} 份作业吗？"
+        if messagebox.askyesno("确认删除", prompt):
             try:
-                success = self.file_manager.delete_student_work(work_id)
-                if success:
-                    messagebox.showinfo("成功", "作业删除成功！")
-                    self.refresh_student_work()
+                deleted = self.file_manager.delete_student_works([work_id for work_id, _ in records])
+                if deleted:
+                    messagebox.showinfo("成功", f"{len(deleted)} 份作业删除成功！")
                 else:
                     messagebox.showerror("错误", "删除失败")
             except Exception as e:
@@ -686,5 +2619,7 @@ class TeacherApp:
 
 if __name__ == "__main__":
     import tkinter.simpledialog
+    # 打包为 exe 后启动服务器子进程所必需
+    multiprocessing.freeze_support()
     app = TeacherApp()
     app.run()
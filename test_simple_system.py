@@ -49,6 +49,1266 @@ def test_teacher_app():
         return False
 
 
+def test_metadata_store():
+    """测试 SQLite 元数据存储及旧版 metadata.json 迁移"""
+    print("🧪 测试元数据存储...")
+    
+    import json
+    import shutil
+    try:
+        from teacher_app import FileManager
+        
+        test_file = "test_store.txt"
+        with open(test_file, "w", encoding="utf-8") as f:
+            f.write("存储测试")
+        
+        # 构造旧版本的 metadata.json
+        os.makedirs("test_data_store", exist_ok=True)
+        legacy = {
+            "teacher_files": {},
+            "student_work": {
+                "1": {
+                    "original_name": "old.txt",
+                    "saved_name": "20240101_000000_old.txt",
+                    "student_name": "李四",
+                    "description": "",
+                    "upload_time": "2024-01-01T00:00:00",
+                    "file_size": 3,
+                    "file_path": "student_work/李四/20240101_000000_old.txt"
+                }
+            }
+        }
+        with open("test_data_store/metadata.json", "w", encoding="utf-8") as f:
+            json.dump(legacy, f, ensure_ascii=False)
+        
+        fm = FileManager("test_data_store")
+        version = fm.get_version()
+        for i in range(3):
+            fm.save_student_work(test_file, f"work{i}.txt", "张三", "")
+        fm.delete_student_work("2")
+        # 每次修改都递增版本号，内容哈希与文件一致
+        assert fm.get_version() == version + 4
+        assert fm.get_student_work_hash("3") == FileManager.hash_file(test_file)
+        fm.close()
+        
+        # 重新打开后数据仍在，旧文件已迁移
+        reloaded = FileManager("test_data_store")
+        assert len(reloaded.get_student_work()) == 3
+        assert [w["filename"] for w in reloaded.get_student_work(student_name="李四")] == ["old.txt"]
+        assert len(reloaded.get_student_work(limit=1)) == 1
+        assert not Path("test_data_store/metadata.json").exists()
+        reloaded.close()
+        print("✅ 元数据迁移成功: 3 条作业记录")
+        
+        os.remove(test_file)
+        shutil.rmtree("test_data_store", ignore_errors=True)
+        
+        print("✅ 元数据存储测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 元数据存储测试失败: {e}")
+        return False
+
+
+def test_dedup_storage():
+    """测试内容寻址存储：相同内容只保存一份、引用计数删除、旧文件迁移"""
+    print("🧪 测试去重存储...")
+    
+    import json
+    import shutil
+    try:
+        from teacher_app import FileManager
+        
+        # 构造旧版本按文件名保存的数据目录
+        os.makedirs("test_data_dedup/student_work/王五", exist_ok=True)
+        with open("test_data_dedup/student_work/王五/20240101_000000_旧作业.txt", "w", encoding="utf-8") as f:
+            f.write("同一份作业")
+        legacy = {
+            "teacher_files": {},
+            "student_work": {
+                "1": {
+                    "original_name": "旧作业.txt",
+                    "saved_name": "20240101_000000_旧作业.txt",
+                    "student_name": "王五",
+                    "description": "",
+                    "upload_time": "2024-01-01T00:00:00",
+                    "file_size": 15,
+                    "file_path": "student_work/王五/20240101_000000_旧作业.txt"
+                }
+            }
+        }
+        with open("test_data_dedup/metadata.json", "w", encoding="utf-8") as f:
+            json.dump(legacy, f, ensure_ascii=False)
+        
+        test_file = "test_dedup.txt"
+        with open(test_file, "w", encoding="utf-8") as f:
+            f.write("同一份作业")
+        
+        fm = FileManager("test_data_dedup")
+        # 旧文件已移入内容寻址存储
+        assert not Path("test_data_dedup/student_work/王五/20240101_000000_旧作业.txt").exists()
+        blob_path = fm.get_student_work_path("1")
+        assert fm.get_student_work_hash("1") == FileManager.hash_file(test_file)
+        
+        # 内容相同的提交只增加引用，不再占用空间
+        first = fm.save_student_work(test_file, "作业.txt", "张三")
+        second = fm.save_student_work(test_file, "作业.txt", "李四")
+        teacher = fm.save_teacher_file(test_file, "范例.txt")
+        assert first["deduplicated"] and second["deduplicated"] and teacher["deduplicated"]
+        assert fm.get_student_work_path(second["work_id"]) == blob_path
+        assert fm.get_teacher_file_path(teacher["file_id"]) == blob_path
+        stats = fm.get_storage_stats()
+        assert stats["blob_count"] == 1 and stats["stored_bytes"] == os.path.getsize(test_file)
+        assert stats["saved_bytes"] == 3 * os.path.getsize(test_file)
+        assert stats["dedup_hits"] == 3 and stats["hit_rate"] == 1.0
+        print(f"✅ 4 份相同内容只保存 1 份，命中率 {stats['hit_rate']:.0%}")
+        
+        def scanned_totals():
+            """逐表统计的结果，应与累计值一致"""
+            return fm._query(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), "
+                "(SELECT COALESCE(SUM(file_size), 0) FROM teacher_files WHERE content_hash IS NOT NULL) + "
+                "(SELECT COALESCE(SUM(file_size), 0) FROM student_work WHERE content_hash IS NOT NULL) "
+                "FROM blobs")[0]
+        
+        def totals():
+            stats = fm.get_storage_stats()
+            return stats["blob_count"], stats["stored_bytes"], stats["logical_bytes"]
+        
+        # 累计值随引用增减；旧数据库没有累计值时启动时统计一次
+        with open("test_dedup_other.txt", "wb") as f:
+            f.write(b"other" * 100)
+        other = fm.save_student_work("test_dedup_other.txt", "其他.txt", "张三")
+        by_hash = fm.save_student_work_by_hash(
+            FileManager.hash_file(test_file), os.path.getsize(test_file), "秒传.txt", "赵六")
+        assert tuple(scanned_totals()) == totals() and totals()[0] == 2
+        fm.delete_student_work(other["work_id"])
+        fm.delete_student_work(by_hash["work_id"])
+        assert tuple(scanned_totals()) == totals() and totals()[0] == 1
+        fm._write(lambda: fm._db.execute(
+            "DELETE FROM meta WHERE key IN ('blob_count', 'stored_bytes', 'logical_bytes')"))
+        fm.close()
+        fm = FileManager("test_data_dedup")
+        assert tuple(scanned_totals()) == totals()
+        os.remove("test_dedup_other.txt")
+        print("✅ 存储统计累计值与逐表统计一致")
+        
+        # 最后一个引用删除后才删除文件
+        for work_id in ("1", first["work_id"], second["work_id"]):
+            fm.delete_student_work(work_id)
+        assert os.path.exists(blob_path)
+        fm.delete_teacher_file(teacher["file_id"])
+        assert not os.path.exists(blob_path)
+        assert fm.get_storage_stats()["blob_count"] == 0
+        fm.close()
+        
+        os.remove(test_file)
+        shutil.rmtree("test_data_dedup", ignore_errors=True)
+        
+        print("✅ 去重存储测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 去重存储测试失败: {e}")
+        return False
+
+
+def test_paginated_listing():
+    """测试作业列表的游标分页、过滤与排序"""
+    print("🧪 测试分页列表...")
+    
+    import shutil
+    try:
+        from teacher_app import FileManager
+        
+        test_file = "test_page.txt"
+        with open(test_file, "w", encoding="utf-8") as f:
+            f.write("分页测试")
+        
+        fm = FileManager("test_data_page")
+        for i in range(7):
+            fm.save_student_work(test_file, f"lab{i}.txt", "张三" if i % 2 else "李四", "")
+        fm.save_student_work(test_file, "report.txt", "王五", "")
+        
+        # 逐页拉取，结果应与一次性查询一致且不重复
+        pages, cursor = [], None
+        while True:
+            works, cursor = fm.list_student_work(limit=3, after=cursor)
+            pages.append(works)
+            if not cursor:
+                break
+        all_ids = [w["work_id"] for page in pages for w in page]
+        assert len(pages) == 3
+        assert all_ids == [w["work_id"] for w in fm.get_student_work()]
+        
+        works, _ = fm.list_student_work(student_name="张三")
+        assert len(works) == 3
+        works, _ = fm.list_student_work(prefix="lab", sort="filename", order="asc")
+        assert [w["filename"] for w in works] == [f"lab{i}.txt" for i in range(7)]
+        print(f"✅ 分页拉取成功: {len(pages)} 页 / {len(all_ids)} 条")
+        
+        # 两个列表各有自己的 ETag：提交作业不影响老师文件列表的缓存，反之亦然
+        from teacher_app import create_app
+        client = create_app(fm).test_client()
+        teacher_etag = client.get("/api/teacher/files").headers["ETag"]
+        work_etag = client.get("/api/student/work").headers["ETag"]
+        fm.save_student_work(test_file, "late.txt", "王五", "")
+        assert client.get("/api/teacher/files", headers={"If-None-Match": teacher_etag}).status_code == 304
+        response = client.get("/api/student/work", headers={"If-None-Match": work_etag})
+        assert response.status_code == 200 and response.headers["ETag"] != work_etag
+        work_etag = response.headers["ETag"]
+        fm.save_teacher_file(test_file, "课件.txt")
+        assert client.get("/api/student/work", headers={"If-None-Match": work_etag}).status_code == 304
+        assert client.get("/api/teacher/files", headers={"If-None-Match": teacher_etag}).status_code == 200
+        print("✅ 老师文件和学生作业列表的 ETag 互不影响")
+        
+        # 学生端逐页拉取老师文件：翻页期间列表变化时从第一页重新拉取；未变化时第一页 304 即结束
+        import threading
+        from teacher_app import WSGIServer
+        from student_app import StudentApp
+        from http_client import HttpClient
+        
+        class FakeUi:
+            def __init__(self):
+                self.posted = []
+            
+            def set(self, variable, value):
+                pass
+            
+            def post(self, callback, *args):
+                self.posted.append(args)
+        
+        for i in range(2):
+            fm.save_teacher_file(test_file, f"讲义{i}.txt")
+        server = WSGIServer(create_app(fm), "127.0.0.1", 0)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        try:
+            app = StudentApp.__new__(StudentApp)
+            app.base_url, app.http, app.ui, app.status_var = (
+                f"http://127.0.0.1:{server.port}", HttpClient(), FakeUi(), None)
+            app.teacher_files, app.teacher_files_etag, app.teacher_file_event_count = [], None, 0
+            app.LISTING_PAGE_SIZE = 1
+            requested = []
+            get = app.http.get
+            
+            def get_and_change(url, **kwargs):
+                requested.append(kwargs["params"].get("after"))
+                if len(requested) == 2:
+                    fm.save_teacher_file(test_file, "新讲义.txt")
+                return get(url, **kwargs)
+            
+            app.http.get = get_and_change
+            
+            def refresh():
+                threads = set(threading.enumerate())
+                app.refresh_teacher_files()
+                for thread in set(threading.enumerate()) - threads:
+                    thread.join(timeout=10)
+            
+            refresh()
+            (files, etag, _), = app.ui.posted
+            # 第 2 页请求时新增了文件：第 2 页 ETag 与第 1 页不同，重新从第一页拉取 4 页
+            assert requested[2] is None and len(requested) == 2 + 4, requested
+            assert sorted(f["filename"] for f in files) == ["新讲义.txt", "讲义0.txt", "讲义1.txt", "课件.txt"]
+            assert etag == f'"v{fm.get_version("teacher_files")}"'
+            app.teacher_files, app.teacher_files_etag = files, etag
+            requested.clear()
+            refresh()
+            assert requested == [None] and len(app.ui.posted) == 1
+        finally:
+            server.shutdown()
+            server_thread.join(timeout=5)
+        fm.close()
+        print("✅ 学生端翻页期间列表变化时重新拉取，未变化时只请求第一页")
+        
+        os.remove(test_file)
+        shutil.rmtree("test_data_page", ignore_errors=True)
+        
+        print("✅ 分页列表测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 分页列表测试失败: {e}")
+        return False
+
+
+def test_chunked_upload():
+    """测试分块上传会话：乱序、重复分块、提交与秒传"""
+    print("🧪 测试分块上传...")
+    
+    import io
+    import json
+    import shutil
+    try:
+        from teacher_app import FileManager
+        
+        fm = FileManager("test_data_upload")
+        data = os.urandom(10000)
+        session = fm.create_upload_session("big.bin", "张三", len(data), chunk_size=4096)
+        assert session["chunk_count"] == 3
+        
+        # 乱序上传，并重复上传同一分块
+        for index in (2, 0, 0):
+            fm.write_upload_chunk(session["upload_id"], index, io.BytesIO(data[index * 4096:(index + 1) * 4096]))
+        try:
+            fm.commit_upload_session(session["upload_id"])
+            raise AssertionError("缺少分块时不应提交成功")
+        except ValueError:
+            pass
+        
+        fm.write_upload_chunk(session["upload_id"], 1, io.BytesIO(data[4096:8192]))
+        work = fm.commit_upload_session(session["upload_id"])
+        with open(fm.get_student_work_path(work["work_id"]), "rb") as f:
+            assert f.read() == data
+        assert fm.get_upload_session(session["upload_id"]) is None
+        print(f"✅ 分块上传成功: {work['file_size']} 字节")
+        
+        # 服务器已有相同内容时，创建会话即完成上传（秒传）
+        import hashlib
+        from teacher_app import create_app
+        client = create_app(fm).test_client()
+        request = {"filename": "copy.bin", "student_name": "李四", "file_size": len(data),
+                   "sha256": hashlib.sha256(data).hexdigest()}
+        result = client.post("/api/student/work/uploads", json=request).get_json()
+        assert result["success"] and "upload" not in result
+        assert result["work"]["student_name"] == "李四" and result["work"]["deduplicated"]
+        assert fm.get_student_work_path(result["work"]["work_id"]) == fm.get_student_work_path(work["work_id"])
+        # 大小不符时仍要正常上传
+        result = client.post("/api/student/work/uploads", json={**request, "file_size": 1}).get_json()
+        assert "upload" in result and "work" not in result
+        print("✅ 相同内容秒传成功")
+        
+        # 学生端中途断开并重启后，按磁盘上记录的会话只补传缺少的分块
+        from teacher_app import WSGIServer
+        from student_app import StudentApp
+        from http_client import HttpClient
+        
+        class FakeUi:
+            def set(self, variable, value):
+                pass
+        
+        class Interrupted(Exception):
+            pass
+        
+        def start_student(sent, fail_after=None):
+            app = StudentApp.__new__(StudentApp)
+            app.UPLOAD_SESSIONS_FILE = os.path.join("test_data_upload", "uploads.json")
+            app.upload_sessions = app.load_upload_sessions()
+            app.upload_sessions_lock = threading.Lock()
+            app.base_url, app.http, app.student_name = base_url, HttpClient(), "王五"
+            app.ui, app.status_var, app.progress_var = FakeUi(), None, None
+            put_chunk = app._put_chunk
+            
+            def counting_put_chunk(url, chunk, encoding=None):
+                if fail_after is not None and len(sent) == fail_after:
+                    raise Interrupted()
+                sent.append(int(url.rsplit("/", 1)[1]))
+                put_chunk(url, chunk, encoding)
+            
+            app._put_chunk = counting_put_chunk
+            return app
+        
+        fm.UPLOAD_CHUNK_SIZE = 4096
+        server = WSGIServer(create_app(fm), "127.0.0.1", 0)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        base_url = f"http://127.0.0.1:{server.port}"
+        try:
+            work_file = os.path.join("test_data_upload", "homework.bin")
+            homework = os.urandom(4 * 4096 + 100)
+            with open(work_file, "wb") as f:
+                f.write(homework)
+            sent = []
+            try:
+                start_student(sent, fail_after=2).chunked_upload(work_file, "第一次作业")
+                raise AssertionError("上传应在第三块中断")
+            except Interrupted:
+                pass
+            assert sent == [0, 1]
+            
+            sent = []
+            result = start_student(sent).chunked_upload(work_file, "第一次作业")
+            assert result["success"] and sent == [2, 3, 4], sent
+            with open(fm.get_student_work_path(result["work"]["work_id"]), "rb") as f:
+                assert f.read() == homework
+            assert start_student([]).upload_sessions == {}
+            # 超过保留时间的记录在读取时丢弃
+            with open(os.path.join("test_data_upload", "uploads.json"), "w", encoding="utf-8") as f:
+                json.dump({"key": {"upload_id": "x", "saved": time.time() - StudentApp.UPLOAD_SESSION_TTL - 1}}, f)
+            assert start_student([]).upload_sessions == {}
+        finally:
+            server.shutdown()
+            server_thread.join(timeout=5)
+        fm.close()
+        print("✅ 重启后续传成功，只补传缺少的分块")
+        
+        shutil.rmtree("test_data_upload", ignore_errors=True)
+        
+        print("✅ 分块上传测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 分块上传测试失败: {e}")
+        return False
+
+
+def test_wire_compression():
+    """测试传输压缩：按 Accept-Encoding 压缩下载、压缩上传分块、跳过已压缩格式"""
+    print("🧪 测试传输压缩...")
+    
+    import gzip
+    import shutil
+    try:
+        from teacher_app import FileManager, create_app
+        
+        fm = FileManager("test_data_compress")
+        client = create_app(fm).test_client()
+        source = "".join(f"def f{i}(x):\n    return x * {i}\n" for i in range(5000)).encode("utf-8")
+        with open("test_compress.py", "wb") as f:
+            f.write(source)
+        with open("test_compress.zip", "wb") as f:
+            f.write(os.urandom(len(source)))
+        text_id = fm.save_teacher_file("test_compress.py", "code.py")["file_id"]
+        zip_id = fm.save_teacher_file("test_compress.zip", "pack.zip")["file_id"]
+        # 内容可压缩，但按文件名属于已压缩格式
+        pdf_id = fm.save_teacher_file("test_compress.py", "slides.pdf")["file_id"]
+        
+        # 可压缩的文件按 Accept-Encoding 压缩下载
+        response = client.get(f"/api/teacher/files/{text_id}", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert int(response.headers["X-File-Size"]) == len(source)
+        assert gzip.decompress(response.data) == source
+        print(f"✅ 压缩下载: {len(source)} -> {len(response.data)} 字节")
+        # 分段下载和已压缩格式发送原始字节
+        response = client.get(f"/api/teacher/files/{text_id}",
+                              headers={"Accept-Encoding": "gzip", "Range": "bytes=0-99"})
+        assert response.status_code == 206 and "Content-Encoding" not in response.headers
+        response = client.get(f"/api/teacher/files/{zip_id}", headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in response.headers and len(response.data) == len(source)
+        response = client.get(f"/api/teacher/files/{pdf_id}", headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in response.headers and response.data == source
+        
+        # 上传分块按 Content-Encoding 解压后写入
+        response = client.post("/api/student/work/uploads", json={
+            "filename": "code.py", "student_name": "张三", "file_size": len(source)})
+        assert "gzip" in response.headers["Accept-Encoding"]
+        upload_id = response.get_json()["upload"]["upload_id"]
+        response = client.put(f"/api/student/work/uploads/{upload_id}/chunks/0",
+                              data=gzip.compress(source), headers={"Content-Encoding": "gzip"})
+        assert response.status_code == 200
+        work = client.post(f"/api/student/work/uploads/{upload_id}/commit").get_json()["work"]
+        with open(fm.get_student_work_path(work["work_id"]), "rb") as f:
+            assert f.read() == source
+        response = client.put(f"/api/student/work/uploads/{upload_id}/chunks/0",
+                              data=b"x", headers={"Content-Encoding": "br"})
+        assert response.status_code == 415
+        fm.close()
+        print("✅ 压缩上传成功")
+        
+        os.remove("test_compress.py")
+        os.remove("test_compress.zip")
+        shutil.rmtree("test_data_compress", ignore_errors=True)
+        
+        print("✅ 传输压缩测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 传输压缩测试失败: {e}")
+        return False
+
+
+def test_range_download():
+    """测试真实服务器上的下载：sendfile 零拷贝发送、Range / If-Range / If-None-Match"""
+    print("🧪 测试分段下载...")
+    
+    import shutil
+    import threading
+    import requests
+    try:
+        from teacher_app import FileManager, WSGIServer, create_app
+        
+        fm = FileManager("test_data_range")
+        source = os.path.join("test_data_range", "source.bin")
+        # 超过一次 sendfile 的发送量，覆盖多次发送的情况
+        data = os.urandom(WSGIServer.SENDFILE_CHUNK_SIZE + 1024 * 1024 + 123)
+        size = len(data)
+        with open(source, "wb") as f:
+            f.write(data)
+        file_id = fm.save_teacher_file(source, "data.bin")["file_id"]
+        
+        for zero_copy in (True, False):
+            server = WSGIServer(create_app(fm), "127.0.0.1", 0, engine="waitress", zero_copy=zero_copy)
+            assert server.zero_copy == (zero_copy and hasattr(os, "sendfile"))
+            server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+            server_thread.start()
+            url = f"http://127.0.0.1:{server.port}/api/teacher/files/{file_id}"
+            # 同一个 keep-alive 连接上依次请求：响应体长度有误时后面的响应会错位
+            session = requests.Session()
+            session.headers["Accept-Encoding"] = "identity"
+            try:
+                response = session.get(url, timeout=10)
+                assert response.status_code == 200 and response.content == data
+                assert int(response.headers["Content-Length"]) == size
+                etag = response.headers["ETag"]
+                
+                # 206：Content-Range 与响应体一致，包括跨越 sendfile 块边界的区间
+                for first, last in ((1000, 1999), (size - 10, size - 1),
+                                    (WSGIServer.SENDFILE_CHUNK_SIZE - 5, size - 1)):
+                    response = session.get(url, headers={"Range": f"bytes={first}-{last}"}, timeout=10)
+                    assert response.status_code == 206, response.status_code
+                    assert response.headers["Content-Range"] == f"bytes {first}-{last}/{size}"
+                    assert response.content == data[first:last + 1]
+                response = session.get(url, headers={"Range": "bytes=-100"}, timeout=10)
+                assert response.status_code == 206 and response.content == data[-100:]
+                assert response.headers["Content-Range"] == f"bytes {size - 100}-{size - 1}/{size}"
+                
+                # If-Range 与当前 ETag 一致时续传；已过期时返回完整文件
+                response = session.get(url, headers={"Range": "bytes=10-19", "If-Range": etag}, timeout=10)
+                assert response.status_code == 206 and response.content == data[10:20]
+                response = session.get(url, headers={"Range": "bytes=10-19", "If-Range": '"stale"'},
+                                       timeout=10)
+                assert response.status_code == 200 and response.content == data
+                assert "Content-Range" not in response.headers
+                
+                # 416：起点超出文件末尾
+                response = session.get(url, headers={"Range": f"bytes={size}-"}, timeout=10)
+                assert response.status_code == 416, response.status_code
+                assert response.headers["Content-Range"] == f"bytes */{size}"
+                
+                # 304：If-None-Match 命中时不发送文件内容
+                response = session.get(url, headers={"If-None-Match": etag}, timeout=10)
+                assert response.status_code == 304 and response.content == b""
+                assert response.headers["ETag"] == etag
+                response = session.get(url, headers={"If-None-Match": etag, "Range": "bytes=0-9"},
+                                       timeout=10)
+                assert response.status_code == 304
+                
+                # 之前的响应都没有多发或少发字节，连接仍可继续使用
+                response = session.get(url, headers={"Range": "bytes=0-9"}, timeout=10)
+                assert response.status_code == 206 and response.content == data[:10]
+            finally:
+                session.close()
+                server.shutdown()
+                server_thread.join(timeout=5)
+            print(f"✅ {'sendfile 零拷贝' if server.zero_copy else '逐块读写'}: 206 / If-Range / 416 / 304")
+        fm.close()
+        
+        shutil.rmtree("test_data_range", ignore_errors=True)
+        
+        print("✅ 分段下载测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 分段下载测试失败: {e}")
+        return False
+
+
+def test_resumable_download():
+    """测试学生端下载：中断后用 If-Range 续传、416 时从头下载、多连接分段与哈希校验"""
+    print("🧪 测试断点续传与多连接下载...")
+    
+    import shutil
+    import threading
+    import requests
+    try:
+        from teacher_app import FileManager, WSGIServer, create_app
+        from student_app import ParallelDownload, StudentApp
+        from http_client import HttpClient
+        
+        fm = FileManager("test_data_resume")
+        source = os.path.join("test_data_resume", "source.bin")
+        data = os.urandom(5 * 64 * 1024 + 123)
+        with open(source, "wb") as f:
+            f.write(data)
+        file_id = fm.save_teacher_file(source, "data.bin")["file_id"]
+        content_hash = fm.get_teacher_file_hash(file_id)
+        
+        class FakeUi:
+            def set(self, variable, value):
+                pass
+        
+        class BrokenResponse:
+            """包装真实响应：发送 limit 字节后连接中断，或把内容篡改为 tamper(chunk)"""
+            
+            def __init__(self, response, limit=None, tamper=None):
+                self.response, self.limit, self.tamper = response, limit, tamper
+            
+            def __getattr__(self, name):
+                return getattr(self.response, name)
+            
+            def __enter__(self):
+                return self
+            
+            def __exit__(self, *exc_info):
+                self.response.close()
+            
+            def iter_content(self, chunk_size):
+                sent = 0
+                for chunk in self.response.iter_content(chunk_size):
+                    if self.limit is not None and sent + len(chunk) > self.limit:
+                        yield chunk[:self.limit - sent]
+                        raise requests.exceptions.ChunkedEncodingError("连接中断")
+                    sent += len(chunk)
+                    yield self.tamper(chunk) if self.tamper else chunk
+        
+        server = WSGIServer(create_app(fm), "127.0.0.1", 0)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        url = f"http://127.0.0.1:{server.port}/api/teacher/files/{file_id}"
+        try:
+            app = StudentApp.__new__(StudentApp)
+            app.http, app.ui, app.status_var, app.progress_var = HttpClient(), FakeUi(), None, None
+            app._backoff = lambda attempt, reason: None
+            requests_made = []
+            get = app.http.get
+            
+            def recording_get(url, broken=None, **kwargs):
+                response = get(url, **kwargs)
+                requests_made.append((dict(kwargs.get("headers") or {}), response.status_code))
+                return BrokenResponse(response, **broken) if broken else response
+            
+            # 第一次请求发送 100KB 后中断：第二次请求带 Range 和 If-Range，服务器返回 206
+            save_path = os.path.join("test_data_resume", "stream.bin")
+            app.http.get = lambda url, **kwargs: recording_get(
+                url, {"limit": 100 * 1024} if not requests_made else None, **kwargs)
+            assert app.stream_download(url, save_path)
+            (first_headers, first_status), (headers, status) = requests_made
+            assert first_status == 200 and "Range" not in first_headers
+            assert status == 206 and headers["Range"] == f"bytes={100 * 1024}-"
+            assert headers["If-Range"] == f'"{content_hash}"'
+            with open(save_path, "rb") as f:
+                assert f.read() == data
+            assert not os.path.exists(save_path + ".part") and not os.path.exists(save_path + ".part.etag")
+            print("✅ 中断后带 If-Range 续传，服务器返回 206")
+            
+            # 临时文件比服务器上的文件还大（已失效）：416 后删除临时文件从头下载
+            with open(save_path + ".part", "wb") as f:
+                f.write(data + b"stale")
+            with open(save_path + ".part.etag", "w", encoding="utf-8") as f:
+                f.write(f'"{content_hash}"')
+            requests_made.clear()
+            app.http.get = recording_get
+            assert app.stream_download(url, save_path)
+            assert [status for _, status in requests_made] == [416, 200], requests_made
+            with open(save_path, "rb") as f:
+                assert f.read() == data
+            print("✅ 续传位置无效时收到 416，从头重新下载")
+            
+            # 多连接下载：按 SEGMENT_SIZE 切分，各分段带 If-Range 并发请求
+            class SmallSegments(ParallelDownload):
+                SEGMENT_SIZE = 64 * 1024
+            
+            part_path = os.path.join("test_data_resume", "parallel.part")
+            requests_made.clear()
+            SmallSegments(app.http, url, part_path, len(data), f'"{content_hash}"',
+                          StudentApp.DOWNLOAD_TIMEOUT, 16 * 1024, lambda received, total: None).run()
+            ranges = sorted(headers["Range"] for headers, _ in requests_made)
+            expected = sorted(f"bytes={start}-{min(start + 64 * 1024, len(data)) - 1}"
+                              for start in range(0, len(data), 64 * 1024))
+            assert ranges == expected, ranges
+            assert all(status == 206 and headers["If-Range"] == f'"{content_hash}"'
+                       for headers, status in requests_made)
+            with open(part_path, "rb") as f:
+                assert f.read() == data
+            os.remove(part_path)
+            # 文件已在服务器上变化（ETag 不再匹配）时不拼接新旧内容
+            try:
+                SmallSegments(app.http, url, part_path, len(data), '"stale"',
+                              StudentApp.DOWNLOAD_TIMEOUT, 16 * 1024, lambda received, total: None).run()
+                raise AssertionError("ETag 不匹配时应失败")
+            except IOError:
+                pass
+            os.remove(part_path)
+            print(f"✅ 多连接下载切分为 {len(ranges)} 个分段")
+            
+            # 经 parallel_download 下载：内容正确时保存；某个分段内容损坏时哈希校验失败，不留下文件
+            app.PARALLEL_MIN_SIZE = 0
+            parallel_path = os.path.join("test_data_resume", "parallel.bin")
+            assert app.parallel_download(url, parallel_path)
+            with open(parallel_path, "rb") as f:
+                assert f.read() == data
+            os.remove(parallel_path)
+            app.http.get = lambda url, **kwargs: recording_get(
+                url, {"tamper": lambda chunk: bytes(len(chunk))}, **kwargs)
+            try:
+                app.parallel_download(url, parallel_path)
+                raise AssertionError("内容损坏时应校验失败")
+            except IOError as e:
+                assert "校验失败" in str(e)
+            assert not os.path.exists(parallel_path) and not os.path.exists(parallel_path + ".parallel.part")
+            print("✅ 多连接下载校验哈希，内容损坏时丢弃")
+        finally:
+            server.shutdown()
+            server_thread.join(timeout=5)
+            fm.close()
+        
+        shutil.rmtree("test_data_resume", ignore_errors=True)
+        
+        print("✅ 断点续传与多连接下载测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 断点续传与多连接下载测试失败: {e}")
+        return False
+
+
+def test_zip_export():
+    """测试作业打包导出：按学生分目录、同名加序号、按学生过滤、流式输出"""
+    print("🧪 测试打包导出...")
+    
+    import io
+    import shutil
+    import zipfile
+    try:
+        from teacher_app import FileManager, create_app
+        
+        fm = FileManager("test_data_export")
+        with open("test_export.txt", "w", encoding="utf-8") as f:
+            f.write("作业内容\n" * 1000)
+        with open("test_export.jpg", "wb") as f:
+            f.write(os.urandom(3 * 1024 * 1024))
+        fm.save_student_work("test_export.txt", "作业.txt", "张三")
+        fm.save_student_work("test_export.txt", "作业.txt", "张三")
+        fm.save_student_work("test_export.jpg", "照片.jpg", "李四")
+        # 内容可压缩，但按文件名属于已压缩格式
+        fm.save_student_work("test_export.txt", "报告.pdf", "李四")
+        client = create_app(fm).test_client()
+        
+        # 边打包边发送，每次产出的数据不超过一个读取块
+        response = client.get("/api/student/work/archive")
+        assert response.status_code == 200 and response.headers["X-Work-Count"] == "4"
+        chunks = list(response.response)
+        assert len(chunks) > 3 and max(len(c) for c in chunks) <= 2 * 1024 * 1024
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+            names = sorted(archive.namelist())
+            assert names == ["张三/作业 (2).txt", "张三/作业.txt", "李四/报告.pdf", "李四/照片.jpg"], names
+            assert archive.read("张三/作业.txt") == open("test_export.txt", "rb").read()
+            assert archive.getinfo("张三/作业.txt").compress_type == zipfile.ZIP_DEFLATED
+            assert archive.getinfo("李四/照片.jpg").compress_type == zipfile.ZIP_STORED
+            assert archive.getinfo("李四/报告.pdf").compress_type == zipfile.ZIP_STORED
+        print(f"✅ 打包 4 份作业: {len(chunks)} 块")
+        
+        # 按学生过滤；没有符合条件的作业时返回 404
+        response = client.get("/api/student/work/archive", query_string={"student_name": "李四"})
+        with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+            assert sorted(archive.namelist()) == ["李四/报告.pdf", "李四/照片.jpg"]
+        response = client.get("/api/student/work/archive", query_string={"since": "2999-01-01"})
+        assert response.status_code == 404
+        fm.close()
+        
+        os.remove("test_export.txt")
+        os.remove("test_export.jpg")
+        shutil.rmtree("test_data_export", ignore_errors=True)
+        
+        print("✅ 打包导出测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 打包导出测试失败: {e}")
+        return False
+
+
+def test_batch_operations():
+    """测试批量操作：批量登记、批量删除各只提交一次，批量上传接口"""
+    print("🧪 测试批量操作...")
+    
+    import io
+    import shutil
+    try:
+        from teacher_app import FileManager, create_app
+        
+        fm = FileManager("test_data_batch")
+        files = []
+        for i in range(200):
+            path = f"test_data_batch/src_{i}.txt"
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(f"第 {i} 份作业")
+            files.append((path, f"作业{i}.txt"))
+        
+        # 200 份作业一次登记、一次删除，各只递增一次版本号
+        version = fm.get_version()
+        works = fm.save_student_works(files, "张三")
+        assert len(works) == 200 and fm.get_version() == version + 1
+        deleted = fm.delete_student_works([w["work_id"] for w in works] + ["99999"])
+        assert len(deleted) == 200 and fm.get_version() == version + 2
+        assert fm.get_student_work() == [] and fm.get_storage_stats()["blob_count"] == 0
+        print("✅ 200 份作业批量登记和删除各一次提交")
+        
+        teacher_files = fm.save_teacher_files(files[:3], "课件")
+        assert fm.delete_teacher_files([f["file_id"] for f in teacher_files]) == [f["file_id"] for f in teacher_files]
+        
+        # 批量上传接口
+        client = create_app(fm).test_client()
+        response = client.post("/api/student/work/batch", data={
+            "student_name": "李四",
+            "files": [(io.BytesIO(b"a"), "a.txt"), (io.BytesIO(b"bb"), "b.txt")]
+        }, content_type="multipart/form-data")
+        result = response.get_json()
+        assert result["success"] and [w["filename"] for w in result["works"]] == ["a.txt", "b.txt"]
+        assert fm.get_version() == version + 5
+        fm.close()
+        print("✅ 批量上传 2 个文件")
+        
+        shutil.rmtree("test_data_batch", ignore_errors=True)
+        
+        print("✅ 批量操作测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 批量操作测试失败: {e}")
+        return False
+
+
+def test_concurrent_uploads():
+    """测试并发提交：100 个学生同时上传，记录 ID 不冲突、引用计数和版本号正确"""
+    print("🧪 测试并发提交...")
+    
+    import shutil
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    try:
+        from teacher_app import FileManager
+        
+        fm = FileManager("test_data_concurrent")
+        uploaders = 100
+        sources = []
+        for i in range(uploaders):
+            path = f"test_data_concurrent/src_{i}.txt"
+            with open(path, "wb") as f:
+                # 每 4 人中有 1 人提交相同的内容（如老师下发的模板原样交回）
+                f.write(b"template" * 4096 if i % 4 == 0 else f"学生 {i} 的作业".encode("utf-8") * 4096)
+            sources.append(path)
+        
+        version = fm.get_version()
+        barrier = threading.Barrier(uploaders)
+        
+        def upload(i):
+            barrier.wait()
+            return fm.save_student_work(sources[i], f"作业{i}.txt", f"学生{i:03d}")
+        
+        # 上传的同时不断查询列表，读操作不应被写入阻塞或出错
+        stop = threading.Event()
+        listings = []
+        
+        def poll():
+            while not stop.is_set():
+                listings.append(len(fm.list_student_work(limit=500)[0]))
+        
+        poller = threading.Thread(target=poll)
+        poller.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=uploaders) as pool:
+            works = list(pool.map(upload, range(uploaders)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        poller.join()
+        
+        work_ids = {w["work_id"] for w in works}
+        assert len(work_ids) == uploaders
+        assert fm.get_version() == version + uploaders
+        assert len(fm.get_student_work()) == uploaders and listings == sorted(listings)
+        template_hash = fm.get_student_work_hash(works[0]["work_id"])
+        refs = fm._query("SELECT ref_count FROM blobs WHERE content_hash = ?", (template_hash,))
+        assert refs[0]["ref_count"] == uploaders // 4
+        assert fm.get_storage_stats()["blob_count"] == uploaders - uploaders // 4 + 1
+        print(f"✅ {uploaders} 个并发上传用时 {elapsed:.2f}s（{uploaders / elapsed:.0f} 份/秒），ID 无冲突")
+        
+        # 并发删除与同内容的再次提交交错进行，引用归零的内容才被删除
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            deletions = [pool.submit(fm.delete_student_work, w["work_id"]) for w in works[::4]]
+            again = pool.submit(fm.save_student_work, sources[0], "模板.txt", "学生000").result()
+            assert all(future.result() for future in deletions)
+        assert fm.get_student_work_path(again["work_id"]) is not None
+        assert len(fm.get_student_work()) == uploaders - uploaders // 4 + 1
+        fm.close()
+        print("✅ 并发删除后引用计数正确")
+        
+        shutil.rmtree("test_data_concurrent", ignore_errors=True)
+        
+        print("✅ 并发提交测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 并发提交测试失败: {e}")
+        return False
+
+
+def test_event_stream():
+    """测试实时推送：老师文件增删通过 SSE 推送，断线重连补发错过的事件"""
+    print("🧪 测试实时推送...")
+    
+    import shutil
+    import threading
+    import requests
+    try:
+        import event_stream
+        from teacher_app import FileManager, WSGIServer, create_app
+        
+        fm = FileManager("test_data_events")
+        source = os.path.join("test_data_events", "source.txt")
+        with open(source, "w", encoding="utf-8") as f:
+            f.write("课件内容")
+        app = create_app(fm)
+        hub = app.extensions["event_hub"]
+        server = WSGIServer(app, "127.0.0.1", 0)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        url = f"http://127.0.0.1:{server.port}/api/events"
+        
+        def subscribe(last_event_id=None):
+            headers = {"Last-Event-ID": last_event_id} if last_event_id else {}
+            response = requests.get(url, headers=headers, stream=True, timeout=(5, 10))
+            response.encoding = "utf-8"
+            lines = response.iter_lines(chunk_size=None, decode_unicode=True)
+            return response, event_stream.iter_events(lines)
+        
+        try:
+            # 首次连接先收到 resync（学生端据此拉取一次完整列表）
+            response, events = subscribe()
+            first_id, event_type, _ = next(events)
+            assert event_type == "resync"
+            
+            # 学生作业不推送，老师文件的增删按顺序推送
+            fm.save_student_work(source, "作业.txt", "张三")
+            file = fm.save_teacher_file(source, "第一课.txt")
+            event_id, event_type, data = next(events)
+            assert event_type == "teacher_file_added" and data["file"]["filename"] == "第一课.txt"
+            fm.delete_teacher_file(file["file_id"])
+            _, event_type, data = next(events)
+            assert event_type == "teacher_file_deleted" and data["file_id"] == file["file_id"]
+            response.close()
+            print("✅ 老师文件增删实时推送")
+            
+            # 断线期间的事件在重连时补发；无法识别的 id 要求重新同步
+            second = fm.save_teacher_file(source, "第二课.txt")
+            response, events = subscribe(event_id)
+            assert [next(events)[1] for _ in range(2)] == ["teacher_file_deleted", "teacher_file_added"]
+            response.close()
+            response, events = subscribe("00000000:1")
+            assert next(events)[1] == "resync"
+            response.close()
+            print("✅ 断线重连补发错过的事件")
+            
+            # 连接数已满时拒绝
+            hub.max_subscribers = hub.subscriber_count()
+            assert requests.get(url, timeout=5).status_code == 503
+            hub.max_subscribers = hub.MAX_SUBSCRIBERS
+            assert fm.delete_teacher_file(second["file_id"])
+        finally:
+            hub.close()
+            server.shutdown()
+            server_thread.join(timeout=5)
+            fm.close()
+        
+        shutil.rmtree("test_data_events", ignore_errors=True)
+        
+        print("✅ 实时推送测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 实时推送测试失败: {e}")
+        return False
+
+
+def test_server_process():
+    """测试服务器子进程：HTTP 服务、进程间调用与变更事件"""
+    print("🧪 测试服务器子进程...")
+    
+    import shutil
+    import requests
+    try:
+        from teacher_app import ServerProcess
+        
+        server = ServerProcess("test_data_process", "127.0.0.1", 0)
+        server.start()
+        try:
+            event = server.events.get(timeout=15)
+            assert event["type"] == "server_started"
+            base_url = f"http://127.0.0.1:{event['port']}"
+            print(f"✅ 子进程服务器已启动: {base_url} ({event['engine']})")
+            
+            response = requests.post(
+                f"{base_url}/api/student/work",
+                data={"student_name": "张三"},
+                files={"file": ("a.txt", "作业内容".encode("utf-8"))},
+                timeout=5,
+            )
+            assert response.json()["success"]
+            assert server.events.get(timeout=5)["type"] == "student_work_added"
+            
+            # GUI 侧通过进程间调用读取和修改
+            works, _ = server.list_student_work(limit=10)
+            assert [w["filename"] for w in works] == ["a.txt"]
+            assert server.delete_student_work(works[0]["work_id"])
+            assert server.events.get(timeout=5)["type"] == "student_work_deleted"
+            
+            # 多个线程同时调用：返回值按请求编号交给各自的调用者；
+            # 保存大文件期间其他调用不必排队等待
+            big_path = Path("test_data_process_big.bin")
+            with open(big_path, "wb") as f:
+                block = os.urandom(1024 * 1024)
+                for _ in range(64):
+                    f.write(block)
+            saver = threading.Thread(
+                target=lambda: server.save_teacher_files([(str(big_path), "big.bin")], ""))
+            saver.start()
+            time.sleep(0.05)
+            started = time.perf_counter()
+            assert isinstance(server.get_version(), int)
+            latency = time.perf_counter() - started
+            assert saver.is_alive(), "保存大文件过快，无法验证并发调用"
+            
+            mismatched = []
+            
+            def caller(index):
+                for _ in range(20):
+                    if index % 2:
+                        ok = isinstance(server.get_version(), int)
+                    else:
+                        ok = isinstance(server.list_student_work(limit=1), (tuple, list))
+                    if not ok:
+                        mismatched.append(index)
+            
+            callers = [threading.Thread(target=caller, args=(i,)) for i in range(8)]
+            for thread in callers:
+                thread.start()
+            for thread in callers:
+                thread.join()
+            saver.join()
+            big_path.unlink()
+            assert not mismatched
+            assert [f["filename"] for f in server.get_teacher_files()] == ["big.bin"]
+            print(f"✅ 保存 64MB 文件期间其他调用 {latency * 1000:.0f}ms 返回，8 个线程的并发调用结果正确")
+        finally:
+            server.stop()
+        
+        shutil.rmtree("test_data_process", ignore_errors=True)
+        
+        print("✅ 服务器子进程测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 服务器子进程测试失败: {e}")
+        return False
+
+
+def test_class_broadcast():
+    """测试班级组播推送：本机回环组播、校验块恢复与 HTTP 补块"""
+    print("🧪 测试班级组播推送...")
+    
+    import queue
+    import random
+    import shutil
+    import threading
+    try:
+        import multicast
+        from teacher_app import FileManager, WSGIServer, create_app
+        
+        class LossySender(multicast.BroadcastSender):
+            """模拟网络丢包：丢弃指定序号的数据块"""
+            dropped = {3, 20, 21}
+            
+            def _send(self, packet):
+                kind = packet[4]
+                index = multicast.INDEX.unpack_from(packet, multicast.HEADER.size)[0] if kind == multicast.DATA else None
+                if index not in self.dropped:
+                    super()._send(packet)
+        
+        fm = FileManager("test_data_broadcast")
+        source = os.path.join("test_data_broadcast", "source.bin")
+        data = os.urandom(100 * 1000)
+        with open(source, "wb") as f:
+            f.write(data)
+        file = fm.save_teacher_file(source, "课件.bin", "组播测试")
+        
+        # HTTP 服务用于补齐组播中无法恢复的块
+        server = WSGIServer(create_app(fm), "127.0.0.1", 0)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        
+        port = random.randint(20000, 40000)
+        events = queue.Queue()
+        receiver = multicast.BroadcastReceiver(
+            os.path.join("test_data_broadcast", "received"), port=port,
+            interface="127.0.0.1", on_event=events.put
+        )
+        receiver.start()
+        try:
+            sender = LossySender(port=port, interface="127.0.0.1")
+            raw = multicast.BroadcastSender(port=port, interface="127.0.0.1")
+            
+            def forged_transfer(transfer_id):
+                """公告的哈希与教师端记录的不一致（如同学冒充老师推送）"""
+                fields = (int(file["file_id"]), 5, 1400, 16, server.port, bytes(32))
+                raw._send(multicast.HEADER.pack(multicast.MAGIC, multicast.ANNOUNCE, transfer_id)
+                          + multicast.ANNOUNCE_FIELDS.pack(*fields) + "伪造.bin".encode("utf-8"))
+                raw._send(multicast.HEADER.pack(multicast.MAGIC, multicast.DATA, transfer_id)
+                          + multicast.INDEX.pack(0) + b"evil!")
+                raw._send(multicast.HEADER.pack(multicast.MAGIC, multicast.END, transfer_id))
+            
+            # 尚未连接教师端（或来自其他地址）时忽略所有包
+            forged_transfer(90)
+            time.sleep(0.5)
+            assert events.empty()
+            receiver.set_teacher("127.0.0.1", server.port)
+            # 来自教师端地址但哈希与教师端 HTTP 接口给出的不一致：丢弃
+            forged_transfer(91)
+            assert events.get(timeout=5)["type"] == "broadcast_started"
+            event = events.get(timeout=10)
+            assert event["type"] == "broadcast_failed" and "不一致" in event["error"], event
+            assert os.listdir(os.path.join("test_data_broadcast", "received")) == []
+            print("✅ 其他地址的推送和哈希不符的推送被丢弃")
+            
+            # 损坏或伪造的包（公告过短、文件大小或块大小无效、校验块长度不对）被丢弃，不影响接收
+            bogus_fields = [(1, 2 ** 63, 1400, 16, 80, bytes(32)), (1, 1000, 0, 16, 80, bytes(32))]
+            raw._send(multicast.HEADER.pack(multicast.MAGIC, multicast.ANNOUNCE, 1) + b"short")
+            for transfer_id, fields in enumerate(bogus_fields, start=2):
+                raw._send(multicast.HEADER.pack(multicast.MAGIC, multicast.ANNOUNCE, transfer_id)
+                          + multicast.ANNOUNCE_FIELDS.pack(*fields) + b"x")
+            raw._send(multicast.HEADER.pack(multicast.MAGIC, multicast.DATA, 1) + b"\0")
+            raw.close()
+            sender.send_file(
+                fm.get_teacher_file_path(file["file_id"]), file["file_id"],
+                fm.get_teacher_file_hash(file["file_id"]), "课件.bin", server.port
+            )
+            sender.close()
+            
+            assert events.get(timeout=5)["type"] == "broadcast_started"
+            event = events.get(timeout=10)
+            assert event["type"] == "broadcast_done", event
+            # 第 0 组只丢一块，由校验块恢复；第 1 组丢两块，通过 HTTP 补齐
+            assert event["recovered"] == 1 and event["fetched"] == 2, event
+            with open(event["path"], "rb") as f:
+                assert f.read() == data
+            print(f"✅ 组播接收成功: {event['blocks']} 块，恢复 {event['recovered']}，补齐 {event['fetched']}")
+        finally:
+            receiver.stop()
+            server.shutdown()
+            server_thread.join(timeout=5)
+            fm.close()
+        
+        shutil.rmtree("test_data_broadcast", ignore_errors=True)
+        
+        print("✅ 班级组播推送测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 班级组播推送测试失败: {e}")
+        return False
+
+
+def test_swarm_download():
+    """测试 P2P 分发：分块清单、tracker 与同学之间互传分块"""
+    print("🧪 测试 P2P 分发...")
+    
+    import shutil
+    import threading
+    try:
+        import swarm
+        from teacher_app import FileManager, WSGIServer, create_app
+        
+        fm = FileManager("test_data_swarm")
+        fm.SWARM_CHUNK_SIZE = 64 * 1024
+        source = os.path.join("test_data_swarm", "source.bin")
+        data = os.urandom(300 * 1024)
+        with open(source, "wb") as f:
+            f.write(data)
+        file = fm.save_teacher_file(source, "课件.bin", "P2P 测试")
+        # 分块清单在保存后由后台生成
+        fm.wait_for_manifests()
+        manifest = fm.get_teacher_file_manifest(file["file_id"])
+        assert len(manifest["chunks"]) == 5
+        
+        server = WSGIServer(create_app(fm), "127.0.0.1", 0)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        base_url = f"http://127.0.0.1:{server.port}"
+        
+        peers = [swarm.SwarmPeer("127.0.0.1", 0) for _ in range(2)]
+        for peer in peers:
+            peer.start()
+        try:
+            # 清单尚未生成时返回 503，并安排在后台生成
+            fm._write(lambda: fm._db.execute("DELETE FROM chunk_manifests"))
+            response = swarm.requests.get(f"{base_url}/api/teacher/files/{file['file_id']}/manifest", timeout=5)
+            assert response.status_code == 503 and response.headers["Retry-After"]
+            fm.wait_for_manifests()
+            assert peers[0].fetch_manifest(base_url, file["file_id"])["chunks"] == manifest["chunks"]
+            print("✅ 分块清单在后台生成")
+            
+            # 学生端只在有同学持有该文件（或文件很大）时走 P2P，否则用普通下载
+            from student_app import StudentApp
+            
+            class FakeUi:
+                def set(self, variable, value):
+                    pass
+            
+            app = StudentApp.__new__(StudentApp)
+            app.swarm_peer = swarm.SwarmPeer("127.0.0.1", 0)
+            app.swarm_peer.start()
+            peers.append(app.swarm_peer)
+            app.base_url, app.ui, app.status_var, app.progress_var = base_url, FakeUi(), None, None
+            app_path = os.path.join("test_data_swarm", "app.bin")
+            assert not app.swarm_download(file["file_id"], app_path) and not os.path.exists(app_path)
+            
+            # 第一名学生只能从教师端下载；第二名学生全部从第一名学生处获取
+            first = peers[0].download(base_url, file["file_id"], os.path.join("test_data_swarm", "a.bin"))
+            assert first == {"peer_bytes": 0, "teacher_bytes": len(data)}, first
+            assert app.swarm_download(file["file_id"], app_path)
+            os.remove(app_path)
+            second = peers[1].download(base_url, file["file_id"], os.path.join("test_data_swarm", "b.bin"))
+            assert second == {"peer_bytes": len(data), "teacher_bytes": 0}, second
+            for name in ("a.bin", "b.bin"):
+                with open(os.path.join("test_data_swarm", name), "rb") as f:
+                    assert f.read() == data
+            print(f"✅ 第二名学生从同学处获取 {second['peer_bytes']} 字节，教师端 {second['teacher_bytes']} 字节")
+            
+            # 整个文件的哈希与清单不符（模拟写盘损坏）：不再分享，也不留下临时文件
+            third = swarm.SwarmPeer("127.0.0.1", 0)
+            third.start()
+            peers.append(third)
+            file_digest = swarm.hashlib.file_digest
+            swarm.hashlib.file_digest = lambda f, name: swarm.hashlib.sha256(b"corrupt")
+            bad_path = os.path.join("test_data_swarm", "c.bin")
+            try:
+                third.download(base_url, file["file_id"], bad_path)
+                raise AssertionError("哈希不符的文件没有被拒绝")
+            except ValueError:
+                pass
+            finally:
+                swarm.hashlib.file_digest = file_digest
+            assert manifest["content_hash"] not in third.shared
+            assert not os.path.exists(bad_path + ".swarm.part") and not os.path.exists(bad_path)
+            print("✅ 校验失败的文件被丢弃")
+            
+            # 网络错误导致下载失败：删除 P2P 临时文件，单连接下载的续传数据不受影响
+            resume_path = bad_path + ".part"
+            with open(resume_path, "wb") as f:
+                f.write(data[:1000])
+            
+            def unreachable(download, session, index, source):
+                raise swarm.requests.ConnectionError("教师端不可达")
+            
+            fetch = swarm.SwarmDownload._fetch
+            swarm.SwarmDownload._fetch = unreachable
+            try:
+                third.download(base_url, file["file_id"], bad_path)
+                raise AssertionError("下载失败时没有抛出异常")
+            except swarm.requests.ConnectionError:
+                pass
+            finally:
+                swarm.SwarmDownload._fetch = fetch
+            assert manifest["content_hash"] not in third.shared
+            assert not os.path.exists(bad_path + ".swarm.part") and not os.path.exists(bad_path)
+            with open(resume_path, "rb") as f:
+                assert f.read() == data[:1000]
+            print("✅ 下载失败时清理临时文件，保留续传数据")
+        finally:
+            for peer in peers:
+                peer.stop()
+            server.shutdown()
+            server_thread.join(timeout=5)
+            fm.close()
+        
+        shutil.rmtree("test_data_swarm", ignore_errors=True)
+        
+        print("✅ P2P 分发测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ P2P 分发测试失败: {e}")
+        return False
+
+
 def test_student_app():
     """测试学生端应用"""
     print("🧪 测试学生端应用...")
@@ -69,6 +1329,603 @@ def test_student_app():
         return False
 
 
+def test_teacher_file_events():
+    """测试学生端老师文件列表：拉取期间收到的推送事件不被较早的完整列表覆盖"""
+    print("🧪 测试列表与推送合并...")
+    
+    import collections
+    try:
+        from student_app import StudentApp
+        
+        class FakeTree:
+            """代替老师文件 Treeview，按顺序记录行 ID"""
+            
+            def __init__(self):
+                self.rows = []
+            
+            def get_children(self):
+                return tuple(self.rows)
+            
+            def exists(self, iid):
+                return iid in self.rows
+            
+            def insert(self, parent, index, iid, **kwargs):
+                self.rows.insert(len(self.rows) if index == "end" else index, iid)
+            
+            def delete(self, iid):
+                self.rows.remove(iid)
+        
+        class FakeVar:
+            def set(self, value):
+                self.value = value
+        
+        # 测试环境没有显示器，只准备列表相关的属性
+        app = StudentApp.__new__(StudentApp)
+        app.teacher_tree = FakeTree()
+        app.status_var = FakeVar()
+        app.teacher_files = []
+        app.teacher_files_etag = None
+        app.teacher_file_event_count = 0
+        app.teacher_file_events = collections.deque(maxlen=StudentApp.EVENT_LOG_SIZE)
+        refreshes = []
+        app.refresh_teacher_files = lambda: refreshes.append(True)
+        
+        def file(file_id):
+            return {"file_id": file_id, "filename": f"{file_id}.txt", "file_size": 1,
+                    "upload_time": "2024-01-01T00:00:00"}
+        
+        def added(file_id):
+            app.apply_teacher_file_event("teacher_file_added", {"file": file(file_id)})
+        
+        def deleted(file_id):
+            app.apply_teacher_file_event("teacher_file_deleted", {"file_id": file_id})
+        
+        # 列表在事件之前生成：拉取返回后重新应用期间收到的事件
+        started = app.teacher_file_event_count
+        added("3")
+        deleted("1")
+        app.show_teacher_files([file("2"), file("1")], '"v1"', started)
+        assert app.teacher_tree.rows == ["3", "2"], app.teacher_tree.rows
+        assert [f["file_id"] for f in app.teacher_files] == ["3", "2"]
+        
+        # 列表已包含这些事件的结果：重复应用不产生重复的行
+        started = app.teacher_file_event_count
+        added("4")
+        deleted("2")
+        app.show_teacher_files([file("4"), file("3")], '"v2"', started)
+        assert app.teacher_tree.rows == ["4", "3"], app.teacher_tree.rows
+        
+        # 没有新事件时完整列表直接替换
+        app.show_teacher_files([file("5")], '"v3"', app.teacher_file_event_count)
+        assert app.teacher_tree.rows == ["5"] and app.status_var.value == "已加载 1 个文件"
+        print("✅ 拉取期间的增删事件合并到列表")
+        
+        # 拉取期间的事件超过保留数量时重新拉取
+        started = app.teacher_file_event_count
+        for i in range(StudentApp.EVENT_LOG_SIZE + 1):
+            added(f"n{i}")
+        app.show_teacher_files([file("5")], '"v4"', started)
+        assert refreshes == [True]
+        print("✅ 事件过多时重新拉取")
+        
+        print("✅ 列表与推送合并测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 列表与推送合并测试失败: {e}")
+        return False
+
+
+def test_teacher_discovery():
+    """测试教师端发现：学生端启动时的探测立即得到教师端回复"""
+    print("🧪 测试教师端发现...")
+    
+    import socket
+    import threading
+    import time
+    try:
+        import discovery
+        
+        # 使用临时端口，避免与本机运行中的教师端冲突
+        probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        probe.bind(("", 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        
+        version = [3]
+        beacon = discovery.TeacherBeacon(5000, lambda: version[0], port=port, interval=60)
+        beacon.start()
+        found = []
+        first = threading.Event()
+        
+        def on_teacher(teacher):
+            found.append(teacher)
+            first.set()
+        
+        started = time.perf_counter()
+        listener = discovery.TeacherListener(on_teacher, port=port)
+        listener.start()
+        try:
+            assert first.wait(2), "未发现教师端"
+            elapsed = time.perf_counter() - started
+            assert found[0]["port"] == 5000 and found[0]["version"] == 3
+            print(f"✅ {elapsed * 1000:.1f}ms 发现教师端 {found[0]['address']}:{found[0]['port']}")
+            
+            # 再次探测时回复最新的元数据版本号
+            version[0] = 4
+            listener.probe()
+            deadline = time.time() + 2
+            while found[-1]["version"] != 4 and time.time() < deadline:
+                time.sleep(0.05)
+            assert found[-1]["version"] == 4
+        finally:
+            listener.stop()
+            beacon.stop()
+        
+        assert discovery.decode_message(b"not json") is None
+        assert discovery.decode_message(discovery.encode_message("probe"))["type"] == "probe"
+        
+        print("✅ 教师端发现测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 教师端发现测试失败: {e}")
+        return False
+
+
+def test_subnet_scan():
+    """测试网段扫描：并发探测端口，用健康检查排除不是教师端的服务"""
+    print("🧪 测试网段扫描...")
+    
+    import shutil
+    import socket
+    import threading
+    import time
+    try:
+        import discovery
+        from teacher_app import FileManager, WSGIServer, create_app
+        
+        fm = FileManager("test_data_scan")
+        server = WSGIServer(create_app(fm), "127.0.0.1", 0)
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        # 同一端口上另一个不是教师端的服务（只接受连接，不回应 HTTP）
+        other = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        other.bind(("127.0.0.2", server.port))
+        other.listen()
+        try:
+            # 回环网段 127.0.0.x 模拟机房网段，扫描整个 /24
+            scanner = discovery.SubnetScanner(server.port, local_address="127.0.0.200")
+            started = time.perf_counter()
+            address = scanner.scan()
+            elapsed = time.perf_counter() - started
+            assert address == "127.0.0.1", address
+            assert scanner.srtt is not None and scanner.timeout() < scanner.MAX_TIMEOUT
+            print(f"✅ {elapsed:.2f}s 扫描到教师端 {address}，连接超时自适应为 {scanner.timeout() * 1000:.0f}ms")
+            
+            assert discovery.check_teacher("127.0.0.1", server.port)
+            assert not discovery.check_teacher("127.0.0.2", server.port)
+        finally:
+            other.close()
+            server.shutdown()
+            server_thread.join(timeout=5)
+            fm.close()
+        
+        shutil.rmtree("test_data_scan", ignore_errors=True)
+        
+        print("✅ 网段扫描测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 网段扫描测试失败: {e}")
+        return False
+
+
+def test_http_client():
+    """测试学生端 HTTP 客户端：长连接复用、网关错误重试、分离的连接/读取超时"""
+    print("🧪 测试HTTP客户端...")
+    
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    try:
+        import requests
+        from http_client import HttpClient
+        
+        client_ports = []
+        flaky_calls = []
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def log_message(self, *args):
+                pass
+            
+            def do_GET(self):
+                client_ports.append(self.client_address[1])
+                status, body = 200, b"ok"
+                if self.path == "/flaky":
+                    flaky_calls.append(self.path)
+                    if len(flaky_calls) == 1:
+                        status, body = 502, b"bad gateway"
+                elif self.path == "/slow":
+                    time.sleep(0.5)
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+        
+        # 本地的替身服务器（HTTP/1.1，支持长连接）
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        # 客户端超时断开后，替身服务器写回响应时的 BrokenPipeError 不打印
+        server.handle_error = lambda request, client_address: None
+        server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+        server_thread.start()
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            with HttpClient() as http:
+                for _ in range(20):
+                    assert http.get(f"{base_url}/ok").text == "ok"
+                assert len(set(client_ports)) == 1, set(client_ports)
+                print("✅ 20 个请求复用同一个连接")
+                
+                response = http.get(f"{base_url}/flaky")
+                assert response.status_code == 200 and len(flaky_calls) == 2
+                print("✅ 502 后自动重试成功")
+            
+            with HttpClient(timeout=(1, 0.2)) as http:
+                started = time.perf_counter()
+                try:
+                    http.get(f"{base_url}/slow")
+                    raise AssertionError("读取超时未生效")
+                except requests.ConnectionError as e:
+                    # 读取超时重试用尽后 requests 抛出 ConnectionError（原因是 ReadTimeoutError）
+                    assert "Read timed out" in str(e), e
+                elapsed = time.perf_counter() - started
+                assert elapsed < 1.5, elapsed
+                # 单次请求的超时覆盖默认值
+                assert http.get(f"{base_url}/slow", timeout=(1, 2)).text == "ok"
+                print(f"✅ 读取超时 {elapsed:.2f}s 后失败，单次请求可覆盖超时")
+        finally:
+            server.shutdown()
+            server.server_close()
+        
+        print("✅ HTTP客户端测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ HTTP客户端测试失败: {e}")
+        return False
+
+
+def test_ui_dispatcher():
+    """测试界面更新队列：多线程提交、同 key 合并、按时间预算分批执行"""
+    print("🧪 测试界面更新队列...")
+    
+    import threading
+    import time
+    try:
+        from ui_dispatch import UiDispatcher
+        
+        class FakeRoot:
+            """代替 Tk 根窗口，记录 after() 安排的回调（测试环境没有显示器）"""
+            
+            def __init__(self):
+                self.scheduled = {}
+                self.errors = []
+                self.next_id = 0
+            
+            def after(self, delay, callback):
+                self.next_id += 1
+                self.scheduled[self.next_id] = (delay, callback)
+                return self.next_id
+            
+            def after_cancel(self, after_id):
+                self.scheduled.pop(after_id, None)
+            
+            def fire(self):
+                """执行最早安排的回调（Tk 主循环的定时器到期）"""
+                _, callback = self.scheduled.pop(min(self.scheduled))
+                callback()
+            
+            def report_callback_exception(self, exc_type, exc, tb):
+                self.errors.append(exc)
+        
+        class FakeVar:
+            def __init__(self, name):
+                self.name = name
+                self.value = None
+                self.sets = 0
+            
+            def __str__(self):
+                return self.name
+            
+            def set(self, value):
+                self.value = value
+                self.sets += 1
+        
+        root = FakeRoot()
+        ui = UiDispatcher(root)
+        assert [delay for delay, _ in root.scheduled.values()] == [ui.interval]
+        
+        # 20 个传输线程同时汇报进度，并各自按顺序提交完成通知
+        progress = [FakeVar(f"progress{i}") for i in range(20)]
+        finished = []
+        main_thread = threading.get_ident()
+        
+        def on_finished(worker, step):
+            assert threading.get_ident() == main_thread
+            finished.append((worker, step))
+        
+        def transfer(worker):
+            for percent in range(1000):
+                ui.set(progress[worker], percent)
+            for step in range(3):
+                ui.post(on_finished, worker, step)
+        
+        threads = [threading.Thread(target=transfer, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        # 同一变量的进度合并为一次更新，队列中只有 20 个进度 + 60 个通知
+        assert ui.pending() == 20 + 60, ui.pending()
+        while ui.drain():
+            pass
+        assert all(var.value == 999 and var.sets == 1 for var in progress)
+        for worker in range(20):
+            assert [step for w, step in finished if w == worker] == [0, 1, 2]
+        print("✅ 20 个线程的 20000 次进度更新合并为 20 次界面操作，通知保持顺序")
+        
+        # 每轮只执行时间预算内的更新，剩余的交给下一轮
+        for _ in range(50):
+            ui.post(time.sleep, 0.002)
+        started = time.perf_counter()
+        remaining = ui.drain()
+        elapsed = time.perf_counter() - started
+        assert 0 < remaining < 50, remaining
+        assert elapsed < ui.budget + 0.02, elapsed
+        print(f"✅ 一轮用时 {elapsed * 1000:.1f}ms，剩余 {remaining} 个更新留到下一轮")
+        
+        # 有积压时下一轮立即进行，队列为空后恢复正常间隔
+        root.fire()
+        assert [delay for delay, _ in root.scheduled.values()] == [1]
+        while ui.pending():
+            root.fire()
+        root.fire()
+        assert [delay for delay, _ in root.scheduled.values()] == [ui.interval]
+        
+        # 回调出错时报告异常，不影响后续更新
+        def fail():
+            raise ValueError("boom")
+        
+        after_error = FakeVar("after_error")
+        ui.post(fail)
+        ui.set(after_error, "ok")
+        ui.drain()
+        assert len(root.errors) == 1 and after_error.value == "ok"
+        
+        ui.close()
+        assert not root.scheduled
+        
+        print("✅ 界面更新队列测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 界面更新队列测试失败: {e}")
+        return False
+
+
+def test_storage_stats_refresh():
+    """测试教师端存储统计刷新：合并多批事件、在后台线程中调用子进程"""
+    print("🧪 测试存储统计刷新...")
+    
+    import queue
+    import threading
+    try:
+        from teacher_app import TeacherApp
+        
+        class FakeRoot:
+            """代替 Tk 根窗口，记录 after() 安排的回调"""
+            
+            def __init__(self):
+                self.scheduled = {}
+                self.next_id = 0
+            
+            def after(self, delay, callback):
+                self.next_id += 1
+                self.scheduled[self.next_id] = callback
+                return self.next_id
+            
+            def after_cancel(self, after_id):
+                self.scheduled.pop(after_id, None)
+        
+        class FakeUi:
+            """把后台线程提交的更新放入队列，由测试在"主线程"中执行"""
+            
+            def __init__(self):
+                self.updates = queue.Queue()
+            
+            def post(self, callback, *args):
+                self.updates.put((callback, args, threading.current_thread()))
+            
+            def run_next(self):
+                callback, args, thread = self.updates.get(timeout=5)
+                assert thread is not threading.main_thread()
+                callback(*args)
+        
+        class FakeFileManager:
+            def __init__(self):
+                self.calls = 0
+            
+            def get_storage_stats(self):
+                self.calls += 1
+                return {"stored_bytes": 1024, "saved_bytes": 2048 * self.calls, "hit_rate": 0.5}
+        
+        class FakeVar:
+            def set(self, value):
+                self.value = value
+        
+        app = TeacherApp.__new__(TeacherApp)
+        app.root, app.ui, app.file_manager, app.storage_var = FakeRoot(), FakeUi(), FakeFileManager(), FakeVar()
+        app.storage_stats_after_id = None
+        app.storage_stats_loading = False
+        app.storage_stats_stale = False
+        
+        # 多批文件事件只安排一次延迟刷新，且不在主线程中调用子进程
+        for _ in range(5):
+            app.schedule_storage_stats()
+        assert len(app.root.scheduled) == 1 and app.file_manager.calls == 0
+        app.root.scheduled.pop(app.storage_stats_after_id)()
+        app.ui.run_next()
+        assert app.file_manager.calls == 1 and "2.0 KB" in app.storage_var.value, app.storage_var.value
+        print("✅ 5 批事件合并为 1 次后台刷新")
+        
+        # 获取期间再次要求刷新：结束后再获取一次，期间不并发调用
+        app.refresh_storage_stats()
+        app.refresh_storage_stats()
+        app.refresh_storage_stats()
+        app.ui.run_next()
+        app.ui.run_next()
+        assert app.file_manager.calls == 3 and app.ui.updates.empty()
+        assert not app.storage_stats_loading and not app.root.scheduled
+        print("✅ 获取期间的刷新请求合并为一次")
+        
+        print("✅ 存储统计刷新测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 存储统计刷新测试失败: {e}")
+        return False
+
+
+def test_virtual_tree_view():
+    """测试虚拟列表：只实例化可见行，刷新只修改有变化的行，保持选中行和滚动位置"""
+    print("🧪 测试虚拟列表...")
+    
+    try:
+        from tree_view import VirtualTreeview
+        
+        class FakeTreeview:
+            """代替 ttk.Treeview，记录增删改移的次数（测试环境没有显示器）"""
+            
+            def __init__(self, height):
+                self.height = height
+                self.children = []
+                self.items = {}
+                self.selected = ()
+                self.operations = 0
+            
+            def cget(self, option):
+                return self.height
+            
+            def configure(self, **options):
+                pass
+            
+            def bind(self, sequence, callback, add=None):
+                pass
+            
+            def after_idle(self, callback):
+                pass
+            
+            def get_children(self):
+                return tuple(self.children)
+            
+            def insert(self, parent, index, iid, text, values, tags):
+                self.operations += 1
+                self.children.insert(index, iid)
+                self.items[iid] = (text, tuple(values))
+            
+            def delete(self, *iids):
+                self.operations += len(iids)
+                for iid in iids:
+                    self.children.remove(iid)
+                    del self.items[iid]
+            
+            def move(self, iid, parent, index):
+                self.operations += 1
+                self.children.remove(iid)
+                self.children.insert(index, iid)
+            
+            def item(self, iid, text, values):
+                self.operations += 1
+                self.items[iid] = (text, tuple(values))
+            
+            def selection(self):
+                return self.selected
+            
+            def selection_set(self, items):
+                self.selected = tuple(items)
+        
+        class FakeScrollbar:
+            def configure(self, **options):
+                pass
+            
+            def set(self, first, last):
+                self.fractions = (first, last)
+        
+        def rows(count, changed=()):
+            """count 份作业（ID 降序），changed 中的作业文件名被修改"""
+            return [(str(i), f"作业{i}.txt" + (" (新)" if i in changed else ""),
+                     (f"学生{i % 40}", "1.0 KB")) for i in range(count, 0, -1)]
+        
+        tree, scrollbar = FakeTreeview(20), FakeScrollbar()
+        reached_end = []
+        view = VirtualTreeview(tree, scrollbar, on_reach_end=lambda: reached_end.append(True))
+        
+        # 5000 行只实例化可见的 20 行
+        view.set_rows(rows(5000))
+        assert len(view) == 5000 and tree.get_children() == tuple(str(i) for i in range(5000, 4980, -1))
+        assert tree.operations == 20 and not reached_end
+        print("✅ 5000 行只创建了 20 个 Treeview 项目")
+        
+        # 滚动到中间并选中一行；滚动只增删移入移出的行
+        view.yview("moveto", 0.5)
+        assert tree.get_children()[0] == "2500"
+        tree.operations = 0
+        view.yview("scroll", 3, "units")
+        assert tree.get_children()[0] == "2497" and tree.operations == 6
+        tree.selection_set(("2490",))
+        view._on_select(None)
+        assert view.selection() == ("2490",)
+        
+        # 刷新：一行内容变化、窗口外删除一行、顶部新增两行，只修改变化的行
+        tree.operations = 0
+        new_rows = [row for row in rows(5002, changed={2495}) if row[0] != "10"]
+        view.set_rows(new_rows)
+        assert tree.operations == 1, tree.operations
+        assert tree.get_children()[0] == "2497" and tree.items["2495"][0] == "作业2495.txt (新)"
+        assert view.selection() == ("2490",) and tree.selection() == ("2490",)
+        print("✅ 刷新 5001 行只修改了 1 个项目，选中行和滚动位置不变")
+        
+        # 增删事件：窗口上方插入时显示的行不变，窗口内删除时补上下一行
+        tree.operations = 0
+        view.insert(0, "5003", "作业5003.txt", ("学生3", "1.0 KB"))
+        assert tree.get_children()[0] == "2497" and tree.operations == 0
+        view.remove("2496")
+        assert "2496" not in tree.get_children() and tree.get_children()[-1] == "2477"
+        assert tree.operations == 2, tree.operations
+        
+        # 选中行滚出窗口后仍算作选中，滚回来时重新显示为选中
+        view.yview("moveto", 0)
+        assert view.selection() == ("2490",) and tree.selection() == ()
+        assert view.item("2490")["tags"] == ["2490"]
+        view.see("2490")
+        assert tree.selection() == ("2490",)
+        
+        # 滚动到末尾时通知加载下一页，追加的行不重复
+        view.yview("moveto", 1.0)
+        assert reached_end and tree.get_children()[-1] == "1"
+        view.append_rows([("1", "作业1.txt", ("学生1", "1.0 KB")), ("0", "作业0.txt", ("学生0", "1.0 KB"))])
+        assert view.keys()[-2:] == ["1", "0"] and len(view) == 5002
+        # 追加的一页不移动窗口，继续滚动即可看到
+        assert scrollbar.fractions[1] < 1.0
+        view.yview("scroll", 1, "pages")
+        assert tree.get_children()[-1] == "0" and scrollbar.fractions[1] == 1.0
+        
+        print("✅ 虚拟列表测试通过")
+        return True
+    except Exception as e:
+        print(f"❌ 虚拟列表测试失败: {e}")
+        return False
+
+
 def test_network_discovery():
     """测试网络发现功能"""
     print("🧪 测试网络发现功能...")
@@ -104,7 +1961,28 @@ def main():
     
     tests = [
         ("教师端应用", test_teacher_app),
+        ("元数据存储", test_metadata_store),
+        ("去重存储", test_dedup_storage),
+        ("分页列表", test_paginated_listing),
+        ("分块上传", test_chunked_upload),
+        ("传输压缩", test_wire_compression),
+        ("分段下载", test_range_download),
+        ("断点续传与多连接下载", test_resumable_download),
+        ("打包导出", test_zip_export),
+        ("批量操作", test_batch_operations),
+        ("并发提交", test_concurrent_uploads),
+        ("实时推送", test_event_stream),
+        ("服务器子进程", test_server_process),
+        ("班级组播推送", test_class_broadcast),
+        ("P2P 分发", test_swarm_download),
         ("学生端应用", test_student_app),
+        ("列表与推送合并", test_teacher_file_events),
+        ("教师端发现", test_teacher_discovery),
+        ("网段扫描", test_subnet_scan),
+        ("HTTP客户端", test_http_client),
+        ("界面更新队列", test_ui_dispatcher),
+        ("存储统计刷新", test_storage_stats_refresh),
+        ("虚拟列表", test_virtual_tree_view),
         ("网络发现", test_network_discovery),
     ]
     
@@ -0,0 +1,264 @@
+"""
+虚拟列表 - 只为可见行创建 Treeview 项目
+
+完整的行数据（几千份作业也只是几千个元组）保存在 Python 列表中，Treeview 中
+只保留当前能看到的那几十行。滚动时按行 ID 增量调整窗口：已在窗口中的行原样
+保留，只插入新露出的行、删除移出的行；刷新列表或收到增删事件时也只修改发生
+变化的行。刷新开销与变化的行数（和窗口大小）相关，与列表总长度无关，选中的
+行和滚动位置在刷新后保持不变。
+"""
+
+# 鼠标滚轮每格滚动的行数
+WHEEL_ROWS = 3
+# Tk 事件 state 中的 Shift、Control 修饰键
+_SHIFT = 0x1
+_CONTROL = 0x4
+
+
+class VirtualTreeview:
+    """包装一个平铺的 ttk.Treeview 及其纵向滚动条，只实例化可见行
+
+    每行由 (行ID, 文本, 列值元组) 描述，行ID 同时用作 Treeview 项目 ID 和 tag。
+    selection() 和 item() 与 Treeview 同名方法的用法相同，但覆盖全部行（包括
+    窗口外选中的行）。on_reach_end() 在窗口滚动到已加载数据的末尾时调用，
+    可用于按页加载。
+    """
+
+    def __init__(self, tree, scrollbar, on_reach_end=None):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.on_reach_end = on_reach_end
+        # 全部行：按显示顺序排列的行ID，以及 行ID -> (文本, 列值)
+        self._keys = []
+        self._rows = {}
+        # 窗口中已实例化的行：行ID -> (文本, 列值)，以及它们在 Treeview 中的顺序
+        self._shown = {}
+        self._order = []
+        self._selected = set()
+        # 窗口中第一行的位置及可见行数（窗口大小改变时按行高重新计算）
+        self.first = 0
+        self.visible = max(1, int(tree.cget("height")))
+        self._measured = False
+        self._replace_selection = False
+
+        scrollbar.configure(command=self.yview)
+        tree.configure(yscrollcommand=self._on_tree_scroll)
+        tree.bind("<Configure>", self._on_configure)
+        tree.bind("<MouseWheel>", self._on_wheel)
+        tree.bind("<Button-4>", self._on_wheel)
+        tree.bind("<Button-5>", self._on_wheel)
+        tree.bind("<Up>", lambda event: self._on_arrow(event, -1))
+        tree.bind("<Down>", lambda event: self._on_arrow(event, 1))
+        tree.bind("<Prior>", lambda event: self._scroll_keys(-self.visible))
+        tree.bind("<Next>", lambda event: self._scroll_keys(self.visible))
+        tree.bind("<ButtonPress-1>", self._on_click, add="+")
+        tree.bind("<ButtonRelease-1>", self._on_release, add="+")
+        tree.bind("<<TreeviewSelect>>", self._on_select, add="+")
+
+    def __len__(self):
+        return len(self._keys)
+
+    def keys(self):
+        """全部行ID（按显示顺序）"""
+        return list(self._keys)
+
+    def set_rows(self, rows):
+        """用新的完整列表替换全部行，只修改窗口中发生变化的行
+
+        滚动位置尽量保持在原来的第一行上，仍然存在的选中行保持选中。
+        """
+        anchor = self._keys[self.first] if self.first < len(self._keys) else None
+        self._keys = [key for key, _, _ in rows]
+        self._rows = {key: (text, tuple(values)) for key, text, values in rows}
+        self._selected &= self._rows.keys()
+        if anchor in self._rows:
+            self.first = self._keys.index(anchor)
+        self.render()
+
+    def append_rows(self, rows):
+        """在末尾追加行（按页加载），已有的行ID被忽略"""
+        for key, text, values in rows:
+            if key not in self._rows:
+                self._keys.append(key)
+                self._rows[key] = (text, tuple(values))
+        self.render()
+
+    def insert(self, index, key, text, values):
+        """在 index 处插入一行（行ID已存在时改为更新该行）
+
+        插入位置在窗口上方时窗口随之下移，屏幕上显示的行不变。
+        """
+        if key in self._rows:
+            self.update(key, text, values)
+            return
+        index = min(max(index, 0), len(self._keys))
+        self._keys.insert(index, key)
+        self._rows[key] = (text, tuple(values))
+        if index < self.first:
+            self.first += 1
+        self.render()
+
+    def update(self, key, text, values):
+        """修改一行的内容"""
+        if key not in self._rows:
+            return
+        self._rows[key] = (text, tuple(values))
+        if key in self._shown:
+            self.render()
+
+    def remove(self, key):
+        """删除一行，不存在时忽略"""
+        if key not in self._rows:
+            return
+        index = self._keys.index(key)
+        del self._keys[index]
+        del self._rows[key]
+        self._selected.discard(key)
+        if index < self.first:
+            self.first -= 1
+        self.render()
+
+    def selection(self):
+        """选中的行ID（按显示顺序，包括窗口外的行）"""
+        return tuple(key for key in self._keys if key in self._selected)
+
+    def item(self, key):
+        """行信息，格式与 Treeview.item() 相同"""
+        text, values = self._rows[key]
+        return {"text": text, "values": list(values), "tags": [key]}
+
+    def see(self, key):
+        """滚动到使该行可见"""
+        index = self._keys.index(key)
+        if index < self.first:
+            self.first = index
+        elif index >= self.first + self.visible:
+            self.first = index - self.visible + 1
+        self.render()
+
+    def yview(self, *args):
+        """滚动条的回调：("moveto", 比例) 或 ("scroll", 数量, "units"/"pages")"""
+        if not args:
+            return self._fractions()
+        if args[0] == "moveto":
+            self.first = round(float(args[1]) * len(self._keys))
+        elif args[0] == "scroll":
+            step = self.visible if args[2] == "pages" else 1
+            self.first += int(args[1]) * step
+        self.render()
+
+    def render(self):
+        """使 Treeview 中的行与当前窗口一致，只增删改有差异的行"""
+        self.first = max(0, min(self.first, len(self._keys) - self.visible))
+        wanted = self._keys[self.first:self.first + self.visible]
+        wanted_set = set(wanted)
+
+        stale = [key for key in self._order if key not in wanted_set]
+        if stale:
+            self.tree.delete(*stale)
+            for key in stale:
+                del self._shown[key]
+            self._order = [key for key in self._order if key in wanted_set]
+
+        for index, key in enumerate(wanted):
+            row = self._rows[key]
+            if key not in self._shown:
+                text, values = row
+                self.tree.insert("", index, iid=key, text=text, values=values, tags=(key,))
+                self._order.insert(index, key)
+            else:
+                if self._shown[key] != row:
+                    text, values = row
+                    self.tree.item(key, text=text, values=values)
+                if self._order[index] != key:
+                    self.tree.move(key, "", index)
+                    self._order.remove(key)
+                    self._order.insert(index, key)
+            self._shown[key] = row
+
+        selected = tuple(key for key in wanted if key in self._selected)
+        if tuple(self.tree.selection()) != selected:
+            self.tree.selection_set(selected)
+        self.scrollbar.set(*self._fractions())
+        if not self._measured and self._order:
+            self.tree.after_idle(self._measure)
+
+        if self.on_reach_end is not None and self.first + self.visible >= len(self._keys):
+            self.on_reach_end()
+
+    def _fractions(self):
+        total = len(self._keys)
+        if not total:
+            return 0.0, 1.0
+        return self.first / total, min(1.0, (self.first + self.visible) / total)
+
+    def _on_tree_scroll(self, first, last):
+        # 窗口中的行恰好填满 Treeview，它自身滚动（如键盘移到最后一行）时复位
+        if float(first) > 0:
+            self.tree.yview_moveto(0)
+
+    def _on_configure(self, event):
+        self._measure(event.height)
+
+    def _measure(self, height=None):
+        """按 Treeview 的实际高度和行高重新计算可见行数"""
+        if not self._order:
+            return
+        bbox = self.tree.bbox(self._order[0])
+        if not bbox:
+            # 尚未显示，显示时的 <Configure> 事件会再次计算
+            return
+        self._measured = True
+        _, top, _, row_height = bbox
+        visible = max(1, ((height or self.tree.winfo_height()) - top) // row_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+    def _on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.first -= WHEEL_ROWS
+        else:
+            self.first += WHEEL_ROWS
+        self.render()
+        return "break"
+
+    def _scroll_keys(self, rows):
+        self.first += rows
+        self.render()
+        return "break"
+
+    def _on_arrow(self, event, step):
+        """方向键移到窗口边缘时滚动窗口，焦点和选中行随之移动"""
+        focus = self.tree.focus()
+        if not self._order or focus != self._order[0 if step < 0 else -1]:
+            return None
+        index = self._keys.index(focus) + step
+        if not 0 <= index < len(self._keys):
+            return "break"
+        key = self._keys[index]
+        if event.state & _SHIFT:
+            self._selected.add(key)
+        else:
+            self._selected = {key}
+        self.see(key)
+        self.tree.focus(key)
+        return "break"
+
+    def _on_click(self, event):
+        # 不按 Ctrl/Shift 单击时 Treeview 会替换选中行，窗口外选中的行也应取消
+        self._replace_selection = not event.state & (_SHIFT | _CONTROL)
+
+    def _on_release(self, event):
+        # 单击空白处不会改变选择，也就没有 <<TreeviewSelect>> 来清除标记
+        self._replace_selection = False
+
+    def _on_select(self, event):
+        """把 Treeview 中窗口内的选择同步到全部行的选择"""
+        selected = set(self.tree.selection())
+        if self._replace_selection:
+            self._selected = selected
+            self._replace_selection = False
+        else:
+            self._selected = (self._selected - set(self._order)) | selected
+
@@ -0,0 +1,99 @@
+"""
+界面更新队列 - 让后台线程安全地更新 Tk 界面
+
+Tk 不是线程安全的：在后台线程中修改 Treeview、设置 StringVar 或弹出
+messagebox，负载高时会使界面卡死。后台线程只把更新（要在主线程中调用的函数）
+放入 UiDispatcher 的队列；主线程用 after() 定时取出执行，每轮最多占用一帧的
+时间预算，剩余的留到下一轮，大量更新时界面仍能及时响应输入和重绘。
+
+进度、状态栏这类只需显示最新值的更新带 key 提交：同一 key 尚未执行的旧更新
+被新值替换，多个传输同时汇报进度也不会在队列中堆积。
+"""
+import collections
+import sys
+import threading
+import time
+
+# 检查队列的间隔（毫秒），约每帧一次
+POLL_INTERVAL = 16
+# 每轮最多占用主线程的时间（秒），其余时间留给输入和重绘
+FRAME_BUDGET = 0.008
+
+
+class UiDispatcher:
+    """把后台线程的界面更新转交给 Tk 主线程
+
+    post() 可在任意线程中调用并立即返回；更新按提交顺序在主线程中执行。
+    """
+
+    def __init__(self, root, interval=POLL_INTERVAL, budget=FRAME_BUDGET):
+        self.root = root
+        self.interval = interval
+        self.budget = budget
+        self._lock = threading.Lock()
+        # 待执行的 (key, 回调, 参数)；带 key 的更新以 _latest 中的最新参数为准
+        self._pending = collections.deque()
+        self._latest = {}
+        self._after_id = None
+        self._closed = False
+        self._schedule(self.interval)
+
+    def post(self, callback, *args, key=None):
+        """在主线程中调用 callback(*args)
+
+        带 key 时，同一 key 尚未执行的更新改为本次的回调和参数，并保持原来的顺序位置。
+        """
+        with self._lock:
+            if key is not None:
+                replaced = key in self._latest
+                self._latest[key] = (callback, args)
+                if replaced:
+                    return
+            self._pending.append((key, callback, args))
+
+    def set(self, variable, value):
+        """在主线程中设置 Tk 变量（StringVar、DoubleVar 等），只保留最新值"""
+        self.post(variable.set, value, key=("set", str(variable)))
+
+    def pending(self):
+        """尚未执行的更新数"""
+        with self._lock:
+            return len(self._pending)
+
+    def drain(self):
+        """执行队列中的更新，直到队列为空或用完时间预算；返回剩余的更新数"""
+        deadline = time.perf_counter() + self.budget
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                key, callback, args = self._pending.popleft()
+                if key is not None:
+                    callback, args = self._latest.pop(key)
+            try:
+                callback(*args)
+            except Exception:
+                # 与 Tk 事件回调一样报告异常，不影响后续更新
+                self.root.report_callback_exception(*sys.exc_info())
+            if time.perf_counter() >= deadline:
+                return self.pending()
+
+    def _tick(self):
+        if self._closed:
+            return
+        # 先安排下一轮：回调中弹出的对话框会进入嵌套的事件循环，其间队列照常处理
+        self._schedule(self.interval)
+        if self.drain():
+            # 还有积压：让 Tk 先处理输入和重绘，随后立即继续
+            self.root.after_cancel(self._after_id)
+            self._schedule(1)
+
+    def _schedule(self, delay):
+        self._after_id = self.root.after(delay, self._tick)
+
+    def close(self):
+        """停止处理队列（销毁窗口前调用）"""
+        self._closed = True
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
@@ -0,0 +1,135 @@
+"""
+传输压缩 - 上传和下载时协商流式压缩
+
+下载时按请求的 Accept-Encoding、上传时按 Content-Encoding 选择 zstd 或 gzip，
+边读文件边压缩/解压，不把整个文件读入内存。zip、jpg、mp4 等本身已经压缩过的
+格式再压缩只会浪费 CPU，按扩展名和文件开头的样本自动跳过。
+zstd 需要安装可选依赖 zstandard，未安装时只使用 gzip。
+"""
+import gzip
+import json
+import os
+import zlib
+
+from werkzeug.wsgi import get_input_stream
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 按优先顺序排列的支持的压缩编码
+SUPPORTED_ENCODINGS = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+# 压缩级别：机房交换机只有 100Mbit，低级别就足以跑满链路，CPU 留给其他学生
+GZIP_LEVEL = 1
+ZSTD_LEVEL = 3
+# 流式压缩时每次读取的块大小
+STREAM_CHUNK_SIZE = 256 * 1024
+# 小于该大小的文件不值得压缩
+MIN_COMPRESS_SIZE = 4 * 1024
+# 用文件开头的样本试压缩，压缩后仍超过 MAX_SAMPLE_RATIO 视为不可压缩
+SAMPLE_SIZE = 64 * 1024
+MAX_SAMPLE_RATIO = 0.9
+# 本身已经压缩过的格式（Office 文档也是 zip 容器）
+COMPRESSED_EXTENSIONS = frozenset({
+    ".zip", ".7z", ".rar", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".jar", ".apk",
+    ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp", ".epub",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp3", ".aac", ".m4a", ".ogg", ".flac",
+    ".mp4", ".m4v", ".mkv", ".avi", ".mov", ".webm", ".wmv",
+    ".pdf",
+})
+
+
+def is_compressible(file_path, name=None):
+    """文件是否值得压缩传输：不是已压缩格式，且开头的样本确实能压缩
+
+    name 为判断格式用的文件名，默认取 file_path；按内容哈希存放的文件没有扩展名，
+    应传入原始文件名。
+    """
+    if os.path.splitext(name or file_path)[1].lower() in COMPRESSED_EXTENSIONS:
+        return False
+    if os.path.getsize(file_path) < MIN_COMPRESS_SIZE:
+        return False
+    with open(file_path, "rb") as f:
+        sample = f.read(SAMPLE_SIZE)
+    return len(zlib.compress(sample, 1)) <= len(sample) * MAX_SAMPLE_RATIO
+
+
+def choose_encoding(accept_encoding):
+    """从对方声明接受的编码（Accept-Encoding 头的值）中选出本端支持的最优编码"""
+    accepted = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        key, _, quality = params.strip().partition("=")
+        try:
+            if key.strip() == "q" and float(quality) <= 0:
+                continue
+        except ValueError:
+            continue
+        accepted.add(name.strip().lower())
+    for encoding in SUPPORTED_ENCODINGS:
+        if encoding in accepted:
+            return encoding
+    return None
+
+
+def compress_bytes(data, encoding):
+    """一次性压缩一段数据（上传分块用）"""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_stream(file, encoding):
+    """逐块读取文件并产出压缩后的数据，结束时关闭文件"""
+    if encoding == "zstd":
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    try:
+        while chunk := file.read(STREAM_CHUNK_SIZE):
+            if data := compressor.compress(chunk):
+                yield data
+        yield compressor.flush()
+    finally:
+        file.close()
+
+
+def decompressing_reader(stream, encoding):
+    """把压缩的输入流包装成按需解压的只读流"""
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+    return gzip.GzipFile(fileobj=stream, mode="rb")
+
+
+class DecompressRequestBody:
+    """WSGI 中间件：请求体带 Content-Encoding 时透明解压，应用看到的是原始数据
+
+    解压后长度未知，因此去掉 CONTENT_LENGTH 并标记 wsgi.input_terminated，
+    由应用读到流结束为止。不支持的编码返回 415，并在 Accept-Encoding 中
+    列出支持的编码。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get("HTTP_CONTENT_ENCODING", "").strip().lower()
+        if encoding in ("", "identity"):
+            return self.app(environ, start_response)
+        if encoding not in SUPPORTED_ENCODINGS:
+            body = json.dumps({"success": False, "error": f"不支持的压缩编码: {encoding}"},
+                              ensure_ascii=False).encode("utf-8")
+            start_response("415 Unsupported Media Type", [
+                ("Content-Type", "application/json"),
+                ("Content-Length", str(len(body))),
+                ("Accept-Encoding", ", ".join(SUPPORTED_ENCODINGS)),
+            ])
+            return [body]
+
+        environ["wsgi.input"] = decompressing_reader(get_input_stream(environ), encoding)
+        environ["wsgi.input_terminated"] = True
+        environ.pop("CONTENT_LENGTH", None)
+        del environ["HTTP_CONTENT_ENCODING"]
+        return self.app(environ, start_response)